@@ -5,22 +5,31 @@ Make sure to have all these libraries downloaded
 import random  # For generating random numbers
 import math  # For mathematical functions
 import asyncio  # For asynchronous programming
-import pickle  # For object serialization
 import os  # For interacting with the operating system
+import time  # For naming recordings after the time they started
+from importlib.machinery import ModuleSpec  # For keeping worker processes from running this script again
 
 import pygame  # Main library for creating games
 import pygame_widgets  # For additional widgets in Pygame
 import pygame_gui  # For UI management in Pygame
 from pygame_gui.elements import UIButton  # For creating buttons
 from pygame_gui.windows.ui_file_dialog import UIFileDialog  # For file dialog UI
-from pygame.locals import KEYDOWN, K_f, K_RETURN, Rect  # For handling events and constants
+from pygame.locals import KEYDOWN, K_c, K_f, K_RETURN, K_LEFTBRACKET, K_r, K_t, K_1, K_2, K_3, K_4, Rect  # For handling events and constants
 
 # Importing custom helper classes for organizing code
 from helpers.cam_group import CamGroup  # For camera management
 from helpers.planet_group import PlanetGroup  # For managing planets
 from helpers.menu_group import MenuGroup  # For managing menus
 # For game objects and UI elements
-from helpers.sprites import PlanetaryObject, Star, Button, LogarithmicSlider, TextBox, Slider
+from helpers.sprites import PlanetaryObject, Starfield, Button, LogarithmicSlider, TextBox, Slider
+from helpers.integrators import INTEGRATORS, INTEGRATOR_LABELS  # For choosing the time integrator
+from helpers.sim_clock import SimulationClock  # For the fixed-step accumulator and time warp
+from helpers.collisions import COLLISION_MODES, COLLISION_LABELS  # For choosing what happens when planets touch
+from helpers.preview import TrajectoryPreview  # For predicting the path of a planet while it is set up
+from helpers.generate import belt, ring, random_system  # For generating whole populations of bodies at once
+from helpers.text_cache import text_cache  # For rendering each text once rather than every frame
+from helpers.journal import SceneJournal  # For saving what changed without holding up the frame
+from helpers.scene_file import write_scene, read_planets_data, import_legacy  # For scene files
 import matplotlib  # For plotting graphs
 import matplotlib.pyplot as plt  # For creating plots
 import matplotlib.backends.backend_agg as agg  # For rendering plots to surfaces
@@ -131,6 +140,9 @@ distance_slider = LogarithmicSlider(screen, -500000, -500000, menu_width - menu_
                                     menu_height // 40, FONT_3, 2, min=PlanetaryObject.AU / 2,
                                     max=PlanetaryObject.AU * 2,
                                     min_text=["1/2x", "AU"], max_text=["2x", "AU"])  # Slider for distance
+count_slider = LogarithmicSlider(screen, -500000, -500000, menu_width - menu_width // 4 - menu_height // 80,
+                                 menu_height // 40, FONT_3, 10, min=100, max=50000, min_text=["100"],
+                                 max_text=["50k"])  # Slider for the number of bodies generated
 
 # close_menu_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "edit_done",
 #                           sprite_group=edit_done_buttons)  # Button to confirm edits
@@ -139,7 +151,14 @@ distance_slider = LogarithmicSlider(screen, -500000, -500000, menu_width - menu_
 add_menu_buttons = pygame.sprite.Group()  # Group for add menu buttons
 add_planet_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "add_planet",
                            sprite_group=add_menu_buttons)  # Button for adding a planet
+particle_button = Button(400, 400, (400, 400), dir_path + "/assets/images/checkbox_empty.png", "particle",
+                         sprite_group=add_menu_buttons)  # Button for adding a massless test particle instead
+generator_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "generator",
+                          sprite_group=add_menu_buttons)  # Button cycling through what can be generated
+generate_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "generate",
+                         sprite_group=add_menu_buttons)  # Button for generating bodies in bulk
 add_planet_group = MenuGroup(mass_slider, name_text_box, velocity_slider, velocity_angle_slider, distance_slider,
+                             particle_button, count_slider, generator_button, generate_button,
                              add_planet_button)  # Group for the add planet menu
 
 view_menu_buttons = pygame.sprite.Group()  # Group for view menu buttons
@@ -148,7 +167,10 @@ edit_planet_button = Button(400, 400, (400, 400), dir_path + "/assets/images/edi
 delete_planet_button = Button(400, 400, (400, 400), dir_path + "/assets/images/delete_planet.png", "delete_planet",
                               sprite_group=view_menu_buttons)  # Button for deleting a planet
 
-view_planet_group = MenuGroup(edit_planet_button, delete_planet_button)  # Group for viewing planet options
+ring_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "ring",
+                     sprite_group=view_menu_buttons)  # Button for adding a ring around a planet
+
+view_planet_group = MenuGroup(edit_planet_button, delete_planet_button, ring_button)  # Group for viewing planet options
 
 settings_menu_buttons = pygame.sprite.Group()  # Group for settings menu buttons
 force_vectors_button = Button(400, 400, (400, 400), dir_path + "/assets/images/checkbox_empty.png",
@@ -159,13 +181,26 @@ velocity_vectors_button = Button(400, 400, (400, 400), dir_path + "/assets/image
 toggle_if_focused_button = Button(400, 400, (400, 400), dir_path + "/assets/images/checkbox_empty.png",
                                   "toggle_if_focused",
                                   sprite_group=settings_menu_buttons)  # Button for focused toggling
+barnes_hut_button = Button(400, 400, (400, 400), dir_path + "/assets/images/checkbox_empty.png",
+                           "barnes_hut", sprite_group=settings_menu_buttons)  # Button for toggling tree gravity
+parallel_button = Button(400, 400, (400, 400), dir_path + "/assets/images/checkbox_empty.png",
+                         "parallel", sprite_group=settings_menu_buttons)  # Button for toggling multi-core gravity
+theta_slider = Slider(screen, -500000, -500000, menu_width - menu_width // 4 - menu_height // 80, menu_height // 40,
+                      FONT_3, min=0.1, max=1.5, step=0.05, initial=0.5, min_text=["0.1"],
+                      max_text=["1.5"])  # Slider for the Barnes-Hut opening angle
+timestep_slider = LogarithmicSlider(screen, -500000, -500000, menu_width - menu_width // 4 - menu_height // 80,
+                                    menu_height // 40, FONT_3, 2, min=60 * 60, max=60 * 60 * 24 * 30,
+                                    min_text=["1h"], max_text=["30d"])  # Slider for the simulation timestep
+integrator_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "integrator",
+                           sprite_group=settings_menu_buttons)  # Button cycling through the integrators
 export_button = Button(400, 400, (400, 400), dir_path + "/assets/images/export.png",
                        "export", sprite_group=settings_menu_buttons)  # Button for exporting data
 import_button = Button(400, 400, (400, 400), dir_path + "/assets/images/import.png",
                        "import", sprite_group=settings_menu_buttons)  # Button for importing data
 
 settings_menu_group = MenuGroup(force_vectors_button, velocity_vectors_button, toggle_if_focused_button,
-                                export_button, import_button)  # Group for settings menu
+                                barnes_hut_button, parallel_button, theta_slider, timestep_slider, integrator_button, export_button,
+                                import_button)  # Group for settings menu
 
 edit_done_buttons = pygame.sprite.Group()  # Group for edit done buttons
 edit_done_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_planet.png", "edit_done",
@@ -173,7 +208,13 @@ edit_done_button = Button(400, 400, (400, 400), dir_path + "/assets/images/add_p
 edit_planet_group = MenuGroup(mass_slider, velocity_slider, velocity_angle_slider,
                               edit_done_button)  # Group for editing a planet
 
+timeline_slider = Slider(screen, screen_width // 3,
+                         screen_height - (screen_width // BUTTON_SIZING // 2 + screen_height // BUTTON_SIZING // 2),
+                         screen_width // 3, menu_height // 40, FONT_3, min=0, max=1, step=1, initial=0,
+                         min_text=["Start"], max_text=["End"])  # Slider scrubbing through the recording
+
 # Hide all menus initially
+timeline_slider.hide()  # Hide the timeline until a recording is played back
 add_planet_group.hide()  # Hide add planet menu
 view_planet_group.hide()  # Hide view planet menu
 settings_menu_group.hide()  # Hide settings menu
@@ -183,23 +224,80 @@ edit_planet_group.hide()  # Hide edit planet menu
 cam_group = CamGroup()  # Instantiate camera group
 
 check_if_added = False  # Flag to check if buttons are added
+add_as_particle = False  # Flag to add a massless test particle instead of a planet
+GENERATOR_LABELS = {"belt": "Asteroid Belt", "system": "Random System"}  # What the add menu can generate
+generator = "belt"  # What the generate button creates
+RING_COUNT = 2000  # Test particles in a ring added from the planet menu
+sim_clock = SimulationClock()  # Shared by every planet group, so the time warp survives a reset
+WARP_KEYS = dict(zip((K_1, K_2, K_3, K_4), SimulationClock.WARPS))  # Number keys choosing the time warp
+trajectory_preview = TrajectoryPreview()  # Predicted path shown in the add and edit menus
+REWIND_SECONDS = 5  # Seconds of playback at the current warp undone by each press of the rewind key
+RECORDINGS_PATH = dir_path + "/assets/data/recordings"  # Folder trajectory recordings are written to
+SCENE_PATH = dir_path + "/assets/data/planets_data.orbscene"  # Scene saved between runs
+LEGACY_SCENE_PATH = dir_path + "/assets/data/planets_data.pkl"  # Scene saved by older versions, read if no other
 
 
 # Function to reset the planet group and create a sun
 def reset_planet_group():
-    planet_group = PlanetGroup(screen)  # Create a new planet group
+    planet_group = PlanetGroup(screen, clock=sim_clock)  # Create a new planet group
     sun = PlanetaryObject(planet_group, 0, 0, 30 * PlanetaryObject.SCALE * 10 ** 9, (253, 184, 19), 1.98892 * 10 ** 30,
                           (screen_width, screen_height), "Sun", screen, cam_group)  # Create a sun object
     sun.sun = True  # Mark the object as the sun
     return planet_group, sun  # Return the planet group and sun object
 
 
+# Function to finish the current recording and go back to the live simulation
+def close_recording():
+    planet_group.stop_recording()  # Close the files of a recording in progress
+    planet_group.set_playback(None)  # Show the live planets
+    timeline_slider.hide()  # Hide the timeline
+
+
+# Function to build the serializable scene: scene settings first, then every planet except the sun
+# With lists=False the histories are array copies, which the journal writes out on its own thread
+def scene_data(lists=True):
+    planets_data = [{"scene": planet_group.save_fields()}]  # Scene-wide settings
+    for planet in planet_group.sprites():  # Loop through planets
+        if not planet.sun:  # Skip the sun
+            planets_data.append(planet.save_fields(lists))  # Save planet data
+    return planets_data
+
+
+# Function to load a serialized scene into the current planet group
+def load_scene(planets_data):
+    for planet_data in planets_data:
+        if "scene" in planet_data:  # Scene-wide settings
+            planet_group.load_fields(planet_data["scene"])
+            continue
+        t = PlanetaryObject(planet_group, 0, 0, 1, (0, 0, 0), 0,
+                            (screen_width, screen_height), "",
+                            screen, cam_group)  # Create a planet from data
+        t.load_fields(planet_data)  # Load fields from saved data
+    sync_settings_buttons()  # Show the loaded scene's settings
+
+
+# Function to make the scene-specific settings buttons match the current planet group
+def sync_settings_buttons():
+    backend = planet_group.engine.force_backend
+    if backend.name == "barnes_hut":
+        barnes_hut_button.set_img(dir_path + "/assets/images/checkbox_checked.png", SETTINGS_BUTTON_SIZE)
+        theta_slider.setValue(backend.theta)
+    else:
+        barnes_hut_button.set_img(dir_path + "/assets/images/checkbox_empty.png", SETTINGS_BUTTON_SIZE)
+    if backend.name == "parallel":
+        parallel_button.set_img(dir_path + "/assets/images/checkbox_checked.png", SETTINGS_BUTTON_SIZE)
+    else:
+        parallel_button.set_img(dir_path + "/assets/images/checkbox_empty.png", SETTINGS_BUTTON_SIZE)
+    timestep_slider.setValue(planet_group.timestep)
+
+
 # Create UI buttons for import and export functionality
 export_ui_button = UIButton(relative_rect=Rect(-10000, -100000, 1, 1), manager=manager, text="")
 import_ui_button = UIButton(relative_rect=Rect(-10000, -100000, 1, 1), manager=manager, text="")
 
 # Reset planet group on startup
 planet_group, sun = reset_planet_group()  # Initialize planet group and sun
+sync_settings_buttons()  # Show the default scene settings
 imported = exported = False  # Flags for import/export status
 
 
@@ -212,20 +310,15 @@ def main():
     ticksTime = 0  # Timer for ticks
 
     # Load previously saved planet data if it exists
-    if os.path.isfile(dir_path + "/assets/data/planets_data.pkl"):
-        with open(dir_path + "/assets/data/planets_data.pkl", "rb") as f:
-            planets_data = pickle.load(f)  # Load planet data from file
-            for planet_data in planets_data:
-                global planet_group
-                t = PlanetaryObject(planet_group, 0, 0, 1, (0, 0, 0), 0,
-                                    (screen_width, screen_height), "",
-                                    screen, cam_group)  # Create a planet from data
-                t.load_fields(planet_data)  # Load fields from saved data
-
-    # Create a group for background stars
-    background = pygame.sprite.Group()
-    for _ in range(2000):
-        Star(background)  # Add stars to the background
+    global planet_group
+    journal = SceneJournal(SCENE_PATH)  # Writes the changes in the background, with a full snapshot now and then
+    planets_data = journal.load()  # The last snapshot with the changes saved after it
+    if planets_data is not None:
+        load_scene(planets_data)  # Create the saved planets and settings
+    elif os.path.isfile(LEGACY_SCENE_PATH):  # Saved by an older version; saved as a scene file from now on
+        load_scene(import_legacy(LEGACY_SCENE_PATH))
+
+    background = Starfield()  # Background stars, drawn once into layers
 
     # Main game loop
     while run:
@@ -235,7 +328,7 @@ def main():
 
         background.update(cam_group)  # Update background stars
         # ast.draw()
-        planet_group.update(cam_group)  # Update planets based on camera position
+        planet_group.update(cam_group, frame_time=c)  # Step the physics owed for this frame and draw the planets
         buttons_group.draw(screen)  # Draw buttons to the screen
         events = pygame.event.get()  # Get a list of events from the event queue
         for event in events:
@@ -249,9 +342,10 @@ def main():
             if not t:
                 t = t or reset_button.check_collision()  # Check for reset button collision
                 if t:
+                    close_recording()  # The recording belongs to the old scene
                     planet_group, sun = reset_planet_group()  # Reset the planets
-                    cam_group.offset.x = 0
-                    cam_group.offset.y = 0
+                    sync_settings_buttons()  # The new scene uses the default settings
+                    cam_group.reset_scales()  # Center the camera at the default zoom
             if not t:
                 t = t or play_button.check_collision()  # Check for play button collision
                 if t:
@@ -270,6 +364,50 @@ def main():
                 if t:
                     menuShown = (True, "settings")  # Show settings menu
                     reset_menu()  # Reset the menu
+            if not t and menuShown[0] and menuShown[1] == "add":
+                t = t or particle_button.check_collision()  # Check for test particle button collision
+                if t:
+                    # Toggle adding a test particle and update button image
+                    global add_as_particle
+                    if add_as_particle:
+                        particle_button.set_img(dir_path + "/assets/images/checkbox_empty.png", SETTINGS_BUTTON_SIZE)
+                    else:
+                        particle_button.set_img(dir_path + "/assets/images/checkbox_checked.png",
+                                                SETTINGS_BUTTON_SIZE)
+                    add_as_particle = not add_as_particle  # Toggle state
+            if not t and menuShown[0] and menuShown[1] == "add" and event.type == pygame.MOUSEBUTTONDOWN:
+                t = t or generator_button.check_collision()  # Check for generator button collision
+                if t:
+                    # Switch to generating the next kind of population
+                    global generator
+                    names = list(GENERATOR_LABELS)
+                    generator = names[(names.index(generator) + 1) % len(names)]
+            if not t and menuShown[0] and menuShown[1] == "add":
+                t = t or generate_button.check_collision()  # Check for generate button collision
+                if t:
+                    # Generate the bodies in bulk, written straight into the engine arrays
+                    count = int(count_slider.getValue())  # Get the number of bodies from slider
+                    if generator == "belt":  # Test particles around the chosen distance
+                        planet_group.add_particles(*belt(count, distance_slider.getValue() * 0.8,
+                                                         distance_slider.getValue() * 1.2))
+                    else:  # Planets drawn from a new seed, with any belt as test particles
+                        planets_data, particle_pos, particle_vel = random_system(random.randrange(10000),
+                                                                                 belt_count=count)
+                        load_scene(planets_data)  # Create the planets
+                        planet_group.add_particles(particle_pos, particle_vel)
+                    menuShown = (False, "")  # Hide menu
+                    reset_menu()  # Reset the menu
+            if not t and menuShown[0] and add_as_particle:
+                t = t or add_planet_button.check_collision()  # Check for add planet button collision
+                if t:
+                    # Create a massless test particle based on user input
+                    vel = velocity_slider.getValue()  # Get velocity from slider
+                    vel_angle = velocity_angle_slider.getValue()  # Get velocity angle from slider
+                    planet_group.add_particles((0, distance_slider.getValue()),
+                                               (vel * math.cos(vel_angle * math.pi / 180),
+                                                vel * math.sin(vel_angle * math.pi / 180) * -1))
+                    menuShown = (False, "")  # Hide menu
+                    reset_menu()  # Reset the menu
             if not t and menuShown[0]:
                 t = t or add_planet_button.check_collision()  # Check for add planet button collision
                 if t:
@@ -291,6 +429,13 @@ def main():
                     menuShown[2].kill()  # Remove the focused planet from the menu
                     menuShown = (False, "")  # Hide menu
                     reset_menu()  # Reset the menu
+            if not t and menuShown[0] and menuShown[1] == "planet":
+                t = t or ring_button.check_collision()  # Check for ring button collision
+                if t:
+                    # Surround the planet with test particles orbiting it
+                    planet_group.add_particles(*ring(planet_group.engine, menuShown[2].index, RING_COUNT))
+                    menuShown = (False, "")  # Hide menu
+                    reset_menu()  # Reset the menu
             if not t and menuShown[0] and menuShown[1] == "planet":
                 t = t or edit_planet_button.check_collision()  # Check for edit planet button collision
                 if t:
@@ -385,6 +530,34 @@ def main():
                                                          SETTINGS_BUTTON_SIZE)
                     PlanetaryObject.only_when_focused = not PlanetaryObject.only_when_focused  # Toggle state
 
+            if not t and menuShown[0] and menuShown[1] == "settings":
+                t = t or barnes_hut_button.check_collision()  # Check for Barnes-Hut button collision
+                if t:
+                    # Toggle between direct summation and the Barnes-Hut tree for this scene
+                    if planet_group.engine.force_backend.name == "barnes_hut":
+                        planet_group.set_force_backend("direct")
+                    else:
+                        planet_group.set_force_backend("barnes_hut", theta=theta_slider.getValue())
+                    sync_settings_buttons()  # Update button image
+
+            if not t and menuShown[0] and menuShown[1] == "settings":
+                t = t or parallel_button.check_collision()  # Check for multi-core button collision
+                if t:
+                    # Toggle between single-process and multi-core direct summation for this scene
+                    if planet_group.engine.force_backend.name == "parallel":
+                        planet_group.set_force_backend("direct")
+                    else:
+                        planet_group.set_force_backend("parallel")
+                    sync_settings_buttons()  # Update button images
+
+            if not t and menuShown[0] and menuShown[1] == "settings" and event.type == pygame.MOUSEBUTTONDOWN:
+                t = t or integrator_button.check_collision()  # Check for integrator button collision
+                if t:
+                    # Switch this scene to the next integrator
+                    names = list(INTEGRATORS)
+                    current = names.index(planet_group.engine.integrator.name)
+                    planet_group.set_integrator(names[(current + 1) % len(names)])
+
             if not t and menuShown[0] and menuShown[1] == "settings":
                 global imported, exported  # Declare global flags for import/export
                 if event.type == pygame_gui.UI_BUTTON_PRESSED:  # Check for UI button press events
@@ -398,36 +571,32 @@ def main():
                         exported = True  # Set export flag
                     elif event.ui_element == file_selection.ok_button:  # Check if OK button in file dialog is pressed
                         if imported:  # If importing
+                            close_recording()  # The recording belongs to the old scene
                             planet_group, sun = reset_planet_group()  # Reset planet group
                             _, file_extension = os.path.splitext(file_selection.current_file_path)
 
-                            if file_extension == ".pkl":  # DESERIALIZATION
-                                with open(file_selection.current_file_path, 'rb') as f:
-                                    planets_data = pickle.load(f)  # Load data from serialized file
-                                    if type(planets_data) == list and type(planets_data[0]) == dict:
-                                        for planet_data in planets_data:
-                                            # Create a planet object
-                                            t = PlanetaryObject(planet_group, 0, 0,
-                                                                1, (0, 0, 0), 0,
-                                                                (screen_width, screen_height),
-                                                                "", screen, cam_group)
-                                            t.load_fields(planet_data)  # Load the planet's fields
-                                    else:
-                                        print("The file contains the wrong variable types.")
+                            if file_extension == ".orbscene":  # DESERIALIZATION
+                                try:
+                                    load_scene(read_planets_data(file_selection.current_file_path))
+                                except ValueError as error:  # Not a scene file, or from a newer version
+                                    print(error)
+
+                            elif file_extension == ".pkl":  # Scenes exported by older versions
+                                planets_data = import_legacy(file_selection.current_file_path)
+                                if type(planets_data) == list and type(planets_data[0]) == dict:
+                                    load_scene(planets_data)  # Create the planets and settings
+                                else:
+                                    print("The file contains the wrong variable types.")
 
                             else:
-                                print("The file is not a valid pickle file. Select one "
-                                      "with the .pkl extension")
+                                print("The file is not a valid scene file. Select one "
+                                      "with the .orbscene or .pkl extension")
 
                             imported = False  # Reset import flag
 
                     if exported:  # If exporting
-                        planets_data = []  # Initialize list for planet data
-                        for planet in planet_group.sprites():  # Loop through planets
-                            if not planet.sun:  # Skip the sun
-                                planets_data.append(planet.save_fields())  # Save planet data
-                        with open(dir_path + "/planets_data.pkl", 'wb') as f:
-                            pickle.dump(planets_data, f)  # SERIALIZATION: saving data to file
+                        planets_data = scene_data()  # Scene settings and planet data
+                        write_scene(dir_path + "/planets_data.orbscene", planets_data)  # SERIALIZATION
                         exported = False  # Reset export flag
 
             if not t:
@@ -447,6 +616,36 @@ def main():
             if event.type == KEYDOWN and event.key == K_f:  # Check for FPS toggle key
                 fps = not fps  # Toggle FPS display
 
+            if event.type == KEYDOWN and event.key in WARP_KEYS:  # Check for time warp keys
+                sim_clock.set_warp(WARP_KEYS[event.key])  # Change the time warp
+
+            if event.type == KEYDOWN and event.key == K_LEFTBRACKET:  # Check for rewind key
+                # Go back to the exact step a few seconds ago, re-simulating from the nearest checkpoint
+                steps_back = REWIND_SECONDS * SimulationClock.STEPS_PER_SECOND * sim_clock.warp
+                planet_group.rewind(max(0, planet_group.steps - steps_back))
+
+            if event.type == KEYDOWN and event.key == K_r:  # Check for recording key
+                if planet_group.recording is not None and planet_group.recording.recording:
+                    planet_group.stop_recording()  # Finish the recording, keeping it for playback
+                else:  # Stream every step to a new file named after the current time
+                    os.makedirs(RECORDINGS_PATH, exist_ok=True)
+                    planet_group.set_playback(None)  # Recording continues from the live planets
+                    timeline_slider.hide()
+                    planet_group.start_recording(RECORDINGS_PATH + time.strftime("/%Y%m%d-%H%M%S.orbrec"))
+
+            if event.type == KEYDOWN and event.key == K_t:  # Check for timeline key
+                if planet_group.playback is not None:  # Back to the live simulation
+                    planet_group.set_playback(None)
+                    timeline_slider.hide()
+                elif planet_group.recording is not None and len(planet_group.recording):
+                    planet_group.set_playback(len(planet_group.recording) - 1)  # Start from the latest frame
+                    timeline_slider.show()
+
+            if event.type == KEYDOWN and event.key == K_c:  # Check for collision mode key
+                # Switch this scene to the next collision outcome
+                current = COLLISION_MODES.index(planet_group.engine.collision_mode)
+                planet_group.engine.collision_mode = COLLISION_MODES[(current + 1) % len(COLLISION_MODES)]
+
             manager.process_events(event)  # Process Pygame GUI events
 
         # Manage menu visibility and drawing
@@ -462,16 +661,63 @@ def main():
 
         # Save planet data periodically - data persistence
         if ticksTime >= 500:
-            planets_data = []  # Initialize list for planet data
-            for planet in planet_group.sprites():  # Loop through planets
-                if not planet.sun:  # Skip the sun
-                    planets_data.append(planet.save_fields())  # Save planet data
-            asyncio.run(save_data(planets_data))  # Save data asynchronously
+            journal.save(planet_group, lambda: scene_data(lists=False))  # Nothing is written if nothing changed
+            error = journal.take_error()
+            if error is not None:  # The next save writes the whole scene again
+                print(f"Autosave failed: {error}")
 
         # Display FPS if the flag is set
         if fps:
-            text = FONT_1.render("FPS: " + str(round(clock.get_fps())), False, "white")  # Render FPS text
+            text = text_cache.render(FONT_1, "FPS: " + str(round(clock.get_fps())), False, "white")  # Render FPS text
             screen.blit(text, (0, 0))  # Draw FPS text on screen
+            warp = f"Warp: {sim_clock.warp}x"
+            if sim_clock.degraded:  # The requested warp did not fit in the frame
+                warp += f" (reached {sim_clock.achieved_warp:.0f}x)"
+            text = text_cache.render(FONT_3, warp, False, "white")
+            screen.blit(text, (0, FONT_1.get_height()))  # Draw under the FPS text
+            text = text_cache.render(FONT_3, "Collisions: " + COLLISION_LABELS[planet_group.engine.collision_mode],
+                                     False, "white")
+            screen.blit(text, (0, FONT_1.get_height() + FONT_3.get_height()))  # Draw under the warp text
+            oldest = planet_group.checkpoints.oldest
+            text = text_cache.render(FONT_3, f"Step: {planet_group.steps}" + (f" (rewind to {oldest} with [)"
+                                                                              if oldest is not None else ""),
+                                     False, "white")
+            screen.blit(text, (0, FONT_1.get_height() + 2 * FONT_3.get_height()))  # Draw under the collisions text
+            lines = 3  # Lines drawn under the FPS text so far
+            force_error = planet_group.engine.force_backend.force_error
+            if force_error is not None:  # Tree gravity reports its error against direct summation
+                text = text_cache.render(FONT_3, f"Tree force error: {force_error * 100:.2f}%", False, "white")
+                screen.blit(text, (0, FONT_1.get_height() + lines * FONT_3.get_height()))  # Draw under the others
+                lines += 1
+            analytic = getattr(planet_group.engine.integrator, "analytic", None)
+            if analytic is not None:  # The Kepler hybrid reports how many orbits it solves in closed form
+                text = text_cache.render(FONT_3, f"Analytic orbits: {int(analytic.sum())}/{len(analytic)}", False,
+                                         "white")
+                screen.blit(text, (0, FONT_1.get_height() + lines * FONT_3.get_height()))  # Draw under the others
+                lines += 1
+            if cam_group.scale_size != 1:  # Zoomed with the mouse wheel
+                text = text_cache.render(FONT_3, f"Zoom: {cam_group.scale_size:.3g}x (reset with space)", False,
+                                         "white")
+                screen.blit(text, (0, FONT_1.get_height() + lines * FONT_3.get_height()))  # Draw under the others
+                lines += 1
+            recording = planet_group.recording
+            if recording is not None and recording.recording:  # Frames are being streamed to disk
+                text = text_cache.render(FONT_3, f"Recording: {len(recording)} frames (stop with R)", False, "white")
+                screen.blit(text, (0, FONT_1.get_height() + lines * FONT_3.get_height()))  # Draw under the others
+                lines += 1
+            if planet_group.playback is not None:  # The timeline shows a recorded frame
+                step = recording.frame(planet_group.playback)[0]
+                text = text_cache.render(FONT_3, f"Playback: frame {planet_group.playback + 1}/{len(recording)}, "
+                                                 f"step {step} (live with T)", False, "white")
+                screen.blit(text, (0, FONT_1.get_height() + lines * FONT_3.get_height()))  # Draw under the others
+
+        # Follow the timeline, or let it follow the playback
+        if planet_group.playback is not None:
+            timeline_slider.max = max(1, len(planet_group.recording) - 1)
+            if timeline_slider.selected:  # Dragged to another frame
+                planet_group.set_playback(timeline_slider.getValue())
+            else:
+                timeline_slider.setValue(planet_group.playback)
 
         # Update and draw UI elements
         manager.update(c)  # Update Pygame GUI manager
@@ -483,6 +729,9 @@ def main():
         if ticksTime > 500:
             ticksTime = 0  # Reset the ticks counter
 
+    journal.close()  # Finish writing the last save
+    if journal.error is not None:  # Too late to write it again
+        print(f"Autosave failed: {journal.error}")
     pygame.quit()  # Quit Pygame when the main loop ends
 
 
@@ -491,7 +740,13 @@ graph = pygame.image.load(dir_path + "/assets/images/play.png").convert_alpha()
 graph = pygame.transform.scale(graph, (menu_width - menu_width // 4, menu_width - menu_width // 4))  # Scale image
 
 # Initialize lists for button labels
-force_labels, velocity_labels, toggle_if_labels = [], [], []
+force_labels, velocity_labels, toggle_if_labels, barnes_hut_labels = [], [], [], []
+parallel_labels = [FONT_2.render("Multi-core", False, COLOR),
+                   FONT_2.render("Gravity", False, COLOR)]  # Labels for the multi-core gravity setting
+particle_labels = [FONT_2.render("Massless Test", False, COLOR),
+                   FONT_2.render("Particle", False, COLOR)]  # Labels for the test particle setting
+generator_label = FONT_2.render("Next Type", False, COLOR)  # Label for the generator button
+generate_label = FONT_2.render("Generate", False, COLOR)  # Label for the generate button
 
 
 # Function to bring up the appropriate menu based on type
@@ -548,6 +803,28 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
         # Position the distance slider
         distance_slider.setX(widget_x_offset)
         distance_slider.setY(new_height)
+        new_height += distance_slider.getHeight() + menu_height // 40  # Update height after distance slider
+
+        # Position the test particle button
+        particle_button.set_size(SETTINGS_BUTTON_SIZE)
+        particle_button.set_pos(SETTINGS_BUTTON_SIZE[0] + screen_width * 4 // 5,
+                                new_height + SETTINGS_BUTTON_SIZE[0])
+        setting_heights.append(new_height)  # Add height to settings heights
+        new_height += SETTINGS_BUTTON_SIZE[0] * 2  # Update height after button
+        new_height += add_menu_subtitles(GENERATOR_LABELS[generator] + f': {int(count_slider.getValue())}', menu,
+                                         new_height) + menu_height // 80  # Add generated count subtitle
+
+        # Position the generated count slider
+        count_slider.setX(widget_x_offset)
+        count_slider.setY(new_height)
+        new_height += count_slider.getHeight() + menu_height // 40  # Update height after count slider
+
+        # Set size and position for the generator and generate buttons, side by side
+        generator_button.set_size((menu_width * 7 // 16 - menu_width // 32, menu_height // 16))
+        generator_button.set_pos(menu_width * 9 // 32 + screen_width * 4 // 5, new_height + menu_height // 32)
+        generate_button.set_size((menu_width * 7 // 16 - menu_width // 32, menu_height // 16))
+        generate_button.set_pos(menu_width * 23 // 32 + screen_width * 4 // 5, new_height + menu_height // 32)
+        setting_heights.append(new_height)  # Add height to settings heights
 
         # Set size and position for the add planet button
         add_planet_button.set_size((menu_width - menu_width // 8, menu_height // 16))
@@ -563,8 +840,8 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
                                      new_height + SETTINGS_BUTTON_SIZE[0])
 
         # Create labels for force vectors setting
-        force_label_1 = FONT_2.render("Toggle Force", False, COLOR)
-        force_label_2 = FONT_2.render("Vectors (white)", False, COLOR)
+        force_label_1 = text_cache.render(FONT_2, "Toggle Force", False, COLOR)
+        force_label_2 = text_cache.render(FONT_2, "Vectors (white)", False, COLOR)
         global force_labels
         force_labels = [force_label_1, force_label_2]  # Store labels in the list
         setting_heights.append(new_height)  # Add height to settings heights
@@ -576,8 +853,8 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
                                         new_height + SETTINGS_BUTTON_SIZE[0])
 
         # Create labels for velocity vectors setting
-        velocity_label_1 = FONT_2.render("Toggle Velocity", False, (153, 255, 153))
-        velocity_label_2 = FONT_2.render("Vectors (green)", False, (153, 255, 153))
+        velocity_label_1 = text_cache.render(FONT_2, "Toggle Velocity", False, (153, 255, 153))
+        velocity_label_2 = text_cache.render(FONT_2, "Vectors (green)", False, (153, 255, 153))
         global velocity_labels
         velocity_labels = [velocity_label_1, velocity_label_2]  # Store labels in the list
         setting_heights.append(new_height)  # Add height to settings heights
@@ -589,14 +866,67 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
                                          new_height + SETTINGS_BUTTON_SIZE[0])
 
         # Create labels for toggle if focused setting
-        toggle_if_label_1 = FONT_2.render("Toggle Vectors Only", False, COLOR)
-        toggle_if_label_2 = FONT_2.render("When Focused Onto", False, COLOR)
-        toggle_if_label_3 = FONT_2.render("Labels", False, COLOR)
+        toggle_if_label_1 = text_cache.render(FONT_2, "Toggle Vectors Only", False, COLOR)
+        toggle_if_label_2 = text_cache.render(FONT_2, "When Focused Onto", False, COLOR)
+        toggle_if_label_3 = text_cache.render(FONT_2, "Labels", False, COLOR)
         global toggle_if_labels
         toggle_if_labels = [toggle_if_label_1, toggle_if_label_2, toggle_if_label_3]  # Store labels in the list
         setting_heights.append(new_height)  # Add height to settings heights
         new_height += SETTINGS_BUTTON_SIZE[0] + menu_height // 40  # Update height after button
 
+        # Position the Barnes-Hut button
+        barnes_hut_button.set_size(SETTINGS_BUTTON_SIZE)
+        barnes_hut_button.set_pos(SETTINGS_BUTTON_SIZE[0] + screen_width * 4 // 5,
+                                  new_height + SETTINGS_BUTTON_SIZE[0])
+
+        # Create labels for the Barnes-Hut setting
+        barnes_hut_label_1 = text_cache.render(FONT_2, "Barnes-Hut", False, COLOR)
+        barnes_hut_label_2 = text_cache.render(FONT_2, "Gravity (tree)", False, COLOR)
+        global barnes_hut_labels
+        barnes_hut_labels = [barnes_hut_label_1, barnes_hut_label_2]  # Store labels in the list
+        setting_heights.append(new_height)  # Add height to settings heights
+        new_height += SETTINGS_BUTTON_SIZE[0] + menu_height // 40  # Update height after button
+
+        # Position the multi-core gravity button
+        parallel_button.set_size(SETTINGS_BUTTON_SIZE)
+        parallel_button.set_pos(SETTINGS_BUTTON_SIZE[0] + screen_width * 4 // 5,
+                                new_height + SETTINGS_BUTTON_SIZE[0])
+        setting_heights.append(new_height)  # Add height to settings heights
+        new_height += SETTINGS_BUTTON_SIZE[0] + menu_height // 40  # Update height after button
+
+        # The opening angle applies straight away when the tree is in use
+        backend = planet_group.engine.force_backend
+        if backend.name == "barnes_hut":
+            backend.theta = theta_slider.getValue()
+        new_height += SETTINGS_BUTTON_SIZE[0] // 2  # Clear the bottom half of the button
+        new_height += add_menu_subtitles("Opening Angle θ: " + f'{theta_slider.getValue():.2f}', menu,
+                                         new_height) + menu_height // 80  # Add opening angle subtitle
+
+        # Position the opening angle slider
+        theta_slider.setX(widget_x_offset)
+        theta_slider.setY(new_height)
+        new_height += theta_slider.getHeight() + menu_height // 40  # Update height after slider
+
+        # The timestep applies straight away as well
+        planet_group.timestep = timestep_slider.getValue()
+        new_height += add_menu_subtitles("Timestep: " + f'{timestep_slider.getValue() / 3600:.1f}h', menu,
+                                         new_height) + menu_height // 80  # Add timestep subtitle
+
+        # Position the timestep slider
+        timestep_slider.setX(widget_x_offset)
+        timestep_slider.setY(new_height)
+        new_height += timestep_slider.getHeight() + menu_height // 40  # Update height after slider
+        # How far total energy has wandered since the last edit, to judge whether the timestep is safe
+        drift = planet_group.diagnostics.drift()
+        new_height += add_menu_subtitles("Energy Drift: " + (f"{drift:.1e}" if drift is not None else "-"), menu,
+                                         new_height) + menu_height // 80  # Add energy drift subtitle
+
+        # Set size and position for the integrator button
+        integrator_button.set_size((menu_width - menu_width // 8, menu_height // 16))
+        integrator_button.set_pos(menu_width // 2 + screen_width * 4 // 5, new_height + menu_height // 32)
+        setting_heights.append(new_height)  # Add height to settings heights
+        new_height += menu_height // 16  # Update height after button
+
         pygame.draw.line(menu, COLOR, (0, new_height + menu_height // 20),
                          (menu_width, new_height + menu_height // 20), 4)  # Draw a separator line
         new_height += menu_height // 20 + menu_height // 40  # Update height
@@ -661,6 +991,11 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
         graph_width, graph_height = graph.get_size()
         menu.blit(graph, ((menu_width - graph_width) / 2, new_height))  # Draw the graph on the menu
 
+        # Set size and position for the ring button
+        ring_button.set_size((menu_width - menu_width // 8, menu_height // 16))
+        ring_button.set_pos(menu_width // 2 + screen_width * 4 // 5,
+                            menu_height - menu_height // 16 * 3 - menu_height // 32)
+
         # Set size and position for the edit button
         edit_planet_button.set_size((menu_width - menu_width // 8, menu_height // 16))
         edit_planet_button.set_pos(menu_width // 2 + screen_width * 4 // 5,
@@ -711,6 +1046,18 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
 
         edit_planet_group.show()  # Show the editing options group
 
+    # Draw the predicted path of the planet being set up, computed in the background as the sliders move
+    if type in ("add", "edit"):
+        target = args[0] if type == "edit" else None  # Editing predicts from where the planet is now
+        trajectory_preview.watch(planet_group.engine, target)
+        path = trajectory_preview.request(0 if type == "add" and add_as_particle else mass_slider.getValue(),
+                                          velocity_slider.getValue(), velocity_angle_slider.getValue(),
+                                          distance_slider.getValue() if type == "add" else None)
+        if path is not None and len(path) > 1:
+            points = path * (PlanetaryObject.SCALE * cam_group.scale_size) + (screen_width / 2 + cam_group.offset.x,
+                                                                              screen_height / 2 + cam_group.offset.y)
+            pygame.draw.lines(screen, "gray", False, points.tolist(), 1)
+
     screen.blit(menu, (screen_width * 4 // 5, 0))  # Draw the menu on the screen
 
     # Instantiate text that is drawn onto the menu Surface directly. Needs to be seperated
@@ -719,10 +1066,18 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
     # menu surface
     if type == "add":  # If the menu type is for adding a planet
         add_menu_buttons.draw(screen)  # Draw buttons for adding a planet
-        edit_button_label = FONT_2.render("Add Planet", False, COLOR)  # Create label for adding a planet
+        edit_button_label = text_cache.render(FONT_2, "Add Planet", False, COLOR)  # Create label for adding a planet
         add_button_label_size = edit_button_label.get_rect().size  # Get label size
         screen.blit(edit_button_label, (menu_width // 2 - add_button_label_size[0] // 2 + + screen_width * 4 // 5,
                                         menu_height - menu_height // 16 - add_button_label_size[1] // 2))  # Draw label
+        draw_button_labels_centered(particle_labels, SETTINGS_BUTTON_SIZE[0] * 1.75 + screen_width * 4 // 5,
+                                    setting_heights[0] + SETTINGS_BUTTON_SIZE[0])  # Draw test particle label
+
+        # Draw the labels of the generator and generate buttons
+        for label, x_pos in ((generator_label, menu_width * 9 // 32), (generate_label, menu_width * 23 // 32)):
+            label_size = label.get_rect().size  # Get label size
+            screen.blit(label, (x_pos - label_size[0] // 2 + screen_width * 4 // 5,
+                                setting_heights[1] + menu_height // 32 - label_size[1] // 2))
     elif type == "settings":  # If the menu type is for settings
         settings_menu_buttons.draw(screen)  # Draw buttons for settings
         button_size = (menu_width // 5, menu_width // 5)  # Define button size
@@ -734,22 +1089,39 @@ def bring_menu(type, *args):  # create a menu Surface depending on if its an add
                                     setting_heights[1] + button_size[0])
         draw_button_labels_centered(toggle_if_labels, button_size[0] * 1.75 + screen_width * 4 // 5,
                                     setting_heights[2] + button_size[0])
+        draw_button_labels_centered(barnes_hut_labels, button_size[0] * 1.75 + screen_width * 4 // 5,
+                                    setting_heights[3] + button_size[0])
+        draw_button_labels_centered(parallel_labels, button_size[0] * 1.75 + screen_width * 4 // 5,
+                                    setting_heights[4] + button_size[0])
+
+        # Draw the current integrator on its button
+        integrator_label = text_cache.render(FONT_2, "Integrator: "
+                                             + INTEGRATOR_LABELS[planet_group.engine.integrator.name], False, COLOR)
+        integrator_label_size = integrator_label.get_rect().size  # Get label size
+        screen.blit(integrator_label, (menu_width // 2 - integrator_label_size[0] // 2 + screen_width * 4 // 5,
+                                       setting_heights[5] + menu_height // 32 - integrator_label_size[1] // 2))
     elif type == "planet":  # If the menu type is for a planet
         view_menu_buttons.draw(screen)  # Draw the buttons for viewing planets
-        edit_button_label = FONT_2.render("Edit Planet", False, COLOR)  # Create label for editing a planet
+        edit_button_label = text_cache.render(FONT_2, "Edit Planet", False, COLOR)  # Create label for editing a planet
         add_button_label_size = edit_button_label.get_rect().size  # Get size of the edit button label
         screen.blit(edit_button_label, (menu_width // 2 - add_button_label_size[0] // 2 + + screen_width * 4 // 5,
                                         menu_height - menu_height // 8 - add_button_label_size[
                                             1]))  # Draw the edit button label
 
-        edit_button_label = FONT_2.render("Delete Planet", False, COLOR)  # Create label for deleting a planet
+        edit_button_label = text_cache.render(FONT_2, "Add Ring", False, COLOR)  # Create label for adding a ring
+        add_button_label_size = edit_button_label.get_rect().size  # Get size of the ring button label
+        screen.blit(edit_button_label, (menu_width // 2 - add_button_label_size[0] // 2 + screen_width * 4 // 5,
+                                        menu_height - menu_height // 16 * 3 - menu_height // 32 -
+                                        add_button_label_size[1] // 2))  # Draw the ring button label
+
+        edit_button_label = text_cache.render(FONT_2, "Delete Planet", False, COLOR)  # Label for deleting a planet
         add_button_label_size = edit_button_label.get_rect().size  # Get size of the delete button label
         screen.blit(edit_button_label, (menu_width // 2 - add_button_label_size[0] // 2 + + screen_width * 4 // 5,
                                         menu_height - menu_height // 16 - add_button_label_size[
                                             1] // 2))  # Draw the delete button label
     elif type == "edit":  # If the menu type is for editing a planet
         edit_done_buttons.draw(screen)  # Draw the buttons for confirming edits
-        edit_button_label = FONT_2.render("Edit Done", False, COLOR)  # Create label for confirming edits
+        edit_button_label = text_cache.render(FONT_2, "Edit Done", False, COLOR)  # Create label for confirming edits
         add_button_label_size = edit_button_label.get_rect().size  # Get size of the confirm button label
         screen.blit(edit_button_label, (menu_width // 2 - add_button_label_size[0] // 2 + + screen_width * 4 // 5,
                                         menu_height - menu_height // 16 - add_button_label_size[
@@ -774,12 +1146,6 @@ def draw_button_labels_centered(label_list, x_pos, y_pos):
         y += label.get_height()  # Increment y position for the next label
 
 
-# Asynchronously save planet data to a file
-async def save_data(planets_data):
-    with open(dir_path + "/assets/data/planets_data.pkl", 'wb') as f:  # Open file for writing
-        pickle.dump(planets_data, f)  # Serialize and save the planet data
-
-
 # Asynchronously change the graph based on the planet's data
 async def change_graph(planet):
     plt.close()  # Close any existing plots
@@ -809,7 +1175,7 @@ async def change_graph(planet):
 
 # Function to add a title to the menu
 def add_menu_title(title_string, menu):
-    title = FONT_1.render(title_string, True, COLOR)  # Render the title string
+    title = text_cache.render(FONT_1, title_string, True, COLOR)  # Render the title string
     menu.blit(title, ((menu_width - title.get_width()) // 2, menu_height // 40))  # Draw the title on the menu
     pygame.draw.line(menu, COLOR, (0, title.get_height() + menu_height // 20),
                      (menu_width, title.get_height() + menu_height // 20), 4)  # Draw a line under the title
@@ -819,7 +1185,7 @@ def add_menu_title(title_string, menu):
 
 # Function to add subtitles to the menu
 def add_menu_subtitles(subtitle_string, menu, y):
-    subtitle = FONT_2.render(subtitle_string, True, COLOR)  # Render the subtitle string
+    subtitle = text_cache.render(FONT_2, subtitle_string, True, COLOR)  # Render the subtitle string
     menu.blit(subtitle, (menu_width // 8 - menu_height // 80, y))  # Draw the subtitle on the menu
     return subtitle.get_height()  # Return the height of the subtitle
 
@@ -831,6 +1197,7 @@ def reset_menu():
     edit_planet_group.hide()  # Hide the edit planet menu
     settings_menu_group.hide()  # Hide the settings menu
     planet_group.unfocus()  # Unfocus all planets
+    trajectory_preview.reset()  # The next menu predicts against the scene as it is then
     add_button.change_x(a_s_x_pos)  # Reset add button position
     settings_button.change_x(a_s_x_pos)  # Reset settings button position
 
@@ -842,4 +1209,7 @@ def reset_menu():
 
 # Entry point of the program
 if __name__ == '__main__':
+    # Worker processes rebuild __main__ by running the main script again, which here would open another window.
+    # They leave a main module named like a package's __main__ alone, and need only the helpers, so it is named so
+    __spec__ = ModuleSpec("__main__", None)
     main()  # Call the main function to start the simulation
@@ -0,0 +1,164 @@
+from collections import deque  # Import deque for the errors of the last few measurements
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.physics import field_accelerations  # Exact summation, used to measure the tree's error
+
+
+class QuadTree:  # Quadtree over the bodies, built one level at a time for all nodes at once
+    def __init__(self, pos, mass, max_depth=32):
+        n = len(pos)  # Number of bodies
+        lo, hi = pos.min(axis=0), pos.max(axis=0)  # Bounding box of the bodies
+        half = max(float((hi - lo).max()) / 2, 1.0) * 1.0001  # Half the root's side, padded slightly
+
+        # Per-node data, gathered level by level and joined at the end
+        centers = [((lo + hi) / 2)[None, :]]  # Center of each node's square
+        halves = [np.array([half])]  # Half of each node's side length
+        masses = [np.array([mass.sum()])]  # Total mass inside each node
+        coms = [(mass @ pos / mass.sum() if mass.sum() > 0 else pos.mean(axis=0))[None, :]]  # Centers of mass
+        counts = [np.array([n])]  # Number of bodies inside each node
+        first_child = [np.array([-1])]  # Index of each node's first child, -1 for leaves
+
+        body_node = np.zeros(n, dtype=np.intp)  # Deepest node reached so far by each body
+        level_start, level_size, total = 0, 1, 1  # Node range of the current level
+        for _ in range(max_depth):
+            level = slice(level_start, level_start + level_size)
+            split = np.flatnonzero(counts[-1] > 1) + level_start  # Nodes on this level holding several bodies
+            if len(split) == 0:
+                break
+
+            # Give every split node four consecutive children
+            children_of = np.full(total, -1, dtype=np.intp)
+            children_of[split] = total + 4 * np.arange(len(split))
+            first_child[-1] = children_of[level]
+
+            # Drop each body of a split node into the quadrant it lies in
+            moving = np.flatnonzero(children_of[body_node] >= 0)
+            parent = body_node[moving]
+            parent_center = np.concatenate(centers)[parent]
+            quadrant = (pos[moving, 0] > parent_center[:, 0]) + 2 * (pos[moving, 1] > parent_center[:, 1])
+            body_node[moving] = children_of[parent] + quadrant
+
+            # Geometry of the new children
+            parent_half = np.repeat(np.concatenate(halves)[split], 4)
+            signs = np.array([[-1, -1], [1, -1], [-1, 1], [1, 1]])  # Quadrant offsets in child order
+            child_centers = (np.repeat(np.concatenate(centers)[split], 4, axis=0)
+                             + np.tile(signs, (len(split), 1)) * parent_half[:, None] / 2)
+
+            # Mass, center of mass and count of the new children
+            local = body_node[moving] - total  # Child index within this level
+            size = 4 * len(split)
+            m = mass[moving]
+            child_mass = np.bincount(local, weights=m, minlength=size)
+            child_count = np.bincount(local, minlength=size)
+            child_com = np.zeros((size, 2))
+            for axis in range(2):
+                weighted = np.bincount(local, weights=m * pos[moving, axis], minlength=size)
+                plain = np.bincount(local, weights=pos[moving, axis], minlength=size)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    # Massless groups fall back to their plain centroid
+                    child_com[:, axis] = np.where(child_mass > 0, weighted / child_mass,
+                                                  plain / np.maximum(child_count, 1))
+
+            centers.append(child_centers)
+            halves.append(parent_half / 2)
+            masses.append(child_mass)
+            coms.append(child_com)
+            counts.append(child_count)
+            first_child.append(np.full(size, -1, dtype=np.intp))
+            level_start, level_size, total = total, size, total + size
+
+        self.center = np.concatenate(centers)
+        self.half = np.concatenate(halves)
+        self.mass = np.concatenate(masses)
+        self.com = np.concatenate(coms)
+        self.count = np.concatenate(counts)
+        self.first_child = np.concatenate(first_child)
+        self.body_leaf = body_node  # Leaf holding each body
+
+    def accelerations(self, pos, mass, G, theta, out):  # Walk the tree for every body at once
+        n = len(pos)
+        out[:] = 0
+        theta2 = theta * theta
+        bodies = np.arange(n)  # Each (body, node) pair still to be considered
+        nodes = np.zeros(n, dtype=np.intp)
+        while len(bodies):
+            node_mass = self.mass[nodes]
+            com = self.com[nodes]
+            target = pos[bodies]
+            leaf = self.first_child[nodes] < 0
+
+            # The body's own leaf is skipped; other bodies sharing it at the deepest level count as coincident
+            own = leaf & (self.body_leaf[bodies] == nodes)
+
+            d = com - target
+            r2 = np.einsum("ij,ij->i", d, d)
+            side = 2 * self.half[nodes]
+            inside = np.all(np.abs(target - self.center[nodes]) <= self.half[nodes, None], axis=1)
+            accept = leaf | (~inside & (side * side < theta2 * r2))  # Opening-angle test
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                w = np.where(accept & ~own & (r2 > 0) & (node_mass > 0),
+                             G * node_mass / (r2 * np.sqrt(r2)), 0.0)
+            for axis in range(2):
+                out[:, axis] += np.bincount(bodies, weights=w * d[:, axis], minlength=n)
+
+            # Replace every opened node by its non-empty children
+            opened = ~accept
+            bodies = np.repeat(bodies[opened], 4)
+            nodes = (self.first_child[nodes[opened]][:, None] + np.arange(4)).ravel()
+            keep = self.count[nodes] > 0
+            bodies, nodes = bodies[keep], nodes[keep]
+        return out
+
+
+class BarnesHut:  # O(N log N) force backend that treats distant groups of bodies as single masses
+    name = "barnes_hut"  # Name stored in saved scenes
+
+    # The relative errors are heavy-tailed, a few bodies next to an accepted node carrying most of the RMS, so
+    # a small sample mostly misses them. The error shown pools the squared errors of the last few measurements.
+    def __init__(self, theta=0.5, max_depth=32, error_interval=60, error_samples=256, error_window=8):
+        self._theta = theta  # Opening angle; smaller is more accurate and slower
+        self.max_depth = max_depth  # Deepest level, so coincident bodies cannot split forever
+        self.error_interval = error_interval  # Evaluations between error measurements
+        self.error_samples = error_samples  # Bodies checked against direct summation in each measurement
+        self.errors = deque(maxlen=error_window)  # Sum of squared relative errors and bodies of recent measurements
+        self.force_error = None  # RMS relative error against direct summation over the recent measurements
+        self.evaluations = 0  # Number of force evaluations done
+        self.rng = np.random.default_rng()
+
+    @property
+    def theta(self):
+        return self._theta
+
+    @theta.setter
+    def theta(self, value):  # Errors measured at another opening angle no longer apply
+        if value != self._theta:
+            self.errors.clear()
+            self.force_error = None
+        self._theta = value
+
+    def settings(self):  # Options needed to rebuild this backend
+        return {"theta": self.theta}
+
+    def accelerations(self, pos, mass, G, out=None):  # Accelerations of every body
+        acc = np.zeros((len(pos), 2)) if out is None else out
+        acc[:] = 0
+        if len(pos) < 2:
+            return acc
+        QuadTree(pos, mass, self.max_depth).accelerations(pos, mass, G, self.theta, acc)  # Rebuilt every step
+
+        if self.evaluations % self.error_interval == 0:  # Measure the error now and then
+            self.errors.append(self.measure_error(pos, mass, G, acc))
+            squares, count = np.sum(self.errors, axis=0)
+            self.force_error = float(np.sqrt(squares / count)) if count else 0.0
+        self.evaluations += 1
+        return acc
+
+    def measure_error(self, pos, mass, G, acc):  # Sum of squared relative errors of a sample, and its size
+        sample = self.rng.choice(len(pos), min(self.error_samples, len(pos)), replace=False)
+        exact = field_accelerations(pos[sample], pos, mass, G)
+        norm = np.linalg.norm(exact, axis=1)
+        valid = norm > 0
+        error = np.linalg.norm(acc[sample] - exact, axis=1)[valid] / norm[valid]
+        return float(np.sum(error ** 2)), len(error)
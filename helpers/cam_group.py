@@ -2,6 +2,10 @@ import pygame  # Import Pygame for game development
 
 
 class CamGroup(pygame.sprite.Group):  # Class to manage camera movements
+    MIN_SCALE = 0.01  # Furthest the camera zooms out, as a multiple of the default scale
+    MAX_SCALE = 1000  # Furthest the camera zooms in
+    ZOOM_STEP = 1.15  # Zoom factor for each notch of the mouse wheel
+
     def __init__(self):
         super().__init__()  # Initialize the parent sprite group
         self.offset = pygame.math.Vector2()  # Initialize offset for camera position
@@ -12,7 +16,16 @@ class CamGroup(pygame.sprite.Group):  # Class to manage camera movements
     def reset_scales(self):  # Method to reset camera position and scale
         self.offset.x = 0  # Reset x offset
         self.offset.y = 0  # Reset y offset
-        self.scale_size = 0.6  # Set default scale size
+        self.scale_size = 1  # Set default scale size, the multiple of the default zoom everything is drawn at
+
+    def zoom_at(self, pos, factor):  # Zoom by a factor, keeping what is under a screen position in place
+        scale_size = min(max(self.scale_size * factor, self.MIN_SCALE), self.MAX_SCALE)
+        width, height = pygame.display.get_surface().get_size()
+        # Screen positions are the scene scaled about the screen center, then shifted by the offset
+        center_x, center_y = pos[0] - width / 2, pos[1] - height / 2
+        self.offset.x = center_x - (center_x - self.offset.x) * scale_size / self.scale_size
+        self.offset.y = center_y - (center_y - self.offset.y) * scale_size / self.scale_size
+        self.scale_size = scale_size
 
     def check_collision(self, event):  # Method to handle mouse events for dragging
         mouse_x, mouse_y = pygame.mouse.get_pos()  # Get current mouse position
@@ -29,6 +42,9 @@ class CamGroup(pygame.sprite.Group):  # Class to manage camera movements
                 self.offset.x = mouse_x + self.clickstart_offset.x  # Update x offset
                 self.offset.y = mouse_y + self.clickstart_offset.y  # Update y offset
 
+        elif event.type == pygame.MOUSEWHEEL:  # If the mouse wheel is turned
+            self.zoom_at((mouse_x, mouse_y), self.ZOOM_STEP ** event.y)  # Zoom in or out at the cursor
+
         elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:  # If space key is pressed
             self.reset_scales()  # Reset camera scales
 
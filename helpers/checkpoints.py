@@ -0,0 +1,49 @@
+from collections import deque  # Import deque for the ring of checkpoints
+
+import numpy as np  # Import NumPy for vectorized array math
+
+
+class CheckpointRing:  # Bounded history of engine snapshots, for rewinding to any earlier step
+    def __init__(self, every=60, memory_cap=64 * 2 ** 20):
+        self.every = every  # Steps between regular checkpoints
+        self.memory_cap = memory_cap  # Bytes of snapshot arrays kept before the oldest checkpoints are dropped
+        self.memory = 0  # Bytes of snapshot arrays currently kept
+        self.checkpoints = deque()  # (step, snapshot, extra, size) from oldest to newest
+
+    def __len__(self):
+        return len(self.checkpoints)
+
+    @property
+    def oldest(self):  # Earliest step that can be rewound to, or None before the first checkpoint
+        return self.checkpoints[0][0] if self.checkpoints else None
+
+    def record(self, step, engine, extra=None, force=False):  # Take a checkpoint before this step if one is due
+        # Forced checkpoints follow edits made outside of stepping, which re-simulating could not reproduce
+        newest = self.checkpoints[-1][0] if self.checkpoints else None
+        if not force and (step % self.every or step == newest):
+            return
+        if step == newest:  # Replace the checkpoint taken before the edit
+            self.memory -= self.checkpoints.pop()[3]
+        snapshot = engine.snapshot()
+        size = sum(value.nbytes for value in snapshot.values() if isinstance(value, np.ndarray))
+        self.checkpoints.append((step, snapshot, extra, size))
+        self.memory += size
+        while self.memory > self.memory_cap and len(self.checkpoints) > 1:  # Always keep the newest one
+            self.memory -= self.checkpoints.popleft()[3]
+
+    def find(self, step):  # Newest checkpoint at or before a step, else the oldest one; None if there are none
+        for checkpoint in reversed(self.checkpoints):
+            if checkpoint[0] <= step:
+                return checkpoint
+        return self.checkpoints[0] if self.checkpoints else None
+
+    def restore(self, checkpoint, engine):  # Put a checkpoint's state back into the engine; returns its step
+        step, snapshot = checkpoint[:2]
+        engine.restore(snapshot)
+        while self.checkpoints[-1][0] > step:  # The later history is re-simulated from here
+            self.memory -= self.checkpoints.pop()[3]
+        return step
+
+    def clear(self):  # Forget every checkpoint
+        self.checkpoints.clear()
+        self.memory = 0
@@ -0,0 +1,90 @@
+import numpy as np  # Import NumPy for vectorized array math
+
+
+COLLISION_MODES = ("off", "merge", "bounce")  # What happens when two bodies touch
+COLLISION_LABELS = {"merge": "Merge", "bounce": "Bounce", "off": "Off"}  # Names shown on screen
+
+# Neighboring cells checked from each cell; the other half is covered from the neighbors' side
+_HALF_NEIGHBORHOOD = np.array([(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)])
+
+
+def candidate_pairs(center, reach):  # Pairs of bodies whose reach may overlap, from a uniform-grid spatial hash
+    n = len(center)
+    if n < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    cell = 2 * float(reach.max())  # Bodies in cells that are not neighbors can never touch
+    if cell <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    cells = np.floor(center / cell).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # Positive cell coordinates with a free border around them
+    width = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * width + cells[:, 1]  # One integer key per cell
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    first, second = [], []
+    for dx, dy in _HALF_NEIGHBORHOOD:
+        wanted = keys + dx * width + dy  # Key of the neighboring cell of every body
+        start = np.searchsorted(sorted_keys, wanted, side="left")
+        stop = np.searchsorted(sorted_keys, wanted, side="right")
+        counts = stop - start
+        bodies = np.repeat(np.arange(n), counts)
+        # Position of each candidate within its neighbor's run of sorted bodies
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        others = order[np.repeat(start, counts) + offsets]
+        if dx == 0 and dy == 0:  # Bodies in the same cell, each pair once
+            keep = bodies < others
+            bodies, others = bodies[keep], others[keep]
+        first.append(bodies)
+        second.append(others)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def find_contacts(start, end, radius):  # Pairs that touch during a step, with the fraction of the step they touch at
+    moved = end - start
+    center = (start + end) / 2  # Each body's swept path fits in a circle around its midpoint
+    reach = radius + np.hypot(*moved.T) / 2
+    i, j = candidate_pairs(center, reach)
+
+    # Narrow phase: solve |p + t d| = r_i + r_j for the first t in [0, 1]
+    p = start[j] - start[i]
+    d = moved[j] - moved[i]
+    total = radius[i] + radius[j]
+    a = np.einsum("ij,ij->i", d, d)
+    b = 2 * np.einsum("ij,ij->i", p, d)
+    c = np.einsum("ij,ij->i", p, p) - total * total
+    discriminant = b * b - 4 * a * c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(a > 0, (-b - np.sqrt(np.maximum(discriminant, 0))) / (2 * a), np.inf)
+    touching = (c <= 0) | ((discriminant >= 0) & (b < 0) & (t <= 1))  # Overlapping, or closing in this step
+    t = np.where(c <= 0, 0.0, t)[touching]
+    order = np.argsort(t, kind="stable")  # Earliest contacts first
+    return i[touching][order], j[touching][order], t[order]
+
+
+def resolve_contacts(engine, mode, restitution=1.0):  # Apply collisions after a step; returns the merges made
+    # Each merge is (kept, absorbed, x, y): the kept row now holds both bodies and the absorbed row must be removed
+    n = engine.count
+    if mode == "off" or n < 2:
+        return []
+    end = engine.positions
+    start = end
+    if engine.previous is not None and engine.previous[0].shape == end.shape:
+        start = engine.previous[0]  # Positions before the step, for the swept test
+    first, second, _ = find_contacts(start, end, engine.collision_radii())
+
+    merges, gone = [], set()
+    for i, j in zip(first.tolist(), second.tolist()):
+        if i in gone or j in gone:  # Already absorbed by an earlier contact this step
+            continue
+        if mode == "merge":
+            # The sun, or else the heavier body, survives
+            kept, absorbed = (i, j) if (engine.sun[i], engine.mass[i]) >= (engine.sun[j], engine.mass[j]) else (j, i)
+            x, y = engine.merge_bodies(kept, absorbed)
+            merges.append((kept, absorbed, x, y))
+            gone.add(absorbed)
+        else:
+            engine.bounce_bodies(i, j, restitution)
+    if first.size:
+        engine.mark_changed()  # Forces and velocities changed outside of stepping
+    return merges
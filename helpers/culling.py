@@ -0,0 +1,27 @@
+import numpy as np  # Import NumPy for testing whole polylines at once
+
+
+def in_view(left, top, right, bottom, size):  # True if a box in screen coordinates overlaps the screen
+    return right >= 0 and bottom >= 0 and left < size[0] and top < size[1]
+
+
+def visible_runs(points, size, margin=0):  # Stretches of a screen-space polyline with segments on screen
+    # A segment is kept if the box around its two ends overlaps the screen, so nothing on screen is lost, and
+    # the polyline is cut where segments are dropped, so each run can be drawn with a single lines call
+    low, high = np.minimum(points[:-1], points[1:]), np.maximum(points[:-1], points[1:])
+    visible = np.all((high >= -margin) & (low < np.add(size, margin)), axis=1)
+    if visible.all():
+        return [points]
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], visible.view(np.int8), [0]))))
+    return [points[start:end + 1] for start, end in zip(edges[::2].tolist(), edges[1::2].tolist())]
+
+
+def decimate_pixels(points):  # Screen-space polyline without points landing on the pixel of the one before
+    # Zoomed out, many recorded points fall on the same pixel; dropping them moves the line by at most a pixel
+    if len(points) < 3:
+        return points
+    pixels = np.floor(points)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(pixels[1:] != pixels[:-1], axis=1)
+    keep[-1] = True  # The line always reaches the latest position
+    return points[keep]
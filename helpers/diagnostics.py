@@ -0,0 +1,63 @@
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.physics import potential_energy  # Import the pairwise potential energy
+from helpers.ring_buffer import RingBuffer  # Import the fixed-capacity buffer holding the samples
+
+
+FIELDS = ("step", "time", "kinetic", "potential", "energy", "momentum_x", "momentum_y", "angular_momentum")
+
+
+def conserved_quantities(engine):  # Totals over every body, in the order of FIELDS after step and time
+    # Test particles are massless, so they add nothing to any of the totals
+    pos, vel, mass = engine.positions, engine.velocities, engine.masses
+    kinetic = 0.5 * float(mass @ np.einsum("ij,ij->i", vel, vel))
+    potential = potential_energy(pos, mass, engine.G)  # Every pair, not only the pull of the sun
+    momentum = mass @ vel
+    angular = float(mass @ (pos[:, 0] * vel[:, 1] - pos[:, 1] * vel[:, 0]))  # About the origin
+    return kinetic, potential, kinetic + potential, float(momentum[0]), float(momentum[1]), angular
+
+
+class Diagnostics:  # Conserved quantities of a scene sampled every few steps, kept as time series
+    # Drift is measured against the first sample after the scene was last edited, since adding, moving or
+    # merging planets changes the totals without the integrator being at fault
+    def __init__(self, every=10, capacity=5000):
+        self.every = every  # Steps between samples
+        self.samples = RingBuffer(capacity, (len(FIELDS),))  # One row of FIELDS per sample, oldest dropped first
+        self.baseline = None  # Sample the drift is measured against
+        self.changes = None  # Engine change counter when the baseline was taken
+
+    def __len__(self):
+        return len(self.samples)
+
+    def record(self, step, time, engine):  # Sample the engine after a step if one is due
+        if step % self.every:
+            return
+        sample = np.array((step, time) + conserved_quantities(engine))
+        self.samples.append(sample)
+        if engine.changes != self.changes:  # Edited since the baseline was taken
+            self.baseline, self.changes = sample, engine.changes
+
+    def series(self, name):  # Samples of one field from oldest to newest
+        return self.samples.view()[:, FIELDS.index(name)]
+
+    def latest(self):  # Newest sample as a dictionary, or None before the first one
+        if not len(self.samples):
+            return None
+        return dict(zip(FIELDS, self.samples.view()[-1].tolist()))
+
+    def drift(self, name="energy"):  # Relative change of a field since the baseline, or None without one
+        if self.baseline is None:
+            return None
+        index = FIELDS.index(name)
+        start, now = self.baseline[index], self.samples.view()[-1, index]
+        return abs(now - start) / abs(start) if start else abs(now - start)
+
+    def rewind(self, step):  # Drop the samples taken after a step
+        samples = self.samples.view()
+        self.samples.reset(samples[samples[:, 0] <= step])
+        if self.baseline is not None and self.baseline[0] > step:  # Taken again when the step comes round
+            self.baseline = self.changes = None
+
+    def clear(self):  # Forget every sample
+        self.samples.reset()
+        self.baseline = self.changes = None
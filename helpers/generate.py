@@ -0,0 +1,81 @@
+import numpy as np  # Import NumPy for generating whole populations at once
+
+from helpers.physics import PhysicsEngine  # Import the engine for its gravitational constant
+from helpers.simulation import AU, SUN_MASS, PLANET_RADIUS  # Import the units scenes are built in
+
+
+EARTH_MASS = 5.9722e24  # Mass of the earth in kilograms
+BELT = (2.2 * AU, 3.2 * AU)  # Inner and outer edge of the main asteroid belt
+RING = (0.25, 0.5)  # Edges of a ring as fractions of the planet's Hill radius, within which orbits stay bound
+PLANET_LETTERS = "bcdefghijklmnopqrstuvwxyz"  # Planets of a system are named after their star in this order
+
+
+def kepler_orbits(rng, count, inner, outer, central_mass, max_eccentricity=0.0):  # Positions and velocities
+    # Orbits around a central body at the origin, turning the same way as planets added from the menu.
+    # Semi-major axes are spread evenly over the area between the two radii, so the surface density is even.
+    a = np.sqrt(rng.uniform(np.square(inner), np.square(outer), count))
+    e = rng.uniform(0, max_eccentricity, count)
+    anomaly = rng.uniform(0, 2 * np.pi, count)  # True anomaly, where on its orbit each body is
+    angle = anomaly + rng.uniform(0, 2 * np.pi, count)  # Plus the direction of the periapsis
+    p = a * (1 - e ** 2)  # Semi-latus rectum
+    r = p / (1 + e * np.cos(anomaly))
+    speed = np.sqrt(PhysicsEngine.G * central_mass / p)
+    radial, tangential = speed * e * np.sin(anomaly), speed * (1 + e * np.cos(anomaly))
+    direction = np.column_stack((np.cos(angle), np.sin(angle)))
+    tangent = np.column_stack((-direction[:, 1], direction[:, 0]))
+    return r[:, None] * direction, radial[:, None] * direction + tangential[:, None] * tangent
+
+
+def belt(count, inner=BELT[0], outer=BELT[1], max_eccentricity=0.05, central_mass=SUN_MASS, seed=None):
+    # Test particles on Keplerian orbits around the sun at the origin; returns their positions and velocities
+    return kepler_orbits(np.random.default_rng(seed), count, inner, outer, central_mass, max_eccentricity)
+
+
+def hill_radius(engine, index):  # Distance from a body within which its gravity outweighs the pull of the sun
+    suns = np.flatnonzero(engine.sun[:engine.count])
+    if not len(suns) or suns[0] == index:
+        return np.inf
+    distance = float(np.hypot(*(engine.pos[index] - engine.pos[suns[0]])))
+    return distance * float(np.cbrt(engine.mass[index] / (3 * engine.mass[suns[0]])))
+
+
+def ring(engine, index, count, inner=RING[0], outer=RING[1], max_eccentricity=0.0, seed=None):
+    # Test particles orbiting the body at an engine row, between fractions of its Hill radius
+    radius = hill_radius(engine, index)
+    if not np.isfinite(radius):
+        raise ValueError("A ring needs a planet orbiting the sun")
+    pos, vel = kepler_orbits(np.random.default_rng(seed), count, inner * radius, outer * radius,
+                             engine.mass[index], max_eccentricity)
+    return pos + engine.pos[index], vel + engine.vel[index]
+
+
+def random_system(seed=None, planets=(3, 8), inner=0.3 * AU, spacing=(1.3, 1.7), masses=(0.05, 320),
+                  max_eccentricity=0.05, belt_count=5000, belt_chance=0.5):  # Planets and a belt around the sun
+    # Everything is drawn from the seed, so the same seed always builds the same system. Orbits are spaced by
+    # random ratios outward from the inner radius, and masses, in earth masses, are spread evenly in log space.
+    # A belt, if any, fills the widest gap between two planets. Returns the planets in the dictionary form of
+    # saved scenes, named after the seed, and the positions and velocities of the belt.
+    rng = np.random.default_rng(seed)
+    count = int(rng.integers(planets[0], planets[1] + 1))
+    a = inner * np.cumprod(rng.uniform(spacing[0], spacing[1], count))
+    mass = EARTH_MASS * np.exp(rng.uniform(np.log(masses[0]), np.log(masses[1]), count))
+    pos, vel = kepler_orbits(rng, count, a, a, SUN_MASS, max_eccentricity)
+    radius = PLANET_RADIUS * np.clip(np.cbrt(mass / EARTH_MASS), 0.5, 2)  # Drawn radius, larger for heavier
+    colors = rng.integers(100, 256, (count, 3))  # As bright as the colors of planets added from the menu
+
+    star = "System" if seed is None else f"System {seed}"
+    bodies = []
+    for index, (x, y, x_vel, y_vel, m, r, color) in enumerate(zip(
+            pos[:, 0].tolist(), pos[:, 1].tolist(), vel[:, 0].tolist(), vel[:, 1].tolist(), mass.tolist(),
+            radius.tolist(), colors.tolist())):
+        bodies.append({"name": f"{star} {PLANET_LETTERS[index]}", "x": x, "y": y, "x_vel": x_vel, "y_vel": y_vel,
+                       "mass": m, "radius": r, "color": tuple(color), "sun": False, "orbit": [], "KE": [],
+                       "GPE": [], "distance": [], "distance_to_sun": float(np.hypot(x, y)), "total_fx": 0.0,
+                       "total_fy": 0.0, "velocity": float(np.hypot(x_vel, y_vel))})
+
+    particle_pos, particle_vel = np.zeros((0, 2)), np.zeros((0, 2))
+    if count > 1 and rng.random() < belt_chance:
+        gap = int(np.argmax(a[1:] / a[:-1]))
+        particle_pos, particle_vel = kepler_orbits(rng, belt_count, a[gap] * 1.1, a[gap + 1] / 1.1, SUN_MASS,
+                                                   max_eccentricity)
+    return bodies, particle_pos, particle_vel
@@ -0,0 +1,332 @@
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers import jit  # Import the optional compiled kernels
+
+
+# Integrators advance a PhysicsEngine by dt. They read the combined state of bodies and particles with
+# engine.get_state(), evaluate forces with engine.accelerations_at() and write back with engine.set_state().
+
+
+class SemiImplicitEuler:  # First-order symplectic Euler, the original stepping scheme
+    name = "euler"  # Name stored in saved scenes
+
+    def settings(self):  # Options needed to rebuild this integrator
+        return {}
+
+    def step(self, engine, dt):  # Kick with the current forces, then drift
+        pos, vel = engine.get_state()
+        vel += engine.accelerations_at(pos) * dt  # Update velocities based on forces
+        pos += vel * dt  # Update positions based on velocities
+        engine.set_state(pos, vel)
+
+
+class Leapfrog:  # Second-order kick-drift-kick leapfrog
+    name = "leapfrog"
+
+    def __init__(self):
+        self.acc = None  # Accelerations at the end of the last step
+        self.changes = None  # Engine change counter when they were computed
+
+    def settings(self):
+        return {}
+
+    def step(self, engine, dt):
+        pos, vel = engine.get_state()
+        # The closing kick's forces can be reused as long as nothing else moved the bodies since
+        if self.acc is None or self.changes != engine.changes or self.acc.shape != pos.shape:
+            self.acc = engine.accelerations_at(pos)
+        vel += self.acc * (dt / 2)  # Half kick
+        pos += vel * dt  # Full drift
+        self.acc = engine.accelerations_at(pos)
+        vel += self.acc * (dt / 2)  # Half kick
+        engine.set_state(pos, vel)
+        self.changes = engine.changes
+
+
+class JitLeapfrog(Leapfrog):  # Leapfrog compiled with Numba, stepping the engine's arrays in place
+    name = "leapfrog_jit"
+    EXACT = ("direct", "jit")  # Force backends the compiled pair loop can stand in for
+
+    def __init__(self):
+        super().__init__()
+        self.jit_changes = None  # Engine change counter when the engine's forces were last computed here
+
+    def forces(self, engine):  # Fill the engine's acceleration arrays with the compiled kernels
+        pos, mass = engine.positions, engine.masses
+        jit.pair_accelerations(pos, mass, engine.G, engine.accelerations)
+        jit.field_accelerations(engine.particle_positions, pos, mass, engine.G, engine.particle_accelerations)
+
+    def step(self, engine, dt):
+        if not jit.AVAILABLE or engine.force_backend.name not in self.EXACT:  # Use the NumPy path instead
+            self.jit_changes = None
+            return super().step(engine, dt)
+        self.acc = None  # The NumPy path's cached forces go stale while this one runs
+        bodies = engine.positions, engine.velocities, engine.accelerations
+        particles = engine.particle_positions, engine.particle_velocities, engine.particle_accelerations
+        if self.jit_changes != engine.changes:  # Bodies were edited since the last step
+            self.forces(engine)
+        for pos, vel, acc in (bodies, particles):
+            jit.kick(vel, acc, dt / 2)  # Half kick
+            jit.drift(pos, vel, dt)  # Full drift
+        self.forces(engine)
+        for pos, vel, acc in (bodies, particles):
+            jit.kick(vel, acc, dt / 2)  # Half kick
+        self.jit_changes = engine.changes
+
+
+class Yoshida4:  # Fourth-order symplectic integrator built from three leapfrog sub-steps
+    name = "yoshida4"
+    W1 = 1 / (2 - 2 ** (1 / 3))  # Yoshida's weights
+    W0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+    C = (W1 / 2, (W0 + W1) / 2, (W0 + W1) / 2, W1 / 2)  # Drift coefficients
+    D = (W1, W0, W1)  # Kick coefficients
+
+    def settings(self):
+        return {}
+
+    def step(self, engine, dt):
+        pos, vel = engine.get_state()
+        for c, d in zip(self.C, self.D):
+            pos += vel * (c * dt)  # Drift
+            vel += engine.accelerations_at(pos) * (d * dt)  # Kick
+        pos += vel * (self.C[3] * dt)  # Final drift
+        engine.set_state(pos, vel)
+
+
+class RK45:  # Adaptive Dormand-Prince Runge-Kutta 5(4), sub-stepping to land exactly on dt
+    name = "rk45"
+    A = (
+        (),
+        (1 / 5,),
+        (3 / 40, 9 / 40),
+        (44 / 45, -56 / 15, 32 / 9),
+        (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+        (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+        (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+    )  # Stage coefficients; the last row is also the fifth-order solution
+    E = (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)  # Fifth minus fourth order
+    MAX_SUBSTEPS = 1000  # Upper bound on sub-steps per call, so the UI never stalls
+
+    def __init__(self, rtol=1e-9, pos_atol=1.0, vel_atol=1e-4):
+        self.rtol = rtol  # Relative error tolerance
+        self.pos_atol = pos_atol  # Absolute tolerance on positions in meters
+        self.vel_atol = vel_atol  # Absolute tolerance on velocities in m/s
+        self.h = None  # Sub-step size carried over from the last call
+
+    def settings(self):
+        return {"rtol": self.rtol, "pos_atol": self.pos_atol, "vel_atol": self.vel_atol}
+
+    def step(self, engine, dt):
+        pos, vel = engine.get_state()
+        h = dt if self.h is None else min(self.h, dt)
+        t = 0.0
+        for attempt in range(self.MAX_SUBSTEPS):
+            if t >= dt:
+                break
+            final = attempt == self.MAX_SUBSTEPS - 1  # Out of attempts, so this sub-step must reach dt
+            h = dt - t if final else min(h, dt - t)
+
+            # Stages: dx/dt = v and dv/dt = a(x)
+            kx, kv = [], []
+            for row in self.A:
+                x, v = pos.copy(), vel.copy()
+                for a, dx, dv in zip(row, kx, kv):
+                    if a:
+                        x += dx * (a * h)
+                        v += dv * (a * h)
+                kx.append(v)
+                kv.append(engine.accelerations_at(x))
+            new_pos, new_vel = x, v  # The last stage is the fifth-order solution
+
+            # Error estimate, scaled by the tolerances
+            err_x = sum(e * k for e, k in zip(self.E, kx) if e) * h
+            err_v = sum(e * k for e, k in zip(self.E, kv) if e) * h
+            scale_x = self.pos_atol + self.rtol * np.maximum(np.abs(pos), np.abs(new_pos))
+            scale_v = self.vel_atol + self.rtol * np.maximum(np.abs(vel), np.abs(new_vel))
+            error = max(np.max(np.abs(err_x) / scale_x, initial=0), np.max(np.abs(err_v) / scale_v, initial=0))
+
+            if error <= 1 or final:  # Accept the sub-step
+                pos, vel = new_pos, new_vel
+                t += h
+            factor = 5.0 if error == 0 else min(5.0, max(0.2, 0.9 * error ** -0.2))  # Resize the next sub-step
+            h *= factor
+        self.h = h
+        engine.set_state(pos, vel)
+
+
+class BlockTimestep:  # Leapfrog with per-body power-of-two timesteps, for close encounters
+    name = "block"
+
+    def __init__(self, eta=0.03, max_level=8):
+        self.eta = eta  # Accuracy parameter; a body's step is eta * |a| / |jerk|
+        self.max_level = max_level  # Deepest level, so a body's step is at least dt / 2 ** max_level
+        self.acc = None  # Accelerations at the end of the last step
+        self.changes = None  # Engine change counter when they were computed
+        self.levels = None  # Level given to each body and particle in the last step
+
+    def settings(self):
+        return {"eta": self.eta, "max_level": self.max_level}
+
+    def assign_levels(self, engine, pos, vel, acc, dt):  # Level k means the body steps with dt / 2 ** k
+        jerk = engine.jerks_at(pos, vel)
+        a, j = np.linalg.norm(acc, axis=1), np.linalg.norm(jerk, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wanted = np.where(j > 0, self.eta * a / j, np.inf)  # Timestep each body would like
+            levels = np.ceil(np.log2(dt / wanted))
+        return np.clip(np.nan_to_num(levels, nan=0.0, neginf=0.0), 0, self.max_level).astype(int)
+
+    def step(self, engine, dt):
+        pos, vel = engine.get_state()
+        if self.acc is None or self.changes != engine.changes or self.acc.shape != pos.shape:
+            self.acc = engine.accelerations_at(pos)
+        acc = self.acc
+        self.levels = levels = self.assign_levels(engine, pos, vel, acc, dt)
+
+        fine = 1 << int(levels.max(initial=0))  # Number of the smallest sub-steps in dt
+        h = dt / fine
+        period = fine >> levels  # Smallest sub-steps per step of each body
+        own_dt = (dt / (1 << levels))[:, None]  # Timestep of each body
+        for sub in range(fine):
+            starting = sub % period == 0  # Bodies beginning a step open with a half kick
+            vel[starting] += acc[starting] * (own_dt[starting] / 2)
+            pos += vel * h  # Everything drifts, which is cheap
+            ending = np.flatnonzero((sub + 1) % period == 0)  # Only bodies ending a step need new forces
+            acc[ending] = engine.accelerations_at(pos, ending)
+            vel[ending] += acc[ending] * (own_dt[ending] / 2)  # Closing half kick
+        engine.set_state(pos, vel)
+        self.changes = engine.changes
+
+
+def kepler_propagate(pos, vel, mu, dt, iterations=30):  # Advance bound two-body orbits by dt in closed form
+    r0 = np.hypot(*pos.T)
+    v2 = np.einsum("ij,ij->i", vel, vel)
+    a = 1 / (2 / r0 - v2 / mu)  # Semi-major axis
+    n = np.sqrt(mu / a ** 3)  # Mean motion
+    # e sin E and e cos E at the start give the eccentricity and eccentric anomaly
+    e_sin = np.einsum("ij,ij->i", pos, vel) / np.sqrt(mu * a)
+    e_cos = 1 - r0 / a
+    e = np.hypot(e_sin, e_cos)
+    E0 = np.arctan2(e_sin, e_cos)
+    M = E0 - e_sin + n * dt  # Mean anomaly after dt
+
+    # Solve Kepler's equation E - e sin E = M with Newton's method
+    E = np.where(e < 0.8, M, np.pi + np.floor(M / (2 * np.pi)) * 2 * np.pi)
+    for _ in range(iterations):
+        correction = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E -= correction
+        if np.all(np.abs(correction) < 1e-12):  # Converged for every orbit
+            break
+
+    # Lagrange f and g functions carry the starting state along the orbit
+    dE = E - E0
+    f = 1 - a / r0 * (1 - np.cos(dE))
+    g = dt + (np.sin(dE) - dE) / n
+    new_pos = f[:, None] * pos + g[:, None] * vel
+    r = np.hypot(*new_pos.T)
+    f_dot = -np.sqrt(mu * a) * np.sin(dE) / (r * r0)
+    g_dot = 1 - a / r * (1 - np.cos(dE))
+    return new_pos, f_dot[:, None] * pos + g_dot[:, None] * vel
+
+
+class KeplerHybrid:  # Closed-form Kepler orbits for sun-dominated bodies, leapfrog for everything else
+    name = "kepler"
+
+    def __init__(self, threshold=1e-3, check_every=10):
+        self.threshold = threshold  # Largest perturbation, relative to the sun's pull, for an analytic orbit
+        self.check_every = check_every  # Steps between full force evaluations that reclassify every body
+        self.acc = None  # Accelerations from the last evaluation
+        self.valid = None  # Rows of acc that are up to date
+        self.changes = None  # Engine change counter when acc was computed
+        self.analytic = None  # Bodies and particles on analytic orbits in the last step
+        self.steps = 0  # Steps taken, for scheduling the full evaluations
+
+    def settings(self):
+        return {"threshold": self.threshold, "check_every": self.check_every}
+
+    def classify(self, rel_pos, rel_vel, rel_acc, mu):  # Which bodies are close enough to a pure two-body orbit
+        r = np.hypot(*rel_pos.T)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            central = -(mu / r ** 3)[:, None] * rel_pos  # The sun's pull in the sun's frame
+            ratio = np.hypot(*(rel_acc - central).T) / np.hypot(*central.T)
+            energy = np.einsum("ij,ij->i", rel_vel, rel_vel) / 2 - mu / r
+        return (ratio < self.threshold) & (energy < 0)  # Only bound orbits are propagated analytically
+
+    def close_encounters(self, rel_pos, mass, sun_mass):  # Bodies that came within another body's reach
+        from helpers.collisions import candidate_pairs  # Imported here because it is only needed here
+        # Within this distance a body pulls harder than threshold times the sun does at the same spot,
+        # even for bodies lying between it and the sun
+        k = np.sqrt(mass / (self.threshold * sun_mass))
+        reach = np.hypot(*rel_pos.T) * k / (1 + k)
+        sources = np.flatnonzero(reach > 0)  # Only bodies with mass can perturb anything
+        close = np.zeros(len(rel_pos), dtype=bool)
+        if len(sources) * len(rel_pos) <= 1 << 22:  # Few massive bodies, so check them against everything
+            d = rel_pos[None, :, :] - rel_pos[sources, None, :]
+            near = np.hypot(d[..., 0], d[..., 1]) < reach[sources, None] + reach[None, :]
+            near[np.arange(len(sources)), sources] = False  # A body is not close to itself
+            close |= near.any(axis=0)
+            return close
+        i, j = candidate_pairs(rel_pos, reach)  # Many massive bodies, so let the spatial hash find the pairs
+        near = np.hypot(*(rel_pos[i] - rel_pos[j]).T) < reach[i] + reach[j]  # Candidates that really are close
+        i, j = i[near], j[near]
+        close[i[reach[j] > 0]] = True
+        close[j[reach[i] > 0]] = True
+        return close
+
+    def step(self, engine, dt):
+        pos, vel = engine.get_state()
+        n = engine.count
+        if self.acc is None or self.changes != engine.changes or self.acc.shape != pos.shape:
+            self.acc, self.valid = None, None  # Edited outside of stepping, so start over
+        suns = np.flatnonzero(engine.sun[:n])
+        analytic = np.zeros(len(pos), dtype=bool)
+        if len(suns):
+            s = suns[0]
+            mass = np.zeros(len(pos))
+            mass[:n] = engine.masses
+            mu = engine.G * (engine.mass[s] + mass)
+            rel_pos, rel_vel = pos - pos[s], vel - vel[s]
+            if self.acc is None or self.steps % self.check_every == 0:  # Reclassify with every force
+                self.acc = engine.accelerations_at(pos)
+                self.valid = np.ones(len(pos), dtype=bool)
+                self.analytic = self.classify(rel_pos, rel_vel, self.acc - self.acc[s], mu)
+                self.analytic[s] = False
+            mass[s] = 0  # The sun's own pull is not a perturbation
+            analytic = self.analytic & ~self.close_encounters(rel_pos, mass, engine.mass[s])
+        if self.acc is None:  # No sun, so everything is integrated numerically
+            self.acc = engine.accelerations_at(pos)
+            self.valid = np.ones(len(pos), dtype=bool)
+        acc = self.acc
+        numeric = np.flatnonzero(~analytic)
+        stale = numeric[~self.valid[numeric]]  # Bodies leaving their analytic orbit need fresh forces
+        if len(stale):
+            acc[stale] = engine.accelerations_at(pos, stale)
+
+        vel[numeric] += acc[numeric] * (dt / 2)  # Half kick
+        pos[numeric] += vel[numeric] * dt  # Full drift
+        if analytic.any():  # Along the orbit around the sun's new position
+            orbit_pos, orbit_vel = kepler_propagate(rel_pos[analytic], rel_vel[analytic], mu[analytic], dt)
+            pos[analytic] = pos[s] + orbit_pos
+        if len(numeric) > len(pos) // 2:  # Mostly numeric, so let the force backend do all of them
+            acc[:] = engine.accelerations_at(pos)
+            self.valid[:] = True
+        else:  # Only the numerically integrated bodies need forces
+            acc[numeric] = engine.accelerations_at(pos, numeric)
+            self.valid[:] = ~analytic
+        vel[numeric] += acc[numeric] * (dt / 2)  # Half kick
+        if analytic.any():
+            vel[analytic] = vel[s] + orbit_vel
+        engine.set_state(pos, vel)
+        self.changes = engine.changes
+        self.analytic = analytic if len(suns) else None
+        self.steps += 1
+
+
+INTEGRATORS = {cls.name: cls for cls in (SemiImplicitEuler, Leapfrog, JitLeapfrog, Yoshida4, RK45,
+                                         BlockTimestep, KeplerHybrid)}  # Integrators by name
+INTEGRATOR_LABELS = {"euler": "Euler", "leapfrog": "Leapfrog", "leapfrog_jit": "Leapfrog (JIT)",
+                     "yoshida4": "Yoshida-4", "rk45": "RK45", "block": "Block Steps",
+                     "kepler": "Kepler Hybrid"}  # Names shown in the settings menu
+
+
+def make_integrator(name, **options):  # Build an integrator from its saved name and options
+    return INTEGRATORS.get(name, SemiImplicitEuler)(**options)
@@ -0,0 +1,53 @@
+import numpy as np  # Import NumPy for the array types used by the kernels
+
+try:  # Numba is optional; without it the NumPy kernels are used instead
+    from numba import njit, prange
+except ImportError:
+    njit = prange = None
+
+AVAILABLE = njit is not None  # True when the compiled kernels can be used
+
+
+# The kernels below loop over the arrays in place, so no N x N temporaries are ever allocated.
+# Compiled code is cached on disk by Numba, so only the very first launch pays for compilation.
+if AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def pair_accelerations(pos, mass, G, out):  # Pull of every body on every other body
+        n = pos.shape[0]
+        for i in prange(n):  # Each thread owns a range of target bodies, so nothing is shared
+            x, y = pos[i, 0], pos[i, 1]
+            ax = ay = 0.0
+            for j in range(n):
+                dx, dy = pos[j, 0] - x, pos[j, 1] - y
+                r2 = dx * dx + dy * dy
+                if r2 > 0.0:  # Skip the body itself and coincident bodies
+                    w = G * mass[j] / (r2 * np.sqrt(r2))
+                    ax += w * dx
+                    ay += w * dy
+            out[i, 0], out[i, 1] = ax, ay
+
+    @njit(parallel=True, cache=True)
+    def field_accelerations(targets, sources, mass, G, out):  # Pull of the sources on each target
+        for i in prange(targets.shape[0]):
+            x, y = targets[i, 0], targets[i, 1]
+            ax = ay = 0.0
+            for j in range(sources.shape[0]):
+                dx, dy = sources[j, 0] - x, sources[j, 1] - y
+                r2 = dx * dx + dy * dy
+                if r2 > 0.0:
+                    w = G * mass[j] / (r2 * np.sqrt(r2))
+                    ax += w * dx
+                    ay += w * dy
+            out[i, 0], out[i, 1] = ax, ay
+
+    @njit(cache=True)
+    def kick(vel, acc, h):  # vel += acc * h without a temporary
+        for i in range(vel.shape[0]):
+            vel[i, 0] += acc[i, 0] * h
+            vel[i, 1] += acc[i, 1] * h
+
+    @njit(cache=True)
+    def drift(pos, vel, h):  # pos += vel * h without a temporary
+        for i in range(pos.shape[0]):
+            pos[i, 0] += vel[i, 0] * h
+            pos[i, 1] += vel[i, 1] * h
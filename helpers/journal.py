@@ -0,0 +1,303 @@
+import json  # Import json for the record headers
+import os  # Import os for syncing the journal to disk
+import queue  # Import queue for handing records to the writer thread in order
+import struct  # Import struct for the fixed-size record framing
+import threading  # Import threading for the writer thread
+import time  # Import time for spacing out the snapshots that save moving particles
+import zlib  # Import zlib for the record checksums
+
+import numpy as np  # Import NumPy for the state columns
+
+from helpers.scene_file import FLOAT_COLUMNS, read_planets_data, write_scene  # Import the snapshot format
+from helpers.simulation import SCALE, MAX_DATA  # Import the drawn scale and the history length kept per planet
+
+
+FRAME = struct.Struct("<II")  # Payload length and CRC32 before every record
+SERIES = ("KE", "GPE", "distance")  # Histories stored as ring buffers on the planets
+
+
+def encode_record(kind, sequence, fields=None, arrays=None):  # One framed record, ready to append
+    arrays = {name: np.ascontiguousarray(array) for name, array in (arrays or {}).items()}
+    header = json.dumps({"kind": kind, "sequence": sequence, "fields": fields or {},
+                         "arrays": [[name, array.dtype.str, list(array.shape)] for name, array in arrays.items()]},
+                        default=lambda value: value.item()).encode()  # NumPy scalars too
+    payload = struct.pack("<I", len(header)) + header + b"".join(array.tobytes() for array in arrays.values())
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path):  # (kind, sequence, fields, arrays, end offset) of each record, up to where a crash cut one short
+    if not os.path.isfile(path):
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, checksum = FRAME.unpack_from(data, offset)
+        payload = data[offset + FRAME.size:offset + FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:  # Torn write at the end of the journal
+            return
+        size = struct.unpack_from("<I", payload)[0]
+        header = json.loads(payload[4:4 + size].decode())
+        arrays, position = {}, 4 + size
+        for name, dtype, shape in header["arrays"]:
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(payload, dtype, count, position).reshape(shape)
+            position += count * np.dtype(dtype).itemsize
+        offset += FRAME.size + length
+        yield header["kind"], header["sequence"], header["fields"], arrays, offset
+
+
+def _extend(history, values, replace):  # A history with new values appended, keeping the newest MAX_DATA
+    if replace:
+        return values
+    return np.concatenate((np.asarray(history, dtype=float).reshape((-1,) + values.shape[1:]), values))[-MAX_DATA:]
+
+
+def apply_record(scene, bodies, heads, kind, fields, arrays):  # Replay one record onto a scene in list form
+    # bodies maps body ids to planet dictionaries; heads holds the ids whose orbit ends with an unsettled point
+    if kind == "settings":
+        scene.update(fields["scene"])
+    elif kind == "add":
+        planet = dict(fields["planet"])
+        planet.update((name, arrays[name]) for name in SERIES)
+        planet["orbit"] = arrays["orbit"]
+        if fields["head"] is not None:
+            planet["orbit"] = np.concatenate((arrays["orbit"], [fields["head"]]))
+            heads.add(fields["id"])
+        bodies[fields["id"]] = planet
+    elif kind == "remove":
+        for body_id in fields["ids"]:
+            bodies.pop(body_id, None)
+            heads.discard(body_id)
+    elif kind == "state":
+        columns = arrays["columns"].tolist()
+        ends = {name: np.cumsum(arrays[name + "_counts"]).tolist() for name in SERIES + ("orbit",)}
+        for row, body_id in enumerate(arrays["ids"].tolist()):
+            planet = bodies[body_id]
+            planet.update(zip(FLOAT_COLUMNS, columns[row]))
+            for name in SERIES + ("orbit",):
+                start = ends[name][row - 1] if row else 0
+                values, replace = arrays[name][start:ends[name][row]], bool(arrays[name + "_replace"][row])
+                if name == "orbit" and body_id in heads and not replace:  # The unsettled point is superseded
+                    planet["orbit"] = planet["orbit"][:-1]
+                if name == "orbit":
+                    heads.discard(body_id)
+                planet[name] = _extend(planet[name], values, replace)
+            if arrays["has_head"][row]:
+                planet["orbit"] = np.concatenate((planet["orbit"], arrays["head"][row:row + 1]))
+                heads.add(body_id)
+
+
+def _counters(sprite):  # Where each history of a planet stands, to tell later which values are new
+    buffers = (sprite.KE_buffer, sprite.GPE_buffer, sprite.distance_buffer, sprite.trail.points)
+    return tuple((buffer.resets, buffer.appended) for buffer in buffers)
+
+
+def _new_values(buffer, before):  # Values added to a buffer since the counters before; and whether it was reset
+    resets, appended = before
+    if buffer.resets != resets:  # Replaced since, so all of it is new
+        return buffer.view(), True
+    new = min(buffer.appended - appended, len(buffer))
+    return buffer.view()[len(buffer) - new:], False
+
+
+class SceneJournal:  # Autosave as a full snapshot followed by an append-only journal of what changed since
+    # Each save appends only the changes: rows of planets whose state changed, history values recorded since the
+    # last save, added and removed planets, and changed settings. Edits made in the menus are just changed rows.
+    # Once the journal outgrows the snapshot, a new snapshot replaces both, so the bytes written stay
+    # proportional to what changed. Test particles all move every step and can number in the tens of thousands,
+    # so they are only written in snapshots: one is taken when particles are added or removed, and otherwise at
+    # most once every particle_seconds of wall-clock time while any are moving, however fast time is warped.
+    # Records carry increasing sequence numbers, and the snapshot stores the last one it includes, so a crash
+    # between writing a snapshot and emptying the journal replays correctly.
+    def __init__(self, path, min_compact_bytes=1 << 20, particle_seconds=60):
+        self.path = path  # Snapshot, in the scene file format
+        self.journal_path = path + ".journal"  # Records appended after the snapshot
+        self.min_compact_bytes = min_compact_bytes  # Journal size below which no new snapshot is taken
+        self.particle_seconds = particle_seconds  # Seconds after which moved particles are saved with a new snapshot
+        self.sequence = 0  # Sequence number of the last record or snapshot handed over
+        self.group = None  # Planet group being followed; a different one starts with a snapshot
+        self.tracked = {}  # Body id to its history counters as of the last save
+        self.written = np.zeros((0, len(FLOAT_COLUMNS)))  # State columns by body id as of the last save
+        self.settings = None  # Scene settings as of the last save
+        self.particle_step = 0  # Step of the last snapshot, to tell whether its particles have moved since
+        self.particle_time = 0.0  # When the last snapshot was taken, in time.monotonic() seconds
+        self.particle_count = 0  # Number of particles in the last snapshot
+        self.journal_bytes = 0  # Bytes appended since the last snapshot
+        self.snapshot_bytes = 0  # Size of the last snapshot, set once it is written
+        self.error = None  # Last error raised while writing, until the main thread takes it to report
+        self.failed = False  # Set when a write fails, so appends wait for the snapshot that starts over
+        self.jobs = queue.Queue()  # Snapshots and records for the writer thread, in order
+        self.thread = threading.Thread(target=self.run, name="journal", daemon=True)
+        self.thread.start()
+
+    def load(self):  # The saved scene in list form, snapshot plus journal, or None if nothing was saved
+        if not os.path.isfile(self.path):
+            return None
+        planets_data = read_planets_data(self.path)
+        scene = planets_data[0]["scene"]
+        saved = scene.pop("journal", {})
+        start = saved.get("sequence", 0)
+        bodies = dict(zip(saved.get("ids", range(len(planets_data) - 1)), planets_data[1:]))
+        heads = set(saved.get("heads", ()))
+        self.sequence, end = start, 0
+        for kind, sequence, fields, arrays, end in read_records(self.journal_path):
+            if sequence <= start:  # Already in the snapshot
+                continue
+            apply_record(scene, bodies, heads, kind, fields, arrays)
+            self.sequence = sequence
+        if os.path.isfile(self.journal_path) and os.path.getsize(self.journal_path) > end:
+            os.truncate(self.journal_path, end)  # Drop a torn record, so records appended later can be read
+        return [{"scene": scene}] + list(bodies.values())
+
+    def save(self, planet_group, build):  # Write what changed since the last save; build() gives the whole scene
+        planets = [sprite for sprite in planet_group.sprites() if not sprite.sun]
+        count = planet_group.engine.particle_count
+        if (self.failed or planet_group is not self.group
+                or self.journal_bytes > max(self.min_compact_bytes, self.snapshot_bytes)
+                or count != self.particle_count
+                or count and planet_group.steps != self.particle_step
+                and time.monotonic() - self.particle_time >= self.particle_seconds):
+            self.snapshot(planet_group, planets, build())
+            return
+        records = []
+        settings = self.scene_settings(planet_group)
+        if settings != self.settings:
+            records.append(self.record("settings", {"scene": settings}))
+            self.settings = settings
+
+        ids = [planet_group.body_ids[sprite] for sprite in planets]
+        removed = self.tracked.keys() - set(ids)
+        if removed:
+            records.append(self.record("remove", {"ids": sorted(removed)}))
+            for body_id in removed:
+                del self.tracked[body_id]
+        for sprite, body_id in zip(planets, ids):
+            if body_id not in self.tracked:
+                records.append(self.add_record(sprite, body_id))
+        records.extend(self.state_records(planet_group, planets, ids))
+        if records:
+            data = b"".join(records)
+            self.journal_bytes += len(data)
+            self.jobs.put(("append", data))
+
+    def record(self, kind, fields=None, arrays=None):  # Encode the next record
+        self.sequence += 1
+        return encode_record(kind, self.sequence, fields, arrays)
+
+    @staticmethod
+    def scene_settings(planet_group):  # Scene settings without the particles, which only snapshots hold
+        return {name: value for name, value in planet_group.save_fields().items()
+                if name not in ("particle_pos", "particle_vel")}
+
+    @staticmethod
+    def columns(planet_group, planets):  # State of the planets, one row of FLOAT_COLUMNS each
+        engine = planet_group.engine
+        rows = np.array([sprite.index for sprite in planets], dtype=np.intp)
+        force = engine.acc[rows] * engine.mass[rows, None]
+        return np.column_stack((engine.pos[rows], engine.vel[rows], engine.mass[rows], engine.radius[rows] * SCALE,
+                                force, [sprite.velocity for sprite in planets],
+                                [sprite.distance_to_sun for sprite in planets])).reshape(-1, len(FLOAT_COLUMNS))
+
+    def track(self, body_id, sprite, columns):  # Remember a planet as written
+        if body_id >= len(self.written):
+            grown = np.full((max(2 * len(self.written), body_id + 1, 16), len(FLOAT_COLUMNS)), np.nan)
+            grown[:len(self.written)] = self.written
+            self.written = grown
+        self.written[body_id] = columns
+        self.tracked[body_id] = _counters(sprite)
+
+    def add_record(self, sprite, body_id):  # Record a planet new to the scene, histories and all
+        fields = sprite.save_fields(lists=False)
+        arrays = {name: fields.pop(name) for name in SERIES}
+        fields.pop("orbit")
+        arrays["orbit"] = sprite.trail.points.view()
+        head = sprite.trail.head
+        self.track(body_id, sprite, [fields[name] for name in FLOAT_COLUMNS])
+        return self.record("add", {"id": body_id, "planet": fields, "head": list(head) if head is not None else None},
+                           arrays)
+
+    def state_records(self, planet_group, planets, ids):  # Record the rows and histories that changed
+        if not planets:
+            return []
+        columns = self.columns(planet_group, planets)
+        changed = np.any(columns != self.written[ids], axis=1).tolist()
+        rows, histories = [], {name: ([], [], []) for name in SERIES + ("orbit",)}
+        buffers = ("KE_buffer", "GPE_buffer", "distance_buffer")
+        heads = []
+        for row, (sprite, body_id) in enumerate(zip(planets, ids)):
+            counters = _counters(sprite)
+            if not changed[row] and counters == self.tracked[body_id]:
+                continue
+            before = self.tracked[body_id]
+            rows.append(row)
+            for index, name in enumerate(SERIES + ("orbit",)):
+                buffer = getattr(sprite, buffers[index]) if index < len(buffers) else sprite.trail.points
+                values, replace = _new_values(buffer, before[index])
+                histories[name][0].append(values)
+                histories[name][1].append(len(values))
+                histories[name][2].append(replace)
+            heads.append(sprite.trail.head)
+            self.track(body_id, sprite, columns[row])
+        if not rows:
+            return []
+        arrays = {"ids": np.array(ids, dtype=np.int64)[rows], "columns": columns[rows]}
+        for name, (values, counts, replace) in histories.items():
+            arrays[name] = np.concatenate(values) if name != "orbit" else np.concatenate(values).reshape(-1, 2)
+            arrays[name + "_counts"] = np.array(counts, dtype=np.int64)
+            arrays[name + "_replace"] = np.array(replace, dtype=bool)
+        arrays["has_head"] = np.array([head is not None for head in heads])
+        arrays["head"] = np.array([head if head is not None else (np.nan, np.nan) for head in heads], dtype=float)
+        return [self.record("state", arrays=arrays)]
+
+    def snapshot(self, planet_group, planets, planets_data):  # Replace the snapshot and journal with the scene
+        self.sequence += 1
+        ids = [planet_group.body_ids[sprite] for sprite in planets]
+        heads = [body_id for sprite, body_id in zip(planets, ids) if sprite.trail.head is not None]
+        planets_data[0]["scene"]["journal"] = {"sequence": self.sequence, "ids": ids, "heads": heads}
+        self.group = planet_group
+        self.failed = False  # Starts over from the scene as it is now
+        self.tracked = {}
+        self.written = np.zeros((0, len(FLOAT_COLUMNS)))
+        if planets:
+            for sprite, body_id, columns in zip(planets, ids, self.columns(planet_group, planets)):
+                self.track(body_id, sprite, columns)
+        self.settings = self.scene_settings(planet_group)
+        self.particle_step, self.particle_count = planet_group.steps, planet_group.engine.particle_count
+        self.particle_time = time.monotonic()
+        self.journal_bytes = 0
+        self.jobs.put(("snapshot", planets_data))
+
+    def run(self):  # Write snapshots and append records in the order they were handed over, until closed
+        # After a failed write the records handed over since would not replay onto what is on disk, so they are
+        # dropped until the snapshot the main thread sends once it sees the failure
+        skipping = False
+        with open(self.journal_path, "ab") as journal:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                kind, data = job
+                if kind == "append" and skipping:
+                    continue
+                skipping = False
+                try:
+                    if kind == "snapshot":
+                        write_scene(self.path, data)
+                        journal.truncate(0)  # Everything in it is in the snapshot now
+                        self.snapshot_bytes = os.path.getsize(self.path)
+                    else:
+                        journal.write(data)
+                        journal.flush()
+                        os.fsync(journal.fileno())  # On disk before the next save is written
+                except Exception as error:  # Kept for the main thread, which starts over with a snapshot next time
+                    self.error = error
+                    self.failed = skipping = True
+
+    def take_error(self):  # The last error raised while writing, once, or None if every write succeeded since
+        error, self.error = self.error, None
+        return error
+
+    def close(self):  # Write everything handed over and stop the writer thread
+        self.jobs.put(None)
+        self.thread.join()
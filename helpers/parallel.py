@@ -0,0 +1,98 @@
+import multiprocessing  # Import multiprocessing for the worker pool
+import os  # Import os for counting the CPU cores
+import weakref  # Import weakref for releasing the pool and shared memory with the backend
+from multiprocessing import shared_memory  # Import shared memory so the arrays are never pickled
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.physics import direct_accelerations, field_accelerations  # Import the single-process kernels
+
+
+# Shared memory blocks already attached in this worker process, by name
+_attached = {}
+
+
+def worker_context():  # Multiprocessing context for worker pools, safe to use with other threads running
+    # A forked child keeps only the thread that forked it, so a lock held by any other thread, such as the
+    # journal writer or SDL's, would stay locked in the child forever. Workers are started from a fresh fork
+    # server instead, or spawned where there is none; both import the helpers the workers need from scratch.
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _shared_arrays(block, capacity):  # Positions, masses and accelerations laid out in one shared block
+    buffer = block.buf
+    pos = np.ndarray((capacity, 2), buffer=buffer)
+    mass = np.ndarray((capacity,), buffer=buffer, offset=pos.nbytes)
+    acc = np.ndarray((capacity, 2), buffer=buffer, offset=pos.nbytes + mass.nbytes)
+    return pos, mass, acc
+
+
+def _shard_worker(name, capacity, n, G, start, stop):  # Sum the pull of every body on the targets [start, stop)
+    arrays = _attached.get(name)
+    if arrays is None:  # First step since the block was (re)allocated
+        for block, _ in _attached.values():
+            block.close()
+        _attached.clear()
+        block = shared_memory.SharedMemory(name=name)
+        arrays = _attached[name] = (block, _shared_arrays(block, capacity))
+    pos, mass, acc = arrays[1]
+    field_accelerations(pos[start:stop], pos[:n], mass[:n], G, out=acc[start:stop])  # Written in place
+
+
+def _release(resources):  # Shut down the pool and free the shared memory
+    pool, block = resources.pop("pool", None), resources.pop("block", None)
+    if pool is not None:
+        pool.terminate()
+    if block is not None:
+        block.close()
+        block.unlink()
+
+
+class ParallelDirectSum:  # Exact all-pairs force backend with the target bodies sharded across processes
+    name = "parallel"  # Name stored in saved scenes
+    force_error = None  # Exact, so there is no error to report
+
+    def __init__(self, workers=None, min_bodies=512):
+        self.workers = workers  # Requested number of worker processes, None for one per core
+        self.processes = workers or os.cpu_count() or 1  # Number of worker processes actually used
+        self.min_bodies = min_bodies  # Below this many bodies a single process is faster
+        self.capacity = 0  # Bodies the shared block has room for
+        self.resources = {}  # Pool and shared block, created the first time they are needed
+        self.finalizer = weakref.finalize(self, _release, self.resources)
+
+    def settings(self):  # Options needed to rebuild this backend
+        return {"workers": self.workers, "min_bodies": self.min_bodies}
+
+    def close(self):  # Stop the workers and free the shared memory
+        self.finalizer()
+
+    def _prepare(self, n):  # Make sure the shared block can hold n bodies and start the pool
+        if n > self.capacity:
+            old = self.resources.pop("block", None)
+            if old is not None:
+                old.close()
+                old.unlink()
+            self.capacity = max(n, 2 * self.capacity)
+            size = self.capacity * 5 * np.dtype(float).itemsize  # Two position, one mass and two acceleration columns
+            self.resources["block"] = shared_memory.SharedMemory(create=True, size=size)
+        if "pool" not in self.resources:
+            # Started after the first block, so the workers share this process's resource tracker
+            self.resources["pool"] = worker_context().Pool(self.processes)
+        return _shared_arrays(self.resources["block"], self.capacity)
+
+    def accelerations(self, pos, mass, G, out=None):  # Accelerations of every body
+        n = len(pos)
+        if n < self.min_bodies or self.processes < 2:  # Not worth the overhead of the workers
+            return direct_accelerations(pos, mass, G, out=out)
+        acc = np.zeros((n, 2)) if out is None else out
+        shared_pos, shared_mass, shared_acc = self._prepare(n)
+        shared_pos[:n], shared_mass[:n] = pos, mass
+
+        # Only the block name and each shard's bounds are sent to the workers
+        bounds = np.linspace(0, n, min(self.processes, n) + 1).astype(int)
+        name = self.resources["block"].name
+        self.resources["pool"].starmap(_shard_worker, [(name, self.capacity, n, G, int(start), int(stop))
+                                                       for start, stop in zip(bounds[:-1], bounds[1:])])
+        acc[:] = shared_acc[:n]
+        return acc
@@ -0,0 +1,377 @@
+import copy  # Import copy for snapshotting the integrator
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers import jit  # Import the optional compiled kernels
+from helpers.integrators import SemiImplicitEuler  # Import the default time integrator
+
+
+SUN_DENSITY = 1408  # Mean density of the sun in kilograms per cubic meter
+PLANET_DENSITY = 5514  # Mean density of the earth in kilograms per cubic meter, used for every planet
+
+
+def collision_radius(mass, sun):  # Physical radius in meters of bodies of this mass, from their density
+    # Drawn radii are exaggerated so the bodies can be seen, the sun's reaching 0.2 AU, so contacts use these
+    return np.cbrt(3 * np.asarray(mass, dtype=float) / (4 * np.pi * np.where(sun, SUN_DENSITY, PLANET_DENSITY)))
+
+
+# Cache of the (i, j) index pairs with i < j, keyed by body count, so they are not rebuilt every step
+_pair_cache = {}
+
+
+def pair_indices(n):  # Return every unordered pair of body indices exactly once
+    pairs = _pair_cache.get(n)
+    if pairs is None:
+        _pair_cache.clear()  # Only keep the pairs for the most recent body count
+        pairs = np.triu_indices(n, 1)  # Upper triangle without the diagonal
+        _pair_cache[n] = pairs
+    return pairs
+
+
+def direct_accelerations(pos, mass, G, out=None):  # Sum every pairwise attraction in one symmetric pass
+    n = len(pos)  # Number of bodies
+    acc = np.zeros((n, 2)) if out is None else out  # Output array of accelerations
+    acc[:] = 0
+    if n < 2:  # A lone body feels no gravity
+        return acc
+
+    i, j = pair_indices(n)  # Each pair is visited once, not twice
+    d = pos[j] - pos[i]  # Separation vectors from i towards j
+    r2 = np.einsum("ij,ij->i", d, d)  # Squared distances
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_r3 = np.where(r2 > 0, G / (r2 * np.sqrt(r2)), 0.0)  # G / r^3, ignoring coincident bodies
+    d *= inv_r3[:, None]  # Shared part of the force for both bodies of the pair
+
+    # Newton's third law: i is pulled towards j by m_j, j is pulled towards i by m_i
+    for axis in range(2):
+        acc[:, axis] += np.bincount(i, weights=d[:, axis] * mass[j], minlength=n)
+        acc[:, axis] -= np.bincount(j, weights=d[:, axis] * mass[i], minlength=n)
+    return acc
+
+
+def potential_energy(pos, mass, G, chunk=1 << 20):  # Total gravitational potential energy of every pair
+    n = len(pos)
+    if n * (n - 1) // 2 <= chunk:  # Every pair at once
+        i, j = pair_indices(n)
+        r = np.hypot(*(pos[j] - pos[i]).T)  # Pair distances
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return float(-G * np.sum(np.where(r > 0, mass[i] * mass[j] / r, 0.0)))
+    # Too many pairs to hold at once: sum the rows of the pair matrix in blocks of about chunk pairs
+    rows = max(1, chunk // n)
+    total = 0.0
+    for start in range(0, n - 1, rows):
+        stop = min(start + rows, n - 1)
+        d = pos[start + 1:] - pos[start:stop, None]  # Separations from each row to every later body
+        r = np.hypot(d[..., 0], d[..., 1])
+        later = np.arange(start + 1, n) > np.arange(start, stop)[:, None]  # Each pair once
+        with np.errstate(divide="ignore", invalid="ignore"):
+            total += np.sum(np.where(later & (r > 0), mass[start:stop, None] * mass[start + 1:] / r, 0.0))
+    return float(-G * total)
+
+
+def field_accelerations(targets, sources, mass, G, out=None, chunk=1 << 20):  # Pull of the sources on each target
+    t = len(targets)  # Number of bodies feeling the force
+    acc = np.zeros((t, 2)) if out is None else out  # Output array of accelerations
+    acc[:] = 0
+    if t == 0 or len(sources) == 0:
+        return acc
+
+    rows = max(1, chunk // len(sources))  # Targets per block, so the temporaries stay bounded
+    for start in range(0, t, rows):
+        d = sources[None, :, :] - targets[start:start + rows, None, :]  # Separations, targets x sources
+        r2 = np.einsum("ijk,ijk->ij", d, d)  # Squared distances
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = np.where(r2 > 0, G * mass / (r2 * np.sqrt(r2)), 0.0)  # G m / r^3, skipping coincident bodies
+        acc[start:start + rows] = np.einsum("ij,ijk->ik", w, d)  # Sum over the sources
+    return acc
+
+
+def field_jerks(targets, target_vel, sources, source_vel, mass, G, chunk=1 << 20):  # Time derivative of the pull
+    t = len(targets)
+    jerk = np.zeros((t, 2))
+    if t == 0 or len(sources) == 0:
+        return jerk
+
+    rows = max(1, chunk // len(sources))  # Targets per block, so the temporaries stay bounded
+    for start in range(0, t, rows):
+        d = sources[None, :, :] - targets[start:start + rows, None, :]  # Relative positions
+        v = source_vel[None, :, :] - target_vel[start:start + rows, None, :]  # Relative velocities
+        r2 = np.einsum("ijk,ijk->ij", d, d)
+        rv = np.einsum("ijk,ijk->ij", d, v)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = np.where(r2 > 0, G * mass / (r2 * np.sqrt(r2)), 0.0)  # G m / r^3
+            u = np.where(r2 > 0, 3 * rv / r2, 0.0)
+        # j = G m (v / r^3 - 3 (r.v) r / r^5)
+        jerk[start:start + rows] = np.einsum("ij,ijk->ik", w, v) - np.einsum("ij,ijk->ik", w * u, d)
+    return jerk
+
+
+class DirectSum:  # Exact all-pairs force backend
+    name = "direct"  # Name stored in saved scenes
+    force_error = None  # Exact, so there is no error to report
+
+    def settings(self):  # Options needed to rebuild this backend
+        return {}
+
+    def accelerations(self, pos, mass, G, out=None):  # Accelerations of every body
+        return direct_accelerations(pos, mass, G, out=out)
+
+
+class JitDirectSum(DirectSum):  # Exact all-pairs backend compiled to a multi-threaded loop when Numba is installed
+    name = "jit"
+
+    def accelerations(self, pos, mass, G, out=None):
+        if not jit.AVAILABLE:  # Fall back to the NumPy kernel
+            return direct_accelerations(pos, mass, G, out=out)
+        acc = np.empty((len(pos), 2)) if out is None else out
+        jit.pair_accelerations(pos, mass, G, acc)
+        return acc
+
+
+def make_force_backend(name, **options):  # Build a force backend from its saved name and options
+    if name == "barnes_hut":
+        from helpers.barnes_hut import BarnesHut  # Imported here because it builds on this module
+        return BarnesHut(**options)
+    if name == "parallel":
+        from helpers.parallel import ParallelDirectSum  # Imported here because it builds on this module
+        return ParallelDirectSum(**options)
+    if name == "jit":
+        return JitDirectSum()
+    return DirectSum()
+
+
+class PhysicsEngine:  # Struct-of-arrays store for the physical state of every body
+    G = 6.67428e-11  # Gravitational constant
+
+    def __init__(self, capacity=16):
+        self.count = 0  # Number of live bodies; rows [0, count) of every array are in use
+        self.pos = np.zeros((capacity, 2))  # Positions in meters
+        self.vel = np.zeros((capacity, 2))  # Velocities in meters per second
+        self.acc = np.zeros((capacity, 2))  # Accelerations from the last force pass
+        self.mass = np.zeros(capacity)  # Masses in kilograms
+        self.sun = np.zeros(capacity, dtype=bool)  # Flags the body acting as the sun
+        self.radius = np.zeros(capacity)  # Drawn radii in meters; contacts use collision_radii() instead
+        self.force_backend = DirectSum()  # Method used to sum the gravitational forces
+        self.integrator = SemiImplicitEuler()  # Method used to advance the state in time
+        # What happens when two bodies touch, see helpers.collisions. Off unless chosen, since collision radii are
+        # the exaggerated drawn sizes and close orbits would otherwise end in the sun
+        self.collision_mode = "off"
+        self.changes = 0  # Counts edits made outside of stepping, so cached forces can be dropped
+        self.previous = None  # Positions before the last step, used to interpolate rendering
+        self.render_pos = None  # Body positions to draw this frame
+        self.render_particle_pos = None  # Particle positions to draw this frame
+
+        # Massless test particles feel the bodies above but exert no gravity themselves
+        self.particle_count = 0  # Number of live particles
+        self.particle_pos = np.zeros((0, 2))  # Particle positions in meters
+        self.particle_vel = np.zeros((0, 2))  # Particle velocities in meters per second
+        self.particle_acc = np.zeros((0, 2))  # Particle accelerations from the last force pass
+
+    # Views over the live rows, these never copy
+    @property
+    def positions(self):
+        return self.pos[:self.count]
+
+    @property
+    def velocities(self):
+        return self.vel[:self.count]
+
+    @property
+    def accelerations(self):
+        return self.acc[:self.count]
+
+    @property
+    def masses(self):
+        return self.mass[:self.count]
+
+    def collision_radii(self):  # Physical radius of every live body, which grows with its mass when merging
+        return collision_radius(self.masses, self.sun[:self.count])
+
+    @property
+    def particle_positions(self):
+        return self.particle_pos[:self.particle_count]
+
+    @property
+    def particle_velocities(self):
+        return self.particle_vel[:self.particle_count]
+
+    @property
+    def particle_accelerations(self):
+        return self.particle_acc[:self.particle_count]
+
+    def _grow(self):  # Double the capacity of every array
+        capacity = max(1, len(self.mass) * 2)
+        for name in ("pos", "vel", "acc", "mass", "sun", "radius"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)  # Larger zeroed array
+            new[:self.count] = old[:self.count]  # Keep the live rows
+            setattr(self, name, new)
+
+    def mark_changed(self):  # Record an edit made outside of stepping
+        self.changes += 1
+
+    def add_body(self):  # Reserve a zeroed row for a new body and return its index
+        self.mark_changed()
+        if self.count == len(self.mass):
+            self._grow()
+        index = self.count
+        self.pos[index] = self.vel[index] = self.acc[index] = 0
+        self.mass[index] = self.radius[index] = 0
+        self.sun[index] = False
+        self.count += 1
+        return index
+
+    def add_bodies(self, count):  # Reserve count zeroed rows at once and return the index of the first
+        self.mark_changed()
+        while self.count + count > len(self.mass):
+            self._grow()
+        start = self.count
+        for name in ("pos", "vel", "acc", "mass", "sun", "radius"):
+            getattr(self, name)[start:start + count] = 0
+        self.count += count
+        return start
+
+    def copy_body(self, other, other_index):  # Copy a row from another engine into a new row here
+        index = self.add_body()
+        for name in ("pos", "vel", "acc", "mass", "sun", "radius"):
+            getattr(self, name)[index] = getattr(other, name)[other_index]
+        return index
+
+    def remove_body(self, index):  # Remove a row by moving the last row into its place
+        self.mark_changed()
+        last = self.count - 1
+        if index != last:
+            for name in ("pos", "vel", "acc", "mass", "sun", "radius"):
+                array = getattr(self, name)
+                array[index] = array[last]
+        self.count -= 1
+        return last if index != last else None  # Index of the row that moved, if any
+
+    def merge_bodies(self, kept, absorbed):  # Combine two bodies into the kept row; returns where it ends up
+        m1, m2 = self.mass[kept], self.mass[absorbed]
+        total = m1 + m2
+        w1, w2 = (m1 / total, m2 / total) if total > 0 else (0.5, 0.5)
+        self.pos[kept] = w1 * self.pos[kept] + w2 * self.pos[absorbed]  # Center of mass
+        self.vel[kept] = w1 * self.vel[kept] + w2 * self.vel[absorbed]  # Momentum is conserved
+        self.mass[kept] = total
+        self.radius[kept] = np.cbrt(self.radius[kept] ** 3 + self.radius[absorbed] ** 3)  # Volume is conserved
+        self.sun[kept] |= self.sun[absorbed]
+        self.mark_changed()
+        return float(self.pos[kept, 0]), float(self.pos[kept, 1])
+
+    def bounce_bodies(self, i, j, restitution=1.0):  # Bounce two touching bodies off each other
+        normal = self.pos[j] - self.pos[i]
+        distance = np.hypot(*normal)
+        if distance == 0:
+            return
+        normal /= distance
+        m1, m2 = self.mass[i], self.mass[j]
+        closing = np.dot(self.vel[i] - self.vel[j], normal)  # Speed at which they approach each other
+        if closing > 0 and m1 + m2 > 0:
+            impulse = (1 + restitution) * closing / (m1 + m2)  # Momentum is conserved
+            self.vel[i] -= impulse * m2 * normal
+            self.vel[j] += impulse * m1 * normal
+        overlap = collision_radius(m1, self.sun[i]) + collision_radius(m2, self.sun[j]) - distance
+        if overlap > 0 and m1 + m2 > 0:  # Push them apart so they just touch, keeping the center of mass
+            self.pos[i] -= normal * overlap * m2 / (m1 + m2)
+            self.pos[j] += normal * overlap * m1 / (m1 + m2)
+        self.mark_changed()
+
+    def add_particles(self, pos, vel):  # Append a batch of test particles
+        pos, vel = np.asarray(pos, dtype=float).reshape(-1, 2), np.asarray(vel, dtype=float).reshape(-1, 2)
+        self.mark_changed()
+        needed = self.particle_count + len(pos)
+        if needed > len(self.particle_pos):  # Grow to at least double, so repeated adds stay cheap
+            capacity = max(needed, 2 * len(self.particle_pos), 16)
+            for name in ("particle_pos", "particle_vel", "particle_acc"):
+                new = np.zeros((capacity, 2))
+                new[:self.particle_count] = getattr(self, name)[:self.particle_count]
+                setattr(self, name, new)
+        self.particle_pos[self.particle_count:needed] = pos
+        self.particle_vel[self.particle_count:needed] = vel
+        self.particle_acc[self.particle_count:needed] = 0
+        self.particle_count = needed
+
+    def remove_particles(self, mask):  # Drop every particle where the mask is True
+        keep = ~np.asarray(mask, dtype=bool)
+        self.mark_changed()
+        kept = int(keep.sum())
+        for name in ("particle_pos", "particle_vel", "particle_acc"):
+            array = getattr(self, name)
+            array[:kept] = array[:self.particle_count][keep]
+        self.particle_count = kept
+
+    def get_state(self):  # Copies of the positions and velocities, bodies first and then particles
+        return (np.concatenate((self.positions, self.particle_positions)),
+                np.concatenate((self.velocities, self.particle_velocities)))
+
+    def set_state(self, pos, vel):  # Write back a state laid out like get_state()
+        n = self.count
+        self.positions[:], self.particle_positions[:] = pos[:n], pos[n:]
+        self.velocities[:], self.particle_velocities[:] = vel[:n], vel[n:]
+
+    def snapshot(self):  # Copy of the complete state, for putting back later with restore()
+        n, p = self.count, self.particle_count
+        return {"pos": self.pos[:n].copy(), "vel": self.vel[:n].copy(), "acc": self.acc[:n].copy(),
+                "mass": self.mass[:n].copy(), "radius": self.radius[:n].copy(), "sun": self.sun[:n].copy(),
+                "particle_pos": self.particle_pos[:p].copy(), "particle_vel": self.particle_vel[:p].copy(),
+                "particle_acc": self.particle_acc[:p].copy(),
+                "integrator": copy.deepcopy(self.integrator), "changes": self.changes}
+
+    def restore(self, snapshot):  # Put back a state taken by snapshot(), rows and all
+        n = len(snapshot["mass"])
+        while len(self.mass) < n:
+            self._grow()
+        self.count = n
+        for name in ("pos", "vel", "acc", "mass", "radius", "sun"):
+            getattr(self, name)[:n] = snapshot[name]
+        self.particle_count = 0
+        self.add_particles(snapshot["particle_pos"], snapshot["particle_vel"])
+        self.particle_accelerations[:] = snapshot["particle_acc"]
+        self.integrator = copy.deepcopy(snapshot["integrator"])  # Copied again, so the snapshot can be reused
+        # The change counter goes back with the state, so the integrator's restored cached forces stay valid
+        # and re-simulating repeats the original steps exactly
+        self.changes = snapshot["changes"]
+        self.previous = None  # Nothing to interpolate from
+
+    def accelerations_at(self, pos, targets=None):  # Accelerations for a state laid out like get_state()
+        n = self.count
+        if targets is not None:  # Only some bodies and particles, summed directly against every body
+            acc = field_accelerations(pos[targets], pos[:n], self.masses, self.G)
+            bodies = targets < n
+            self.acc[targets[bodies]] = acc[bodies]
+            self.particle_acc[targets[~bodies] - n] = acc[~bodies]
+            return acc
+        acc = np.empty_like(pos)
+        self.force_backend.accelerations(pos[:n], self.masses, self.G, out=acc[:n])  # Bodies attract each other
+        field_accelerations(pos[n:], pos[:n], self.masses, self.G, out=acc[n:])  # Particles only feel the bodies
+        self.accelerations[:], self.particle_accelerations[:] = acc[:n], acc[n:]  # Keep the latest forces
+        return acc
+
+    def jerks_at(self, pos, vel):  # Rate of change of the accelerations, laid out like get_state()
+        n = self.count
+        return field_jerks(pos, vel, pos[:n], vel[:n], self.masses, self.G)
+
+    def step(self, dt):  # Advance every body and particle by dt with the chosen integrator
+        self.previous = (self.positions.copy(), self.particle_positions.copy(), self.changes)
+        self.integrator.step(self, dt)
+
+    def interpolate(self, alpha):  # Blend between the last two steps to get the positions to draw
+        pos, particle_pos = self.positions, self.particle_positions
+        if self.previous is not None:
+            previous, previous_particles, changes = self.previous
+            # Only blend if nothing was added, removed or moved by hand since the last step
+            if changes == self.changes and previous.shape == pos.shape and previous_particles.shape == particle_pos.shape:
+                pos = previous + alpha * (pos - previous)
+                particle_pos = previous_particles + alpha * (particle_pos - previous_particles)
+        self.render_pos, self.render_particle_pos = pos, particle_pos
+
+    def sun_telemetry(self):  # Distance to the sun and GPE against the sun for every body
+        suns = np.flatnonzero(self.sun[:self.count])
+        if len(suns) == 0:  # No sun in this scene
+            return None, None
+        s = suns[0]
+        distance = np.hypot(*(self.positions - self.pos[s]).T)  # Distance of each body to the sun
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gpe = -self.G * self.mass[s] * self.masses / distance  # Gravitational potential energy
+        return distance, gpe
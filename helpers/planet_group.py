@@ -1,23 +1,241 @@
+import os  # Import os for locating the asset files
+
+import numpy as np  # Import NumPy for vectorized array math
 import pygame  # Import Pygame for game development
 
+from helpers.physics import PhysicsEngine  # Import the struct-of-arrays physics engine
+from helpers.integrators import make_integrator  # Import the time integrators
+from helpers.collisions import resolve_contacts  # Import the collision detection
+from helpers.simulation import scene_fields, apply_scene_fields, set_force_backend  # Import the shared scene settings
+from helpers.sim_clock import SimulationClock  # Import the fixed-step accumulator
+from helpers.checkpoints import CheckpointRing  # Import the rewind history
+from helpers.diagnostics import Diagnostics  # Import the conservation diagnostics
+from helpers.recording import TrajectoryRecording  # Import the trajectory recorder
+from helpers.sprites import PlanetaryObject  # Import the planet class for its simulation constants
+from helpers.culling import in_view  # Import the test skipping what is off screen
+
 
 class PlanetGroup(pygame.sprite.Group):  # Class to manage a group of planet sprites
+    PARTICLE_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "images", "asteroid.png")
+    PARTICLE_SIZE = 6  # Size in pixels of each drawn test particle
+    PARTICLE_COLOR = (205, 133, 63)  # Color of test particles drawn as single pixels
+    PIXEL_ZOOM = 0.5  # Camera zoom below which test particles are drawn as single pixels instead of images
+    MAX_PARTICLE_IMAGES = 10000  # Most test particles on screen drawn as images; more are drawn as pixels
+    EXPLOSION_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "images", "explosion.png")
+    EXPLOSION_SHEET = (8, 6)  # Columns and rows of animation frames in the explosion image
+
     def __init__(self, screen, *args, **kwargs):
+        self.engine = PhysicsEngine()  # Shared arrays holding the state of every planet
+        self.bodies = []  # Sprites ordered by their row in the engine arrays
+        self.timestep = PlanetaryObject.TIMESTEP  # Seconds simulated per step
+        self.clock = kwargs.get("clock") or SimulationClock()  # Decides how many steps each frame takes
+        self.steps = 0  # Steps taken since the scene was created
+        self.time = 0.0  # Seconds simulated since the scene was created
+        self.checkpoints = CheckpointRing()  # Snapshots to rewind to
+        self.stepped_changes = None  # Engine change counter after the last step, to notice edits in between
+        self.diagnostics = Diagnostics()  # Total energy, momentum and angular momentum every few steps
         super().__init__()  # Initialize the parent sprite group
         self.screen = screen  # Store the reference to the screen
         self.updating = True  # Flag to control updating of planets
         self.name = "planet_group"  # Name of the group
+        self.particle_image = None  # Loaded the first time particles are drawn
+        self.explosion_frames = None  # Animation frames, cut from the image the first time two planets merge
+        self.explosions = []  # [x, y, size, frame] of each explosion being shown
+        self.body_ids = {}  # Id of every planet ever in the group, as written to recordings
+        self.ids = None  # Ids by engine row, rebuilt when planets are added or removed
+        self.recording = None  # Trajectory recording being written, or the last one written
+        self.playback = None  # Frame of the recording shown instead of the live planets, None when live
+        self.playback_colors = {}  # Color of every planet by id, gathered when playback starts
+
+    def add_internal(self, sprite, layer=None):  # Move a new sprite's state into the shared arrays
+        super().add_internal(sprite, layer)  # Register the sprite with the parent group
+        sprite.bind(self.engine)  # Point the sprite at its new row
+        self.bodies.append(sprite)  # Rows are appended, so the sprite goes last
+        self.body_ids.setdefault(sprite, len(self.body_ids))
+        self.ids = None
+
+    def remove_internal(self, sprite):  # Give a removed sprite its own state and free its row
+        super().remove_internal(sprite)  # Unregister the sprite from the parent group
+        index = sprite.index
+        sprite.unbind()  # Keep the sprite usable on its own
+        moved = self.engine.remove_body(index)  # The last row fills the hole
+        self.ids = None
+        last = self.bodies.pop()
+        if moved is not None:
+            self.bodies[index] = last  # Move the last sprite into the freed slot
+            last.index = index
 
     def set_updating(self, updating):  # Method to set the updating flag
         self.updating = updating  # Update the flag
 
+    def set_force_backend(self, name, **options):  # Choose how gravity is summed for this scene
+        set_force_backend(self.engine, name, **options)
+
+    def set_integrator(self, name, **options):  # Choose how this scene is advanced in time
+        self.engine.integrator = make_integrator(name, **options)
+
+    def save_fields(self):  # Save scene-wide settings for serialization
+        return scene_fields(self.engine, self.timestep)
+
+    def load_fields(self, fields):  # Load scene-wide settings from a dictionary
+        self.timestep = apply_scene_fields(self.engine, fields)
+
+    def add_particles(self, pos, vel):  # Add massless test particles, e.g. asteroids and debris
+        self.engine.add_particles(pos, vel)
+
+    def step(self):  # Advance every planet at once and record their telemetry
+        edited = self.engine.changes != self.stepped_changes  # Planets were added, moved or removed by hand
+        self.checkpoints.record(self.steps, self.engine, (tuple(self.bodies), self.time), force=edited)
+        self.engine.step(self.timestep)  # One batched physics step
+        self.collide()  # Merge or bounce the planets that touched during the step
+        self.steps += 1
+        self.time += self.timestep
+        self.stepped_changes = self.engine.changes
+        self.diagnostics.record(self.steps, self.time, self.engine)
+        if self.recording is not None and self.recording.recording:  # Stream the new state to disk
+            if self.ids is None:
+                self.ids = np.array([self.body_ids[sprite] for sprite in self.bodies], dtype=np.int64)
+            engine = self.engine
+            self.recording.append(self.steps, self.time, self.ids, engine.positions, engine.velocities,
+                                  engine.masses, engine.radius[:engine.count], engine.particle_positions,
+                                  engine.particle_velocities)
+        distance, gpe = self.engine.sun_telemetry()  # Telemetry against the sun for all planets
+        distance = distance.tolist() if distance is not None else None
+        gpe = gpe.tolist() if gpe is not None else None
+        for index, sprite in enumerate(self.bodies):  # Store per-planet history
+            if distance is None or sprite.sun:
+                sprite.record_telemetry()
+            else:
+                sprite.record_telemetry(distance[index], gpe[index])
+
+    def rewind(self, step):  # Go back to an earlier step; returns the step reached
+        checkpoint = self.checkpoints.find(step)
+        if checkpoint is None:
+            return self.steps
+        bodies, self.time = checkpoint[2]
+        self.empty()  # Bring back merged planets and drop added ones, in the checkpoint's row order
+        self.add(*bodies)
+        self.steps = self.checkpoints.restore(checkpoint, self.engine)
+        self.stepped_changes = self.engine.changes
+        self.explosions = []
+        self.diagnostics.rewind(self.steps)
+        for sprite in bodies:  # The history drawn and plotted belongs to the discarded future
+            sprite.orbit, sprite.KE, sprite.GPE, sprite.distance = [], [], [], []
+        while self.steps < step:  # Re-simulate up to the exact step asked for
+            self.step()
+        self.engine.interpolate(1)
+        return self.steps
+
+    def start_recording(self, path):  # Stream every planet's state after each step to a new recording
+        self.stop_recording()
+        self.recording = TrajectoryRecording(path, self.timestep)
+
+    def stop_recording(self):  # Finish the recording, which stays available for playback
+        if self.recording is not None:
+            self.recording.close()
+
+    def set_playback(self, frame):  # Show a recorded frame instead of the live planets, or go live with None
+        if frame is not None:
+            frame = min(max(int(frame), 0), len(self.recording) - 1)
+            if self.playback is None:  # Planets cannot change during playback, so their colors are looked up once
+                self.playback_colors = {body_id: sprite.color for sprite, body_id in self.body_ids.items()}
+        self.playback = frame
+
+    def replay_step(self):  # Move playback on by one recorded frame
+        self.playback = min(self.playback + 1, len(self.recording) - 1)
+
+    def draw_recording(self, cam_group):  # Draw the planets and particles as they were in the frame played back
+        _, _, ids, columns, particles = self.recording.frame(self.playback)
+        if len(particles["x"]):
+            self.draw_particles(cam_group, np.column_stack((particles["x"], particles["y"])))
+        colors = self.playback_colors
+        width, height = self.screen.get_size()
+        zoom = cam_group.scale_size
+        x = columns["x"] * (PlanetaryObject.SCALE * zoom) + width / 2 + cam_group.offset.x
+        y = columns["y"] * (PlanetaryObject.SCALE * zoom) + height / 2 + cam_group.offset.y
+        radius = np.maximum(columns["radius"] * (PlanetaryObject.SCALE * zoom), 1)  # At least a pixel
+        visible = (x + radius >= 0) & (x - radius < width) & (y + radius >= 0) & (y - radius < height)
+        ids, x, y, radius = ids[visible], x[visible], y[visible], radius[visible]  # Only those on screen
+        for body_id, point in zip(ids.tolist(), zip(x.tolist(), y.tolist(), radius.tolist())):
+            pygame.draw.circle(self.screen, colors.get(body_id, "white"), point[:2], point[2])
+
+    def collide(self):  # Apply the collisions of the last step to the planets
+        merges = resolve_contacts(self.engine, self.engine.collision_mode)
+        # Look up the sprites before any are removed, since removing one moves another's row
+        merged = [(self.bodies[absorbed], x, y) for _, absorbed, x, y in merges]
+        for sprite, x, y in merged:
+            self.explosions.append([x, y, sprite.radius * 6, 0])
+            sprite.kill()  # The absorbed planet is gone, its mass lives on in the other one
+
+    def draw_explosions(self, cam_group):  # Draw the fading explosions of merged planets
+        if not self.explosions:
+            return
+        if self.explosion_frames is None:  # Cut the sprite sheet into frames once
+            sheet = pygame.image.load(self.EXPLOSION_IMAGE).convert_alpha()
+            columns, rows = self.EXPLOSION_SHEET
+            w, h = sheet.get_width() // columns, sheet.get_height() // rows
+            self.explosion_frames = [sheet.subsurface((column * w, row * h, w, h))
+                                     for row in range(rows) for column in range(columns)]
+        width, height = self.screen.get_size()
+        zoom = cam_group.scale_size
+        for explosion in self.explosions:
+            x, y, size, frame = explosion
+            size = max(1, round(size * zoom))
+            x = x * PlanetaryObject.SCALE * zoom + width / 2 + cam_group.offset.x - size / 2
+            y = y * PlanetaryObject.SCALE * zoom + height / 2 + cam_group.offset.y - size / 2
+            if in_view(x, y, x + size, y + size, (width, height)):  # Scaled only when on screen
+                image = pygame.transform.scale(self.explosion_frames[frame], (size, size))
+                self.screen.blit(image, (x, y))
+            explosion[3] += 1  # Next animation frame
+        self.explosions = [explosion for explosion in self.explosions
+                           if explosion[3] < len(self.explosion_frames)]
+
     def update(self, *args, **kwargs):  # Method to update each planet in the group
+        if self.playback is not None:  # Play the recording back instead, at the current time warp
+            if self.updating:
+                self.clock.advance(kwargs.get("frame_time", 1 / 60), self.replay_step)
+            self.draw_recording(*args)
+            return
+        alpha = 1  # Draw the latest state unless steps were taken this frame
+        if self.updating and (self.bodies or self.engine.particle_count):  # Check if updating is enabled
+            # Take however many fixed steps this frame owes, at the current time warp
+            alpha = self.clock.advance(kwargs.get("frame_time", 1 / 60), self.step)
+        self.engine.interpolate(alpha)  # Positions to draw, between the last two steps
+        self.draw_particles(*args)  # Draw the test particles beneath the planets
         for sprite in self.sprites():  # Loop through all sprites in the group
-            if self.updating:  # Check if updating is enabled
-                sprite.draw(self.screen, 1, True, *args)  # Draw the planet
-                sprite.update_position(self)  # Update the planet's position
-            else:
-                sprite.draw(self.screen, 1, True, *args)  # Just draw the planet without updating
+            sprite.draw(self.screen, 1, True, *args)  # Draw the planet
+        self.draw_explosions(*args)  # Draw explosions over the planets
+
+    def draw_particles(self, cam_group, pos=None):  # Draw every test particle, or those at pos, in a single blit call
+        if pos is None:
+            if not self.engine.particle_count:
+                return
+            pos = self.engine.render_particle_pos
+        if self.particle_image is None:  # Load and scale the asteroid image once
+            self.particle_image = pygame.transform.scale(pygame.image.load(self.PARTICLE_IMAGE).convert_alpha(),
+                                                         (self.PARTICLE_SIZE, self.PARTICLE_SIZE))
+        width, height = self.screen.get_size()
+        zoom = cam_group.scale_size
+        centers = (pos * (PlanetaryObject.SCALE * zoom)
+                   + (width / 2 + cam_group.offset.x, height / 2 + cam_group.offset.y))  # Screen positions
+        if zoom < self.PIXEL_ZOOM:  # Zoomed out too far for the images to tell particles apart
+            self.draw_particle_pixels(centers)
+            return
+        points = centers - self.PARTICLE_SIZE / 2  # Top left corners of the images
+        visible = np.all((points > -self.PARTICLE_SIZE) & (points < (width, height)), axis=1)  # Skip off-screen
+        if np.count_nonzero(visible) > self.MAX_PARTICLE_IMAGES:  # Too many to blit within a frame
+            self.draw_particle_pixels(centers)
+            return
+        image = self.particle_image
+        self.screen.blits([(image, point) for point in points[visible].tolist()], False)
+
+    def draw_particle_pixels(self, centers):  # Draw test particles at these screen positions as single pixels
+        width, height = self.screen.get_size()
+        pixels = np.floor(centers).astype(np.intp)
+        pixels = pixels[np.all((pixels >= 0) & (pixels < (width, height)), axis=1)]  # Skip off-screen
+        screen_pixels = pygame.surfarray.pixels2d(self.screen)  # Locks the screen until released
+        screen_pixels[pixels[:, 0], pixels[:, 1]] = self.screen.map_rgb(self.PARTICLE_COLOR)
+        del screen_pixels  # Unlock the screen
 
     def check_collision(self, event):  # Method to check for collisions with drag events
         ret = [False, None]  # Initialize return values
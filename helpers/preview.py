@@ -0,0 +1,169 @@
+import math  # Import math for the orbit period and the slider quantization
+import os  # Import os for lowering the worker's priority
+import weakref  # Import weakref for shutting the worker down with the preview
+from collections import OrderedDict  # Import OrderedDict for the least recently used cache
+from concurrent.futures import ProcessPoolExecutor  # Import the process pool running the predictions
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.physics import PhysicsEngine  # Import the engine replaying the frozen scene
+from helpers.integrators import Leapfrog  # Import the integrator used for the large preview steps
+from helpers.simulation import PLANET_RADIUS, SCALE  # Import the size given to planets added from the menu
+from helpers.parallel import worker_context  # Import the safe way of starting worker processes
+
+
+YEAR = 365.25 * 24 * 3600  # Seconds in a year
+_generation = None  # Counter shared with the main process; a job is stale once it moves past the job's own
+
+
+def _init_worker(generation):  # Keep the shared counter in the worker process
+    global _generation
+    _generation = generation
+    if hasattr(os, "nice"):  # Rendering comes first when there are fewer cores than busy processes
+        os.nice(10)
+
+
+def predict_path(snapshot, index, steps=400, horizon=5 * YEAR, cancelled=None):  # Future positions of one row
+    # Replays a snapshot with steps leapfrog steps, covering one orbit of the row or the horizon, whichever is
+    # shorter. Stops early where the row touches another body. Returns None if cancelled() turns True.
+    engine = PhysicsEngine()
+    engine.restore(snapshot)
+    pos, vel, mass = engine.positions, engine.velocities, engine.masses
+    suns = np.flatnonzero(engine.sun[:engine.count])
+    if len(suns) and suns[0] != index:  # One orbit around the sun is enough to judge it
+        s = suns[0]
+        mu = engine.G * (mass[s] + mass[index])
+        r = math.hypot(*(pos[index] - pos[s]))
+        energy = float(np.sum((vel[index] - vel[s]) ** 2)) / 2 - mu / r
+        if energy < 0:  # Bound, so the orbit closes after one period
+            horizon = min(horizon, 2 * math.pi * math.sqrt((-mu / (2 * energy)) ** 3 / mu) * 1.02)
+    dt = horizon / steps
+    others = np.arange(engine.count) != index
+    radius = engine.collision_radii()  # Physical sizes, which the step does not change
+
+    path = np.empty((steps + 1, 2))
+    path[0] = pos[index]
+    for step in range(1, steps + 1):
+        if step % 32 == 0 and cancelled is not None and cancelled():
+            return None
+        engine.step(dt)
+        path[step] = engine.pos[index]
+        gap = np.hypot(*(engine.positions[others] - engine.pos[index]).T)
+        if np.any(gap < radius[others] + radius[index]):  # Crashed into a body
+            return path[:step + 1]
+    return path
+
+
+def _predict(generation, snapshot, index, steps):  # Run one prediction in the worker process
+    return predict_path(snapshot, index, steps, cancelled=lambda: _generation.value != generation)
+
+
+def _release(resources):  # Stop the worker, abandoning whatever it is computing
+    pool = resources.pop("pool", None)
+    if pool is not None:
+        resources["generation"].value += 1  # Lets a running job return straight away
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def quantize(mass, velocity, angle, distance):  # Slider values rounded to steps too small to see in the path
+    return (round(math.log10(mass) * 100) if mass > 0 else None,  # 2.3% steps of mass, or a massless particle
+            round(math.log(max(velocity, 1)) * 500),  # 0.2% steps of speed
+            round(angle * 2) % 720,  # Half degree steps of direction
+            round(math.log(max(distance, 1)) * 500))  # 0.2% steps of distance
+
+
+def dequantize(key):  # Representative slider values of a quantized key
+    mass, velocity, angle, distance = key
+    return (0.0 if mass is None else 10 ** (mass / 100), math.exp(velocity / 500), angle / 2,
+            math.exp(distance / 500))
+
+
+class TrajectoryPreview:  # Predicted path of the planet being set up in a menu, computed off the main thread
+    def __init__(self, cache_size=64, steps=400):
+        self.cache_size = cache_size  # Paths kept for slider positions visited before
+        self.steps = steps  # Leapfrog steps per path
+        self.cache = OrderedDict()  # Quantized slider values to path, least recently used first
+        self.snapshot = None  # Scene the paths are predicted against, frozen when the menu opened
+        self.engine = None  # Engine the scene was frozen from
+        self.target = None  # Planet being edited, None when adding one
+        self.index = None  # Row of the planet being edited in the frozen scene
+        self.pending = None  # (key, future) of the job being computed
+        self.path = None  # Latest path, kept on screen while the next one computes
+        self.resources = {}  # Worker pool and shared counter, created the first time they are needed
+        self.finalizer = weakref.finalize(self, _release, self.resources)
+
+    def close(self):  # Stop the worker process
+        self.finalizer()
+
+    def freeze(self, engine, target=None):  # Predict against the scene as it is now, for a new menu
+        snapshot = engine.snapshot()
+        for name in ("particle_pos", "particle_vel", "particle_acc"):  # Particles cannot pull on the planet
+            snapshot[name] = snapshot[name][:0]
+        snapshot["integrator"] = Leapfrog()  # Stable with the large steps, whatever the scene uses
+        self.snapshot, self.engine, self.target = snapshot, engine, target
+        self.index = target.index if target is not None else None
+        self.cache.clear()
+        self.path = None
+        self.cancel()
+
+    def watch(self, engine, target=None):  # Freeze the scene unless it is already frozen for this menu
+        if self.snapshot is None or self.engine is not engine or self.target is not target:
+            self.freeze(engine, target)
+
+    def reset(self):  # Forget the frozen scene once the menu closes
+        self.snapshot = self.engine = self.target = self.index = self.path = None
+        self.cancel()
+
+    def cancel(self):  # Abandon the job being computed
+        if self.pending is not None:
+            self.pending[1].cancel()
+            self.resources["generation"].value += 1  # A job already running notices and returns
+            self.pending = None
+
+    def request(self, mass, velocity, angle, distance=None):  # Latest path for these slider values, or None
+        # Adding places the planet at (0, distance) like the add button; editing keeps the planet where it is
+        if self.snapshot is None:
+            return None
+        key = quantize(mass, velocity, angle, distance if distance is not None else 1)
+        if self.pending is not None and self.pending[1].done():  # Collect the finished job
+            done_key, future = self.pending
+            self.pending = None
+            if not future.cancelled() and future.exception() is None and future.result() is not None:
+                self.store(done_key, future.result())
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.path = self.cache[key]
+            self.cancel()
+        elif self.pending is None or self.pending[0] != key:  # The sliders moved on
+            self.cancel()
+            self.submit(key)
+        return self.path
+
+    def store(self, key, path):  # Add a path to the cache, evicting the least recently used one
+        self.cache[key] = path
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def submit(self, key):  # Start predicting the path for a quantized key
+        mass, velocity, angle, distance = dequantize(key)
+        snapshot = dict(self.snapshot)
+        n = len(snapshot["mass"])
+        index = self.index if self.index is not None else n
+        if self.index is None:  # Add the new planet as an extra row
+            for name, value in (("pos", (0, distance)), ("vel", (0, 0)), ("acc", (0, 0)), ("mass", 0),
+                                ("radius", PLANET_RADIUS / SCALE), ("sun", False)):
+                snapshot[name] = np.concatenate((snapshot[name], [value]))
+        for name in ("vel", "mass"):
+            snapshot[name] = snapshot[name].copy()
+        radians = math.radians(angle)
+        snapshot["vel"][index] = velocity * math.cos(radians), -velocity * math.sin(radians)  # Like the sliders
+        snapshot["mass"][index] = mass
+
+        if "pool" not in self.resources:
+            context = worker_context()
+            generation = self.resources["generation"] = context.Value("q", 0, lock=False)
+            self.resources["pool"] = ProcessPoolExecutor(1, mp_context=context, initializer=_init_worker,
+                                                         initargs=(generation,))
+        generation = self.resources["generation"].value
+        self.pending = key, self.resources["pool"].submit(_predict, generation, snapshot, index, self.steps)
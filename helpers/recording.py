@@ -0,0 +1,113 @@
+import json  # Import json for the self-describing header
+import os  # Import os for file sizes
+
+import numpy as np  # Import NumPy for the columns and memory maps
+
+
+MAGIC = b"ORBREC1\n"  # First bytes of every recording
+VERSION = 2  # Version 1 recordings have no test particles
+HEADER_SIZE = 4096  # Bytes reserved for the magic and the JSON header, padded with spaces
+FRAME_HEADER = 4  # 8-byte fields before each frame's columns: step, body count, simulated time, particle count
+COLUMNS = ("x", "y", "x_vel", "y_vel", "mass", "radius")  # Float columns after the ids, one value per body
+PARTICLE_COLUMNS = ("x", "y", "x_vel", "y_vel")  # Float columns after the bodies', one value per test particle
+LAYOUT = {
+    "byte_order": "little",
+    "frame": "int64 step, int64 count, float64 time in seconds, int64 particle count, then count int64 body ids, "
+             "then one block of count float64 values per column, then one block of particle count float64 values "
+             "per particle column",
+    "columns": COLUMNS,
+    "particle_columns": PARTICLE_COLUMNS,
+    "units": {"x": "m", "y": "m", "x_vel": "m/s", "y_vel": "m/s", "mass": "kg", "radius": "m", "time": "s"},
+    "index": "<recording>.idx holds one int64 (step, byte offset, count, particle count) row per frame",
+}
+
+
+def frame_size(count, particle_count, version=VERSION):  # Bytes taken by a frame, header included
+    if version == 1:  # Three header fields and no particles
+        return 8 * (FRAME_HEADER - 1 + count * (1 + len(COLUMNS)))
+    return 8 * (FRAME_HEADER + count * (1 + len(COLUMNS)) + particle_count * len(PARTICLE_COLUMNS))
+
+
+class TrajectoryRecording:  # Append-only file of every body's and particle's state per step, read through memory maps
+    # Frames are appended as they are recorded and never rewritten, so a run of any length costs no memory
+    # beyond the index. Frame k is found in O(1) through the index, and the files are plain little-endian
+    # arrays described by the JSON header, so other tools can read them without this module or pickle.
+    def __init__(self, path, timestep=None):  # Create a recording, or open an existing one if timestep is None
+        self.path = path
+        self.writer = self.index_writer = None
+        if timestep is not None:
+            self.header = dict(LAYOUT, version=VERSION, timestep=timestep)
+            header = MAGIC + json.dumps(self.header).encode()
+            if len(header) > HEADER_SIZE:
+                raise ValueError("Recording header does not fit")
+            self.writer = open(path, "wb")
+            self.writer.write(header.ljust(HEADER_SIZE, b" "))
+            self.index_writer = open(path + ".idx", "wb")
+            self.offset = HEADER_SIZE  # Where the next frame starts
+            self.index = np.zeros((0, 4), dtype=np.int64)  # Kept here while writing, read from the file otherwise
+            self.frames = 0
+        else:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+            if not header.startswith(MAGIC):
+                raise ValueError(f"{path} is not a trajectory recording")
+            self.header = json.loads(header[len(MAGIC):].decode())
+            index = np.fromfile(path + ".idx", dtype=np.int64).reshape(-1, 3 if self.header["version"] == 1 else 4)
+            self.index = index if index.shape[1] == 4 else np.column_stack((index, np.zeros(len(index), np.int64)))
+            self.frames = len(self.index)
+            self.offset = os.path.getsize(path)
+        self.data = None  # Memory map of the frames, remapped as the file grows
+
+    def __len__(self):
+        return self.frames
+
+    @property
+    def recording(self):  # True while frames can still be appended
+        return self.writer is not None
+
+    def append(self, step, time, ids, pos, vel, mass, radius, particle_pos, particle_vel):  # Write one frame at the end
+        count, particle_count = len(ids), len(particle_pos)
+        header = (np.array([step, count], dtype=np.int64).tobytes() + np.array([time], dtype=float).tobytes()
+                  + np.array([particle_count], dtype=np.int64).tobytes())
+        columns = np.empty((len(COLUMNS), count))
+        columns[0:2] = pos.T
+        columns[2:4] = vel.T
+        columns[4], columns[5] = mass, radius
+        particles = np.empty((len(PARTICLE_COLUMNS), particle_count))
+        particles[0:2] = particle_pos.T
+        particles[2:4] = particle_vel.T
+        self.writer.write(header)
+        self.writer.write(np.asarray(ids, dtype=np.int64).tobytes())
+        self.writer.write(columns.astype("<f8").tobytes())
+        self.writer.write(particles.astype("<f8").tobytes())
+
+        row = np.array([[step, self.offset, count, particle_count]], dtype=np.int64)
+        self.index_writer.write(row.tobytes())
+        if self.frames == len(self.index):  # Grow the index by doubling
+            self.index = np.concatenate((self.index, np.zeros((max(16, self.frames), 4), dtype=np.int64)))
+        self.index[self.frames] = row
+        self.frames += 1
+        self.offset += frame_size(count, particle_count)
+
+    def close(self):  # Stop recording; the frames stay readable
+        if self.writer is not None:
+            self.writer.close()
+            self.index_writer.close()
+            self.writer = self.index_writer = None
+
+    def frame(self, k):  # Step, time, ids, body columns and particle columns of frame k, as views into the file
+        step, offset, count, particle_count = self.index[k].tolist()
+        version = self.header["version"]
+        end = offset + frame_size(count, particle_count, version)
+        if self.data is None or len(self.data) < end:  # Map everything written so far
+            if self.writer is not None:
+                self.writer.flush()
+                self.index_writer.flush()
+            self.data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        start = offset + 8 * (FRAME_HEADER if version > 1 else FRAME_HEADER - 1)
+        time = float(self.data[offset + 16:offset + 24].view("<f8")[0])
+        ids = self.data[start:start + 8 * count].view("<i8")
+        floats = self.data[start + 8 * count:end].view("<f8")
+        columns = floats[:len(COLUMNS) * count].reshape(len(COLUMNS), count)
+        particles = floats[len(COLUMNS) * count:].reshape(len(PARTICLE_COLUMNS), particle_count)
+        return step, time, ids, dict(zip(COLUMNS, columns)), dict(zip(PARTICLE_COLUMNS, particles))
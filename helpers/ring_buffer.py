@@ -0,0 +1,54 @@
+import numpy as np  # Import NumPy for the typed storage
+
+
+class RingBuffer:  # Fixed-capacity history of values, oldest dropped first, readable as one contiguous view
+    # Once full, every value is written twice, capacity rows apart, so the latest capacity values always sit
+    # side by side in memory and view() never copies. Until then the storage grows by doubling, so short
+    # histories stay small.
+    def __init__(self, capacity, shape=(), dtype=float):
+        self.capacity = capacity  # Most values kept
+        self.shape = tuple(shape)  # Shape of each value, e.g. (2,) for points
+        self.dtype = dtype
+        self.data = np.empty((min(capacity, 16),) + self.shape, dtype)  # Storage, doubled in size once full
+        self.count = 0  # Values held
+        self.end = 0  # Row the next value goes to once the buffer is full
+        self.appended = 0  # Values added since the last reset, including dropped ones, to tell which are new
+        self.resets = 0  # Times the contents were replaced, after which earlier values no longer apply
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):  # Add a value, dropping the oldest one when full
+        self.appended += 1
+        if self.count < self.capacity:
+            if self.count == len(self.data):  # Grow by doubling
+                data = np.empty((min(2 * len(self.data), self.capacity),) + self.shape, self.dtype)
+                data[:self.count] = self.data[:self.count]
+                self.data = data
+            self.data[self.count] = value
+            self.count += 1
+            if self.count == self.capacity:  # Full from now on: switch to the mirrored layout
+                data = np.empty((2 * self.capacity,) + self.shape, self.dtype)
+                data[:self.capacity] = data[self.capacity:] = self.data
+                self.data = data
+            return
+        self.data[self.end] = self.data[self.end + self.capacity] = value  # Overwrites the oldest value
+        self.end = (self.end + 1) % self.capacity
+
+    def view(self):  # The values from oldest to newest, as a view into the storage
+        if self.count < self.capacity:
+            return self.data[:self.count]
+        return self.data[self.end:self.end + self.capacity]
+
+    def reset(self, values=()):  # Replace the contents, keeping the newest values that fit
+        values = np.asarray(values, dtype=self.dtype).reshape((-1,) + self.shape)[-self.capacity:]
+        self.data = np.empty((max(min(self.capacity, 16), len(values)),) + self.shape, self.dtype)
+        self.count, self.end = max(0, len(values) - 1), 0
+        self.appended = self.count
+        self.resets += 1
+        self.data[:self.count] = values[:-1]  # Copied straight in, apart from the last one
+        if len(values):  # Appended normally, so a full buffer switches layout
+            self.append(values[-1])
+
+    def tolist(self):  # Plain Python values, for saving
+        return self.view().tolist()
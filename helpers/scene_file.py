@@ -0,0 +1,160 @@
+import json  # Import json for the self-describing header
+import os  # Import os for replacing the saved file in one step
+import pickle  # Import pickle for importing scenes saved in the old format
+import tempfile  # Import tempfile for writing next to the saved file
+import zlib  # Import zlib for the compressed history blocks
+from functools import partial  # Import partial for passing the writer options along
+
+import numpy as np  # Import NumPy for the columns and memory maps
+
+
+_UMASK = os.umask(0o022)  # Read once, since setting it is the only way to find it out
+os.umask(_UMASK)
+
+MAGIC = b"ORBSCENE"  # First bytes of every scene file, followed by the header length as a uint32
+SCHEMA_VERSION = 1  # Bumped whenever the layout changes in a way older readers cannot follow
+ALIGNMENT = 64  # Every block starts at a multiple of this many bytes, so mapped columns are aligned
+FLOAT_COLUMNS = ("x", "y", "x_vel", "y_vel", "mass", "radius", "total_fx", "total_fy", "velocity",
+                 "distance_to_sun")  # Per-body values stored as float64, one column each
+HISTORIES = {"orbit": (2,), "KE": (), "GPE": (), "distance": ()}  # Per-body histories and the shape of each entry
+
+
+def _planets(planets_data):  # Scene settings and planet dictionaries of a scene in the old list form
+    scene = next((data["scene"] for data in planets_data if "scene" in data), {})
+    return scene, [data for data in planets_data if "scene" not in data]
+
+
+def dump_scene(planets_data, f, histories=True, compress=True):  # Write a scene, as built for saving, to a file
+    # Histories may be lists or arrays. With histories False only the current state is written.
+    scene, planets = _planets(planets_data)
+    blocks = {}  # Block name to array, written in this order
+    for name in FLOAT_COLUMNS:
+        blocks[name] = np.array([planet[name] for planet in planets], dtype="<f8")
+    blocks["sun"] = np.array([planet["sun"] for planet in planets], dtype=np.uint8)
+    blocks["color"] = np.array([tuple(planet["color"])[:3] for planet in planets], dtype=np.uint8).reshape(-1, 3)
+    names = [planet["name"].encode() for planet in planets]
+    blocks["name_ends"] = np.cumsum([len(name) for name in names], dtype="<i8")  # Names are cut from one blob
+    blocks["names"] = np.frombuffer(b"".join(names), dtype=np.uint8)
+    for name in ("particle_pos", "particle_vel"):
+        blocks[name] = np.asarray(scene.get(name, ()), dtype="<f8").reshape(-1, 2)
+    if histories:
+        for name, shape in HISTORIES.items():
+            values = [np.asarray(planet.get(name, ()), dtype="<f8").reshape((-1,) + shape) for planet in planets]
+            blocks[name + "_ends"] = np.cumsum([len(value) for value in values], dtype="<i8")
+            blocks[name] = np.concatenate(values) if values else np.zeros((0,) + shape)
+
+    layout, data, offset = [], [], 0
+    for name, array in blocks.items():
+        raw = np.ascontiguousarray(array).tobytes()
+        codec = None
+        if compress and name in HISTORIES and raw:  # Histories are large and shrink well; state stays mappable
+            raw, codec = zlib.compress(raw, 1), "zlib"
+        layout.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset,
+                       "nbytes": len(raw), "codec": codec})
+        data.append(raw)
+        offset += len(raw)
+        data.append(b"\0" * (-offset % ALIGNMENT))
+        offset += -offset % ALIGNMENT
+    settings = {key: value for key, value in scene.items() if key not in ("particle_pos", "particle_vel")}
+    header = json.dumps({"version": SCHEMA_VERSION, "count": len(planets), "scene": settings,
+                         "blocks": layout}, default=lambda value: value.item()).encode()  # NumPy scalars too
+    start = len(MAGIC) + 4 + len(header)
+    start += -start % ALIGNMENT  # Blocks are placed after the header, relative to this point
+    f.write(MAGIC + np.uint32(len(header)).tobytes() + header.ljust(start - len(MAGIC) - 4))
+    for raw in data:
+        f.write(raw)
+
+
+def write_atomic(path, data, dump=pickle.dump):  # Write a file so it is only ever seen whole
+    # The data goes to a temporary file in the same folder, which then replaces the old file in one rename,
+    # so a crash part way through leaves the previous save intact
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            try:  # Temporary files are private; use the permissions the old file has, or a new one would get
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o666 & ~_UMASK
+            os.chmod(temporary, mode)
+            dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())  # On disk before it takes the old file's place
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def write_scene(path, planets_data, **options):  # Save a scene so a crash never leaves half a file
+    write_atomic(path, planets_data, partial(dump_scene, **options))
+
+
+def is_scene_file(path):  # True if the file starts like a scene file
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_scene(path, histories=True):  # Scene settings, per-body columns and histories of a scene file
+    # Columns are read-only views into a memory map, so loading costs little more than the header. Histories
+    # are lists of per-body arrays, or None if they were not saved or not asked for.
+    data = np.memmap(path, dtype=np.uint8, mode="r").view(np.ndarray)  # Plain arrays, still backed by the map
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a scene file")
+    length = int(data[len(MAGIC):len(MAGIC) + 4].view("<u4")[0])
+    header = json.loads(bytes(data[len(MAGIC) + 4:len(MAGIC) + 4 + length]).decode())
+    if header["version"] > SCHEMA_VERSION:
+        raise ValueError(f"{path} was saved by a newer version (schema {header['version']})")
+    start = len(MAGIC) + 4 + length
+    start += -start % ALIGNMENT
+
+    blocks = {}
+    for block in header["blocks"]:
+        if block["name"].removesuffix("_ends") in HISTORIES and not histories:
+            continue
+        begin = start + block["offset"]
+        if begin + block["nbytes"] > len(data):
+            raise ValueError(f"{path} is truncated")
+        raw = data[begin:begin + block["nbytes"]]
+        if block["codec"] == "zlib":
+            raw = np.frombuffer(zlib.decompress(raw), dtype=np.uint8)
+        elif block["codec"] is not None:
+            raise ValueError(f"{path} uses an unknown codec {block['codec']!r}")
+        blocks[block["name"]] = raw.view(block["dtype"]).reshape(block["shape"])
+
+    fields = dict(header["scene"], particle_pos=np.array(blocks["particle_pos"]),
+                  particle_vel=np.array(blocks["particle_vel"]))  # Copied, so settings never hold the map open
+    columns = {name: blocks[name] for name in FLOAT_COLUMNS}
+    columns["sun"] = blocks["sun"].astype(bool)
+    columns["color"] = blocks["color"]
+    names = bytes(blocks["names"])
+    starts = np.concatenate(([0], blocks["name_ends"][:-1])).tolist()
+    columns["name"] = [names[a:b].decode() for a, b in zip(starts, blocks["name_ends"].tolist())]
+    saved = {}
+    if histories and all(name in blocks for name in HISTORIES):
+        for name in HISTORIES:
+            ends = blocks[name + "_ends"].tolist()
+            values = blocks[name]
+            saved[name] = [values[start:end] for start, end in zip([0] + ends[:-1], ends)]
+    return fields, columns, saved or None
+
+
+def read_planets_data(path):  # A scene file in the list form the simulator builds for saving
+    fields, columns, histories = read_scene(path)
+    planets_data = [{"scene": fields}]
+    values = {name: columns[name].tolist() for name in FLOAT_COLUMNS}
+    for index, name in enumerate(columns["name"]):
+        planet = {column: values[column][index] for column in FLOAT_COLUMNS}
+        planet.update(name=name, sun=bool(columns["sun"][index]), color=tuple(columns["color"][index].tolist()))
+        for history, shape in HISTORIES.items():
+            planet[history] = histories[history][index] if histories else np.zeros((0,) + shape)
+        planets_data.append(planet)
+    return planets_data
+
+
+def import_legacy(path, output=None):  # Convert a pickled scene; returns it in list form
+    # Pickle can run code while loading, so only import files from a trusted source
+    with open(path, "rb") as f:
+        planets_data = pickle.load(f)
+    if output is not None:
+        write_scene(output, planets_data)
+    return planets_data
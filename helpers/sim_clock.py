@@ -0,0 +1,38 @@
+import time  # Import time for measuring how long the physics takes
+
+
+class SimulationClock:  # Fixed-step accumulator that decouples physics steps from rendered frames
+    WARPS = (1, 10, 100, 1000)  # Time-warp multipliers offered to the user
+    STEPS_PER_SECOND = 60  # Physics steps per real second at 1x, the pace of one step per frame at 60 FPS
+    MAX_FRAME_TIME = 0.25  # Longest frame counted, so a hitch does not queue up a burst of steps
+
+    def __init__(self, physics_budget=0.010):
+        self.warp = 1  # Requested time-warp multiplier
+        self.physics_budget = physics_budget  # Seconds of physics allowed per rendered frame
+        self.accumulator = 0.0  # Physics steps owed but not yet taken
+        self.achieved_warp = 1.0  # Smoothed warp actually reached
+        self.degraded = False  # True when the last frame could not keep up with the requested warp
+
+    def set_warp(self, warp):  # Change the time-warp multiplier
+        self.warp = warp
+
+    def advance(self, frame_time, step):  # Take the steps owed for this frame; returns the blend factor
+        frame_time = min(frame_time, self.MAX_FRAME_TIME)
+        self.accumulator += frame_time * self.STEPS_PER_SECOND * self.warp
+        start = time.perf_counter()
+        steps = 0
+        while self.accumulator >= 1:
+            step()  # One fixed physics step
+            self.accumulator -= 1
+            steps += 1
+            if time.perf_counter() - start > self.physics_budget:  # Out of time for this frame
+                break
+
+        # Drop whatever could not fit, rather than letting the backlog grow and stall the UI
+        self.degraded = self.accumulator >= 1
+        if self.degraded:
+            self.accumulator %= 1
+        if frame_time > 0:
+            reached = steps / (frame_time * self.STEPS_PER_SECOND)
+            self.achieved_warp += (reached - self.achieved_warp) * 0.1  # Smooth it for display
+        return self.accumulator  # Fraction of the way to the next step
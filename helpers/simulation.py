@@ -0,0 +1,226 @@
+import pickle  # Import pickle for reading and writing saved scenes
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.physics import PhysicsEngine, make_force_backend  # Import the struct-of-arrays physics engine
+from helpers.integrators import make_integrator  # Import the time integrators
+from helpers.collisions import resolve_contacts  # Import the collision detection
+from helpers.checkpoints import CheckpointRing  # Import the rewind history
+from helpers.diagnostics import Diagnostics  # Import the conservation diagnostics
+from helpers.scene_file import is_scene_file, read_scene, write_scene, import_legacy  # Import the scene files
+
+
+# Simulation constants, matching PlanetaryObject without needing pygame
+AU = 149.6e9  # Astronomical unit in meters
+TIMESTEP = 60 * 60 * 12  # Seconds in half a day
+SUN_MASS = 1.98892 * 10 ** 30  # Mass of the sun in kilograms
+SCALE = 200 / AU  # Pixels per meter when drawn, so drawn radii convert to meters
+PLANET_RADIUS = 10 * SCALE * 10 ** 9  # Drawn radius given to planets added from the menu
+SUN_RADIUS = 30 * 10 ** 9  # Drawn radius of the sun in meters
+MAX_DATA = 5000  # Maximum telemetry points kept per planet in a saved scene
+
+
+def scene_fields(engine, timestep):  # Scene-wide settings of an engine, as stored in saved scenes
+    backend, integrator = engine.force_backend, engine.integrator
+    return {"force_backend": backend.name, "force_options": backend.settings(),
+            "integrator": integrator.name, "integrator_options": integrator.settings(),
+            "timestep": timestep, "collisions": engine.collision_mode,
+            "particle_pos": engine.particle_positions.copy(),
+            "particle_vel": engine.particle_velocities.copy()}
+
+
+def set_force_backend(engine, name, **options):  # Replace an engine's force backend, releasing the old one
+    close = getattr(engine.force_backend, "close", None)
+    if close is not None:  # Release worker processes held by the old backend
+        close()
+    engine.force_backend = make_force_backend(name, **options)
+
+
+def apply_scene_fields(engine, fields):  # Apply saved scene-wide settings to an engine; returns the timestep
+    set_force_backend(engine, fields.get("force_backend", "direct"), **fields.get("force_options", {}))
+    engine.integrator = make_integrator(fields.get("integrator", "euler"), **fields.get("integrator_options", {}))
+    engine.collision_mode = fields.get("collisions", "off")  # Scenes from before collisions play back unchanged
+    if "particle_pos" in fields:  # Test particles saved with the scene
+        engine.add_particles(fields["particle_pos"], fields["particle_vel"])
+    return fields.get("timestep", TIMESTEP)
+
+
+class Simulation:  # Headless scene for batch runs, stepping the physics engine with no display
+    def __init__(self, timestep=TIMESTEP, record_every=1):
+        self.engine = PhysicsEngine()  # Shared arrays holding the state of every planet
+        self.timestep = timestep  # Seconds simulated per step
+        self.record_every = record_every  # Steps between telemetry records
+        self.steps = 0  # Steps taken so far
+        self.checkpoints = CheckpointRing()  # Snapshots to rewind to
+        self.stepped_changes = None  # Engine change counter after the last step, to notice edits in between
+        self.diagnostics = Diagnostics()  # Total energy, momentum and angular momentum every few steps
+        self.planets = []  # Saved fields of each planet by engine row, None for the sun
+        # Telemetry has one column per body ever in the scene, so bodies absorbed in merges keep their history
+        self.columns = []  # Telemetry column of each engine row
+        self.column_planets = []  # Saved fields of the body in each telemetry column, None for the sun
+        self.merges = []  # (step, kept column, absorbed column) of every merge so far
+        self.telemetry = {"step": [], "time": [], "pos": [], "vel": [], "distance": [], "KE": [], "GPE": []}
+        self.add_body(0, 0, 0, 0, SUN_MASS, SUN_RADIUS, sun=True)  # Every scene has the sun at its center
+
+    @classmethod
+    def from_scene(cls, planets_data, **kwargs):  # Build a simulation from a loaded scene
+        simulation = cls(**kwargs)
+        for planet_data in planets_data:
+            if "scene" in planet_data:  # Scene-wide settings
+                simulation.timestep = apply_scene_fields(simulation.engine, planet_data["scene"])
+                continue
+            simulation.add_body(planet_data["x"], planet_data["y"], planet_data["x_vel"], planet_data["y_vel"],
+                                planet_data["mass"], planet_data["radius"] / SCALE, fields=planet_data)
+        return simulation
+
+    @classmethod
+    def load(cls, path, **kwargs):  # Build a simulation from a scene file saved by the simulator
+        if not is_scene_file(path):  # Pickled scene in the old format
+            return cls.from_scene(import_legacy(path), **kwargs)
+        fields, columns, histories = read_scene(path)
+        simulation = cls(**kwargs)
+        simulation.timestep = apply_scene_fields(simulation.engine, fields)
+        engine = simulation.engine
+        count = len(columns["name"])
+        rows = slice(engine.add_bodies(count), engine.count)  # Every body in one go, straight from the columns
+        engine.pos[rows] = np.column_stack((columns["x"], columns["y"]))
+        engine.vel[rows] = np.column_stack((columns["x_vel"], columns["y_vel"]))
+        engine.mass[rows] = columns["mass"]
+        engine.radius[rows] = columns["radius"] / SCALE  # Drawn radius from pixels to meters
+        engine.sun[rows] = columns["sun"]
+        colors = columns["color"].tolist()
+        distance = columns["distance_to_sun"].tolist()
+        for index, (name, sun) in enumerate(zip(columns["name"], columns["sun"].tolist())):
+            if sun:
+                simulation.track(None)
+                continue
+            planet = {"name": name, "color": tuple(colors[index]), "distance_to_sun": distance[index]}
+            if histories:
+                planet.update((history, values[index]) for history, values in histories.items())
+            simulation.track(planet)
+        return simulation
+
+    def add_body(self, x, y, x_vel, y_vel, mass, radius=PLANET_RADIUS / SCALE, sun=False,
+                 fields=None):  # Add a body and return its row
+        index = self.engine.add_body()
+        self.engine.pos[index] = x, y
+        self.engine.vel[index] = x_vel, y_vel
+        self.engine.mass[index] = mass
+        self.engine.radius[index] = radius  # Drawn radius in meters
+        self.engine.sun[index] = sun
+        self.track(None if sun else dict(fields or {}))
+        return index
+
+    def track(self, planet):  # Give the newest engine row its saved fields and a telemetry column
+        self.planets.append(planet)
+        self.columns.append(len(self.column_planets))
+        self.column_planets.append(planet)
+
+    def set_force_backend(self, name, **options):  # Choose how gravity is summed for this scene
+        set_force_backend(self.engine, name, **options)
+
+    @property
+    def time(self):  # Seconds simulated so far
+        return self.steps * self.timestep
+
+    def step(self, steps=1):  # Advance the scene as fast as possible, recording telemetry as it goes
+        for _ in range(steps):
+            edited = self.engine.changes != self.stepped_changes  # Bodies were added or changed by hand
+            self.checkpoints.record(self.steps, self.engine, (list(self.planets), list(self.columns)), force=edited)
+            self.engine.step(self.timestep)
+            self.steps += 1
+            self.collide()  # Merge or bounce the bodies that touched during the step, as the window does
+            self.stepped_changes = self.engine.changes
+            self.diagnostics.record(self.steps, self.time, self.engine)
+            if self.steps % self.record_every == 0:
+                self.record()
+
+    def collide(self):  # Apply the collisions of the last step, removing the rows of absorbed bodies
+        merges = resolve_contacts(self.engine, self.engine.collision_mode)
+        # Look up the columns before any row is removed, since removing one moves another's row
+        merged = [(self.columns[kept], self.columns[absorbed]) for kept, absorbed, _, _ in merges]
+        for kept, absorbed in merged:
+            self.merges.append((self.steps, kept, absorbed))
+            row = self.columns.index(absorbed)
+            moved = self.engine.remove_body(row)  # The last row fills the hole
+            planet, column = self.planets.pop(), self.columns.pop()
+            if moved is not None:
+                self.planets[row], self.columns[row] = planet, column
+
+    def rewind(self, step):  # Go back to an earlier step, dropping the telemetry after it; returns the step reached
+        checkpoint = self.checkpoints.find(step)
+        if checkpoint is None:
+            return self.steps
+        self.steps = self.checkpoints.restore(checkpoint, self.engine)
+        self.stepped_changes = self.engine.changes
+        self.planets, self.columns = map(list, checkpoint[2])
+        self.merges = [merge for merge in self.merges if merge[0] <= self.steps]
+        self.diagnostics.rewind(self.steps)
+        keep = sum(recorded <= self.steps for recorded in self.telemetry["step"])  # Records are in step order
+        for values in self.telemetry.values():
+            del values[keep:]
+        self.step(max(0, step - self.steps))  # Re-simulate up to the exact step asked for
+        return self.steps
+
+    def by_column(self, values):  # Values by engine row spread over the telemetry columns, NaN for absorbed bodies
+        spread = np.full((len(self.column_planets),) + values.shape[1:], np.nan)
+        spread[self.columns] = values
+        return spread
+
+    def record(self):  # Store one telemetry sample for every body
+        engine = self.engine
+        distance, gpe = engine.sun_telemetry()
+        speed2 = np.einsum("ij,ij->i", engine.velocities, engine.velocities)
+        self.telemetry["step"].append(self.steps)
+        self.telemetry["time"].append(self.time)
+        self.telemetry["pos"].append(self.by_column(engine.positions))
+        self.telemetry["vel"].append(self.by_column(engine.velocities))
+        self.telemetry["KE"].append(self.by_column(0.5 * engine.masses * speed2))
+        if distance is None:  # No sun in this scene
+            distance = gpe = np.full(engine.count, np.nan)
+        suns = engine.sun[:engine.count]
+        self.telemetry["distance"].append(self.by_column(np.where(suns, np.nan, distance)))  # Not for the sun
+        self.telemetry["GPE"].append(self.by_column(np.where(suns, np.nan, gpe)))
+
+    def save_fields(self):  # Save scene-wide settings for serialization
+        return scene_fields(self.engine, self.timestep)
+
+    def scene_data(self):  # The scene as the simulator saves it, so a run can be opened in the window
+        planets_data = [{"scene": self.save_fields()}]
+        records = {name: np.array(values[-MAX_DATA:]) for name, values in self.telemetry.items()}
+        for index, fields in enumerate(self.planets):
+            if fields is None:  # The sun is recreated by the simulator
+                continue
+            x, y = self.engine.pos[index]
+            x_vel, y_vel = self.engine.vel[index]
+            planet = {"name": "", "color": (255, 255, 255), "WIDTH": 1920, "HEIGHT": 1016,
+                      "orbit": [], "KE": [], "GPE": [], "distance": [], "distance_to_sun": 0.0, "sun": False}
+            planet.update(fields)
+            planet.update({"x": float(x), "y": float(y), "x_vel": float(x_vel), "y_vel": float(y_vel),
+                           "mass": float(self.engine.mass[index]),
+                           "radius": float(self.engine.radius[index]) * SCALE, "velocity": float(np.hypot(x_vel, y_vel)),
+                           "total_fx": float(self.engine.acc[index, 0] * self.engine.mass[index]),
+                           "total_fy": float(self.engine.acc[index, 1] * self.engine.mass[index])})
+            if len(records["step"]):  # Extend the history with what this run recorded
+                column = self.columns[index]
+                orbit = [tuple(point) for point in records["pos"][:, column].tolist()]
+                planet["orbit"] = (list(planet["orbit"]) + orbit)[-MAX_DATA:]
+                for name in ("KE", "GPE", "distance"):
+                    planet[name] = (list(planet[name]) + records[name][:, column].tolist())[-MAX_DATA:]
+                planet["distance_to_sun"] = planet["distance"][-1]
+            planets_data.append(planet)
+        return planets_data
+
+    def save(self, path):  # Write the scene in the simulator's format, or the old pickled one for a .pkl path
+        if path.endswith(".pkl"):
+            with open(path, "wb") as f:
+                pickle.dump(self.scene_data(), f)
+        else:
+            write_scene(path, self.scene_data())
+
+    def save_telemetry(self, path):  # Write the recorded telemetry as plain NumPy arrays, one column per body
+        names = np.array(["Sun" if fields is None else fields.get("name", "") for fields in self.column_planets])
+        arrays = {name: np.array(values) for name, values in self.telemetry.items()}
+        merges = np.array(self.merges, dtype=np.int64).reshape(-1, 3)  # Step, kept column, absorbed column
+        np.savez_compressed(path, names=names, mass=self.by_column(self.engine.masses), timestep=self.timestep,
+                            merges=merges, **arrays)
@@ -10,35 +10,55 @@ import pygame_widgets.textbox  # Import textbox widget for Pygame
 from pygame_widgets import Mouse  # Import Mouse from Pygame Widgets
 from pygame_widgets.mouse import MouseState  # Import MouseState for mouse events
 
+from helpers.physics import PhysicsEngine  # Import the engine that stores planet state
+from helpers.ring_buffer import RingBuffer  # Import the fixed-capacity history buffers
+from helpers.trail import Trail  # Import the simplified orbit trail
+from helpers.culling import in_view, visible_runs, decimate_pixels  # Import the tests skipping what is off screen
+from helpers.text_cache import text_cache  # Import the shared cache of fonts and rendered text
 
-class Star(pygame.sprite.Sprite):  # Class to control random stars in the background
-    def __init__(self, sprite_group):
-        super().__init__(sprite_group)  # Initialize the parent class with the sprite group
-        star_colors = [
-            "lightblue",
-            "white",
-            "lightyellow",
-            "lightgray",
-            "gray",
-            "darkgray",
-        ]  # List of possible star colors
-
-        self.color = random.choice(star_colors)  # Randomly select a star color
-        self.surface = pygame.display.get_surface()  # Get the current display surface
-        x, y = pygame.display.get_surface().get_size()  # Get the size of the display
-        self.x = round(random.uniform(-600, x + 600))  # Random x position
-        self.y = round(random.uniform(-600, y + 600))  # Random y position
-        self.size = random.uniform(1, 1.5)  # Random size for the star
 
-    def update(self, cam_group):  # Update method for the star
-        self.draw(cam_group)  # Draw the star
+class Starfield:  # Background of random stars, drawn once into a few layers that move with the camera
+    # Stars of similar size share a layer and move together, larger ones faster, so each frame costs a few
+    # blits per layer instead of a draw call per star. Every layer is a tile repeated in both directions, so
+    # panning never runs out of stars.
+    COLORS = ["lightblue", "white", "lightyellow", "lightgray", "gray", "darkgray"]  # Possible star colors
 
-    def draw(self, cam_group):  # Method to draw the star
-        pos = (
-            self.x + cam_group.offset.x * 0.1 * self.size,  # Adjust position based on camera offset
-            self.y + cam_group.offset.y * 0.1 * self.size,
-        )
-        pygame.draw.circle(self.surface, self.color, pos, self.size)  # Draw the star as a circle
+    def __init__(self, count=2000, layers=3, parallax=0.1, sizes=(1, 1.5), margin=600):
+        self.surface = pygame.display.get_surface()  # Get the current display surface
+        x, y = self.surface.get_size()  # Get the size of the display
+        self.tile = (x + 2 * margin, y + 2 * margin)  # Size of each layer, holding count stars between them
+        self.origin = (-margin, -margin)  # Where the tiles start when the camera is at rest
+        bounds = [sizes[0] + (sizes[1] - sizes[0]) * k / layers for k in range(layers + 1)]
+        self.parallax = [parallax * (low + high) / 2 for low, high in zip(bounds, bounds[1:])]  # Per layer
+        self.layers = []
+        for _ in range(layers):
+            layer = pygame.Surface(self.tile).convert()  # Black, which is left out when blitting
+            layer.set_colorkey((0, 0, 0), pygame.RLEACCEL)  # Run-length encoded, so the empty space is skipped
+            self.layers.append(layer)
+
+        width, height = self.tile
+        for _ in range(count):
+            size = random.uniform(*sizes)  # Random size for the star
+            layer = self.layers[min(int((size - sizes[0]) / (sizes[1] - sizes[0]) * layers), layers - 1)]
+            color = random.choice(self.COLORS)  # Randomly select a star color
+            star_x, star_y = random.uniform(0, width), random.uniform(0, height)  # Random position in the tile
+            for dx in (-width, 0, width):  # Copies across the edges, so stars there are whole when tiled
+                for dy in (-height, 0, height):
+                    if -2 < star_x + dx < width + 2 and -2 < star_y + dy < height + 2:
+                        pygame.draw.circle(layer, color, (star_x + dx, star_y + dy), size)
+
+    def update(self, cam_group):  # Update method for the starfield
+        self.draw(cam_group)  # Draw the stars
+
+    def draw(self, cam_group):  # Method to draw every layer, shifted by the camera offset
+        width, height = self.tile
+        screen_width, screen_height = self.surface.get_size()
+        for layer, parallax in zip(self.layers, self.parallax):
+            # Top left corner of the tile covering the screen's top left corner
+            x = (self.origin[0] + cam_group.offset.x * parallax) % width - width
+            y = (self.origin[1] + cam_group.offset.y * parallax) % height - height
+            self.surface.blits([(layer, (x + dx, y + dy)) for dx in (0, width) for dy in (0, height)
+                                if x + dx < screen_width and y + dy < screen_height], False)
 
 
 class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
@@ -46,12 +66,22 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
     G = 6.67428e-11  # Gravitational constant
     TIMESTEP = 60 * 60 * 12  # Seconds in half a day
     SCALE = 200 / AU  # Scaling factor for rendering
-    max_orbit_points = 200  # Maximum number of points in the orbit
+    max_orbit_points = 200  # Maximum number of points in the orbit, kept where the trail bends
+    trail_tolerance = 0.5  # Largest distance in pixels between the drawn trail and the recorded positions
+    max_data = 5000  # Maximum energy and distance data points kept per planet
     force_vectors = False  # Flag to show force vectors
     velocity_vectors = False  # Flag to show velocity vectors
     only_when_focused = False  # Flag for focus-based visibility
+    min_label_length = 40  # Shortest scale bar in pixels that is still labelled
 
     def __init__(self, sprite_group, x, y, radius, color, mass, screen_size, name, screen, cam_group):
+        self.engine = PhysicsEngine(capacity=1)  # Own state until a planet group takes it over
+        self.index = self.engine.add_body()  # Row of this planet in the engine arrays
+        # Histories recorded after every step, with the oldest entries dropped once full
+        self.trail = Trail(self.max_orbit_points, self.trail_tolerance / self.SCALE)  # Positions, simplified
+        self.KE_buffer = RingBuffer(self.max_data)  # Kinetic energy
+        self.GPE_buffer = RingBuffer(self.max_data)  # Gravitational potential energy
+        self.distance_buffer = RingBuffer(self.max_data)  # Distance to the sun
         super().__init__(sprite_group)  # Initialize the parent class
         self.screen = screen  # Store the screen reference
         self.name = name  # Store the name of the planet
@@ -62,58 +92,180 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
         self.mass = mass  # Set the planet's mass
         self.WIDTH = screen_size[0]  # Get screen width
         self.HEIGHT = screen_size[1]  # Get screen height
-        self.orbit = []  # List to store orbit points
         self.sun = False  # Flag to indicate if this planet is the sun
         self.distance_to_sun = 0  # Distance to the sun
         self.x_vel = self.y_vel = 0  # Initialize velocity
         self.total_fx = self.total_fy = 0  # Initialize total force
         self.velocity = 0  # Initialize velocity magnitude
-        self.GPE = []  # List to store gravitational potential energy
-        self.KE = []  # List to store kinetic energy
-        self.distance = []  # List to store distances
         self.last_pos = pygame.math.Vector2()  # Store the last position for dragging
         self.dragging = False  # Flag for dragging state
         self.focused = False  # Flag for focus state
+        self.zoom = 1  # Camera zoom the planet was last drawn at
         self.planet = pygame.draw.circle(screen, self.color, (x + cam_group.offset.x, y + cam_group.offset.y),
                                          self.radius)  # Draw the planet initially
 
-    def draw(self, window, show, draw_line, cam_group):  # Method to draw the planet
-        x = self.x * self.SCALE + (self.WIDTH / 2)  # Calculate scaled x position
-        y = self.y * self.SCALE + (self.HEIGHT / 2)  # Calculate scaled y position
+    def bind(self, engine):  # Move this planet's state into another engine
+        self.index = engine.copy_body(self.engine, self.index)  # Copy the row across
+        self.engine = engine  # Read and write through the new engine from now on
+
+    def unbind(self):  # Copy this planet's state into a private engine
+        engine = PhysicsEngine(capacity=1)
+        self.index = engine.copy_body(self.engine, self.index)
+        self.engine = engine
+
+    # The physical state lives in the engine arrays; these properties are views onto this planet's row
+    @property
+    def x(self):
+        return float(self.engine.pos[self.index, 0])
+
+    @x.setter
+    def x(self, value):
+        self.engine.pos[self.index, 0] = value
+        self.engine.mark_changed()  # Cached forces no longer apply
+
+    @property
+    def y(self):
+        return float(self.engine.pos[self.index, 1])
+
+    @y.setter
+    def y(self, value):
+        self.engine.pos[self.index, 1] = value
+        self.engine.mark_changed()  # Cached forces no longer apply
+
+    @property
+    def x_vel(self):
+        return float(self.engine.vel[self.index, 0])
+
+    @x_vel.setter
+    def x_vel(self, value):
+        self.engine.vel[self.index, 0] = value
+        self.engine.mark_changed()  # Cached forces no longer apply
+
+    @property
+    def y_vel(self):
+        return float(self.engine.vel[self.index, 1])
+
+    @y_vel.setter
+    def y_vel(self, value):
+        self.engine.vel[self.index, 1] = value
+        self.engine.mark_changed()  # Cached forces no longer apply
+
+    @property
+    def mass(self):
+        return float(self.engine.mass[self.index])
+
+    @mass.setter
+    def mass(self, value):
+        self.engine.mass[self.index] = value
+        self.engine.mark_changed()  # Cached forces no longer apply
+
+    @property
+    def radius(self):  # Drawn radius in pixels; the engine keeps it in meters
+        return float(self.engine.radius[self.index]) * self.SCALE
+
+    @radius.setter
+    def radius(self, value):
+        self.engine.radius[self.index] = value / self.SCALE
+
+    @property
+    def sun(self):
+        return bool(self.engine.sun[self.index])
+
+    @sun.setter
+    def sun(self, value):
+        self.engine.sun[self.index] = value
+
+    @property
+    def total_fx(self):  # Force is stored as acceleration, so it follows mass edits
+        return float(self.engine.acc[self.index, 0] * self.engine.mass[self.index])
+
+    @total_fx.setter
+    def total_fx(self, value):
+        self.engine.acc[self.index, 0] = value / self.mass if self.mass else 0
+
+    @property
+    def total_fy(self):
+        return float(self.engine.acc[self.index, 1] * self.engine.mass[self.index])
+
+    @total_fy.setter
+    def total_fy(self, value):
+        self.engine.acc[self.index, 1] = value / self.mass if self.mass else 0
+
+    # The histories read as arrays viewing the buffers, and assigning a list replaces their contents
+    @property
+    def orbit(self):
+        return self.trail.view()
+
+    @orbit.setter
+    def orbit(self, value):
+        self.trail.reset(value)
+
+    @property
+    def KE(self):
+        return self.KE_buffer.view()
+
+    @KE.setter
+    def KE(self, value):
+        self.KE_buffer.reset(value)
+
+    @property
+    def GPE(self):
+        return self.GPE_buffer.view()
+
+    @GPE.setter
+    def GPE(self, value):
+        self.GPE_buffer.reset(value)
+
+    @property
+    def distance(self):
+        return self.distance_buffer.view()
+
+    @distance.setter
+    def distance(self, value):
+        self.distance_buffer.reset(value)
 
-        if self.focused:
-            pygame.draw.circle(window, "white", (x + cam_group.offset.x, y + cam_group.offset.y),
-                               self.radius + 2 * PlanetaryObject.SCALE * 10 ** 9)
+    def draw(self, window, show, draw_line, cam_group):  # Method to draw the planet
+        # Only what is on screen is drawn. Zoomed out, planets smaller than a pixel become single pixels, trails
+        # drop the points sharing a pixel and the scale bar loses its label once too short to carry it.
+        if self.engine.render_pos is not None:  # Interpolated position from the planet group
+            x, y = self.engine.render_pos[self.index]
+        else:
+            x, y = self.x, self.y
+        self.zoom = zoom = cam_group.scale_size  # Camera zoom, kept to turn dragged pixels into meters
+        x = x * self.SCALE * zoom + (self.WIDTH / 2) + cam_group.offset.x  # Calculate screen x position
+        y = y * self.SCALE * zoom + (self.HEIGHT / 2) + cam_group.offset.y  # Calculate screen y position
+        radius = self.radius * zoom  # Drawn radius at this zoom
+        size = window.get_size()  # Screen size, to skip what falls outside it
+        outline = max(radius, 1) + 2 * PlanetaryObject.SCALE * 10 ** 9  # Radius of the focus outline
 
         # Draw the planet
-        self.planet = pygame.draw.circle(window, self.color, (x + cam_group.offset.x, y + cam_group.offset.y),
-                                         self.radius)
+        if not in_view(x - outline, y - outline, x + outline, y + outline, size):
+            self.planet = pygame.Rect(x, y, 0, 0)  # Off screen, so nothing to click either
+        else:
+            if self.focused:
+                pygame.draw.circle(window, "white", (x, y), outline)
+            if radius < 1:  # Smaller than a pixel
+                self.planet = window.fill(self.color, (x, y, 1, 1)).inflate(6, 6)  # Still large enough to click
+            else:
+                self.planet = pygame.draw.circle(window, self.color, (x, y), radius)
 
         if self.sun:
-            pygame.draw.line(window, "gray", (x + cam_group.offset.x, y + cam_group.offset.y),
-                             (x + cam_group.offset.x, y + cam_group.offset.y + self.SCALE * self.AU), 2)
-            label = pygame.font.SysFont("Trebuchet MS", int(self.WIDTH * 25 / 1920), bold=True).render("1 AU",
-                                                                                                       True,
-                                                                                                       "gray")
-            window.blit(label, (x + cam_group.offset.x - label.get_width(),
-                                y + cam_group.offset.y - label.get_height() / 2 + 100))
-
-        # Draw the orbit line if there are enough points
-        if len(self.orbit) > 10:
-            updated_points = []  # List for updated orbit points
-            for point in self.orbit:  # Loop through orbit points
-                x, y = point
-                x = x * self.SCALE + self.WIDTH / 2  # Scale and adjust x position
-                y = y * self.SCALE + self.HEIGHT / 2  # Scale and adjust y position
-                updated_points.append((x + cam_group.offset.x, y + cam_group.offset.y))  # Store updated point
-
-                # Limit the number of orbit points
-                if len(updated_points) > self.max_orbit_points:
-                    updated_points = updated_points[-self.max_orbit_points:]
-                    self.orbit = self.orbit[-self.max_orbit_points:]
-
-            if draw_line:  # Draw the orbit line
-                pygame.draw.lines(window, self.color, False, updated_points, 1)
+            length = self.SCALE * self.AU * zoom  # Length of 1 AU on screen
+            if in_view(x - 1, y, x + 1, y + length, size):
+                pygame.draw.line(window, "gray", (x, y), (x, y + length), 2)
+                if length >= self.min_label_length:
+                    font = text_cache.font("Trebuchet MS", int(self.WIDTH * 25 / 1920), bold=True)
+                    label = text_cache.render(font, "1 AU", True, "gray")
+                    window.blit(label, (x - label.get_width(), y - label.get_height() / 2 + length / 2))
+
+        # Draw the orbit line once there is a segment to draw; straight stretches need only their two ends
+        if len(self.trail) > 1 and draw_line:
+            # Scale and offset every orbit point at once; the trail already holds at most max_orbit_points
+            updated_points = self.orbit * (self.SCALE * zoom) + (self.WIDTH / 2 + cam_group.offset.x,
+                                                                 self.HEIGHT / 2 + cam_group.offset.y)
+            for points in visible_runs(decimate_pixels(updated_points), size):  # Only the stretches on screen
+                if len(points) > 1:
+                    pygame.draw.lines(window, self.color, False, points.tolist(), 1)
 
         # Draw force vectors if enabled
         if self.force_vectors and not self.sun and (
@@ -123,65 +275,26 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
             theta = math.atan2(self.total_fy, self.total_fx)  # Calculate angle of the force
             force_x = math.cos(theta) * force  # Calculate x component
             force_y = math.sin(theta) * force  # Calculate y component
-            self.arrow((255, 255, 255), (255, 255, 255),
-                       (x + cam_group.offset.x, y + cam_group.offset.y),
-                       (x + force_x + cam_group.offset.x, y + force_y + cam_group.offset.y), 4)  # Draw force arrow
+            self.arrow((255, 255, 255), (255, 255, 255), (x, y), (x + force_x, y + force_y), 4,
+                       size=size)  # Draw force arrow
 
         # Draw velocity vectors if enabled
         if self.velocity_vectors and not self.sun and (
                 self.focused == self.only_when_focused or (self.focused and not self.only_when_focused)):
             velocity_scale = 50 / 29785  # Scale for velocity arrows
-            self.arrow((153, 255, 153), (153, 255, 153),
-                       (x + cam_group.offset.x, y + cam_group.offset.y),
-                       (x + self.x_vel * velocity_scale + cam_group.offset.x,
-                        y + self.y_vel * velocity_scale + cam_group.offset.y), 4)  # Draw velocity arrow
-
-    def attraction(self, other):  # Method to calculate gravitational attraction to another body
-        other_x, other_y = other.x, other.y  # Get other body's position
-        distance_x = other_x - self.x  # Calculate distance in x
-        distance_y = other_y - self.y  # Calculate distance in y
-        distance = math.sqrt(distance_x ** 2 + distance_y ** 2)  # Calculate distance between bodies
-        if other.sun:  # If the other body is the sun
-            self.distance_to_sun = distance  # Update distance to sun
-        force = self.G * self.mass * other.mass / distance ** 2  # Calculate gravitational force
-        theta = math.atan2(distance_y, distance_x)  # Calculate angle of attraction
-        force_x = math.cos(theta) * force  # Calculate x component of force
-        force_y = math.sin(theta) * force  # Calculate y component of force
-        if not other.sun:  # If the other body is not the sun
-            return [force_x, force_y]  # Return force components
-        if other.sun:  # If the other body is the sun
-            return [force_x, force_y, force * distance * -1, distance]  # Return additional values
-
-    def update_position(self, planet_group):  # Update the position of the planet
-        self.total_fx = self.total_fy = 0  # Reset total forces
-        for planet in planet_group.sprites():  # Loop through other planets
-            if self == planet:  # Skip itself
-                continue
-            temp = self.attraction(planet)  # Calculate attraction to other planet
-            self.total_fx += temp[0]  # Accumulate x force
-            self.total_fy += temp[1]  # Accumulate y force
-            if len(temp) == 4:  # If the other body is the sun
-                self.GPE.append(temp[2])  # Append gravitational potential energy
-                self.distance.append(temp[3])  # Append distance to sun
-
-        # Update velocities based on forces
-        self.x_vel += (self.total_fx / self.mass * self.TIMESTEP)  # Update x velocity
-        self.y_vel += (self.total_fy / self.mass * self.TIMESTEP)  # Update y velocity
-        self.velocity = math.sqrt(self.x_vel ** 2 + self.y_vel ** 2)  # Calculate velocity magnitude
-        self.KE.append(0.5 * self.mass * (self.velocity ** 2))  # Append kinetic energy
-        self.x += (self.x_vel * self.TIMESTEP)  # Update position based on velocity
-        self.y += (self.y_vel * self.TIMESTEP)
-        self.orbit.append((self.x, self.y))  # Add current position to orbit
+            self.arrow((153, 255, 153), (153, 255, 153), (x, y),
+                       (x + self.x_vel * velocity_scale, y + self.y_vel * velocity_scale), 4,
+                       size=size)  # Draw velocity arrow
 
-        max_data = 5000  # Maximum data points to keep
-
-        # Limit the length of energy and distance data
-        if len(self.KE) > max_data:
-            self.KE = self.KE[-max_data:]
-        if len(self.GPE) > max_data:
-            self.GPE = self.GPE[-max_data:]
-        if len(self.distance) > max_data:
-            self.distance = self.distance[-max_data:]
+    def record_telemetry(self, distance_to_sun=None, gpe=None):  # Store history after a physics step
+        self.velocity = math.sqrt(self.x_vel ** 2 + self.y_vel ** 2)  # Calculate velocity magnitude
+        # The buffers drop their oldest entries once full, so nothing needs trimming
+        self.KE_buffer.append(0.5 * self.mass * (self.velocity ** 2))  # Append kinetic energy
+        if distance_to_sun is not None:  # Telemetry against the sun, not recorded for the sun itself
+            self.distance_to_sun = distance_to_sun  # Update distance to sun
+            self.GPE_buffer.append(gpe)  # Append gravitational potential energy
+            self.distance_buffer.append(distance_to_sun)  # Append distance to sun
+        self.trail.append(self.x, self.y)  # Add current position to orbit
 
     def drag_planet(self, event):  # Handle dragging of the planet
         mouse_x, mouse_y = pygame.mouse.get_pos()  # Get mouse position
@@ -200,9 +313,8 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
         # If mouse moved while dragging
         if self.dragging and event.type == pygame.MOUSEMOTION:
             # Update position based on mouse movement
-            self.x += (mouse_x - self.last_pos.x) / self.SCALE  # Update x position
-            self.y += (mouse_y - self.last_pos.y) / self.SCALE  # Update y position
-            self.orbit.append((self.x, self.y))  # Add new position to orbit
+            self.x += (mouse_x - self.last_pos.x) / (self.SCALE * self.zoom)  # Update x position
+            self.y += (mouse_y - self.last_pos.y) / (self.SCALE * self.zoom)  # Update y position
             self.last_pos.x = mouse_x  # Update last mouse position
             self.last_pos.y = mouse_y
             self.KE = list()  # Reset kinetic energy data
@@ -214,7 +326,11 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
         return False  # Indicate no dragging occurred
 
     # CITED FROM: https://stackoverflow.com/questions/56295712/how-to-draw-a-dynamic-arrow-in-pygame
-    def arrow(self, line_color, tricolor, start, end, thickness=4, triangle_radius=3):  # Draw an arrow
+    def arrow(self, line_color, tricolor, start, end, thickness=4, triangle_radius=3, size=None):  # Draw an arrow
+        margin = thickness + triangle_radius  # Reach of the arrow beyond the line between its ends
+        if size is not None and not in_view(min(start[0], end[0]) - margin, min(start[1], end[1]) - margin,
+                                            max(start[0], end[0]) + margin, max(start[1], end[1]) + margin, size):
+            return  # Entirely off a screen of this size
         rad = math.pi / 180  # Convert degrees to radians
         pygame.draw.line(self.screen, line_color, start, end, thickness)  # Draw the main line of the arrow
         rotation = (math.atan2(start[1] - end[1], end[0] - start[0])) + (math.pi / 2)  # Calculate rotation angle
@@ -226,12 +342,15 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
                                                     (end[0] + triangle_radius * math.sin(rotation + 120 * rad),
                                                      end[1] + triangle_radius * math.cos(rotation + 120 * rad))))
 
-    def save_fields(self):  # Save planet attributes for serialization
+    def save_fields(self, lists=True):  # Save planet attributes for serialization
+        # Histories are plain lists, or array copies for a caller converting them later, e.g. off the main thread
+        history = (lambda values: values.tolist()) if lists else (lambda values: values.copy())
         fields = {"name": self.name, "x": self.x, "y": self.y, "radius": self.radius, "color": self.color,
-                  "mass": self.mass, "WIDTH": self.WIDTH, "HEIGHT": self.HEIGHT, "orbit": self.orbit, "sun": self.sun,
-                  "distance_to_sun": self.distance_to_sun, "x_vel": self.x_vel, "y_vel": self.y_vel,
-                  "total_fx": self.total_fx, "total_fy": self.total_fy, "velocity": self.velocity, "KE": self.KE,
-                  "GPE": self.GPE, "distance": self.distance}  # Create a dictionary of fields
+                  "mass": self.mass, "WIDTH": self.WIDTH, "HEIGHT": self.HEIGHT, "orbit": history(self.orbit),
+                  "sun": self.sun, "distance_to_sun": self.distance_to_sun, "x_vel": self.x_vel, "y_vel": self.y_vel,
+                  "total_fx": self.total_fx, "total_fy": self.total_fy, "velocity": self.velocity,
+                  "KE": history(self.KE), "GPE": history(self.GPE),
+                  "distance": history(self.distance)}  # Create a dictionary of fields
         return fields  # Return the dictionary
 
     def load_fields(self, fields):  # Load planet attributes from a dictionary
@@ -241,8 +360,8 @@ class PlanetaryObject(pygame.sprite.Sprite):  # Class to represent a planet
         self.radius = fields["radius"]  # Set radius
         self.color = fields["color"]  # Set color
         self.mass = fields["mass"]  # Set mass
-        self.WIDTH = fields["WIDTH"]  # Set screen width
-        self.HEIGHT = fields["HEIGHT"]  # Set screen height
+        self.WIDTH = fields.get("WIDTH", self.WIDTH)  # Set screen width, which scene files leave out
+        self.HEIGHT = fields.get("HEIGHT", self.HEIGHT)  # Set screen height
         self.orbit = fields["orbit"]  # Load orbit data
         self.sun = fields["sun"]  # Set sun status
         self.distance_to_sun = fields["distance_to_sun"]  # Load distance to sun
@@ -540,9 +659,9 @@ class TextBox(pygame_widgets.textbox.TextBox):  # Class to create a customizable
             # Display text or placeholder text
             x = [self._x + self.textOffsetLeft]  # Initialize x position for text
             for c in (self.text if len(self.text) > 0 else self.placeholderText):  # Choose between text and placeholder
-                text = self.font.render(c, False,
-                                        (self.textColour if len(
-                                            self.text) > 0 else self.placeholderTextColour))  # Render the character
+                text = text_cache.render(self.font, c, False,
+                                         (self.textColour if len(
+                                             self.text) > 0 else self.placeholderTextColour))  # Render the character
                 textRect = text.get_rect(
                     bottomleft=(x[-1], self._y + self._height - self.textOffsetBottom))  # Position the text
                 self.win.blit(text, textRect)  # Draw the text on the screen
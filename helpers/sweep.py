@@ -0,0 +1,104 @@
+import itertools  # Import itertools for building parameter grids
+import os  # Import os for counting the CPU cores
+from concurrent.futures import ProcessPoolExecutor  # Import the process pool running the scenarios
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.diagnostics import conserved_quantities  # Import the total energy of the bodies
+from helpers.integrators import make_integrator  # Import the time integrators
+from helpers.simulation import Simulation, AU, SUN_MASS, TIMESTEP  # Import the headless simulation core
+from helpers.parallel import worker_context  # Import the safe way of starting worker processes
+
+
+# The parameters of the add planet menu, with the sliders' ranges and starting values
+PARAMETERS = {
+    "mass": (1.195e24, 2.9875e25, 5.975e24),  # Kilograms, 1/5x to 5x Earth
+    "velocity": (5960, 148924, 29792),  # Meters per second, 1/5x to 5x Earth
+    "angle": (0, 360, 0),  # Degrees, direction of the starting velocity
+    "distance": (AU / 2, AU * 2, AU),  # Meters from the sun, along the y axis
+}
+METRICS = ("stable", "ejected", "crashed", "ejection_time", "min_sun_distance", "max_sun_distance",
+           "energy_drift")
+
+
+def grid(**ranges):  # Every combination of the given values; missing parameters keep the slider defaults
+    names = list(PARAMETERS)
+    values = [np.atleast_1d(ranges.get(name, PARAMETERS[name][2])).tolist() for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def monte_carlo(samples, seed=None, **distributions):  # Random scenarios drawn from per-parameter distributions
+    # Each distribution is a fixed value, or a (kind, a, b) tuple with kind "uniform", "loguniform" or "normal"
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name in PARAMETERS:
+        spec = distributions.get(name, PARAMETERS[name][2])
+        if not isinstance(spec, tuple):
+            columns[name] = np.full(samples, float(spec))
+        elif spec[0] == "uniform":
+            columns[name] = rng.uniform(spec[1], spec[2], samples)
+        elif spec[0] == "loguniform":
+            columns[name] = np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2]), samples))
+        elif spec[0] == "normal":
+            columns[name] = rng.normal(spec[1], spec[2], samples)
+        else:
+            raise ValueError(f"Unknown distribution {spec[0]!r} for {name}")
+    return [dict(zip(columns, row)) for row in zip(*(column.tolist() for column in columns.values()))]
+
+
+def run_scenario(scenario, scene=(), steps=2000, timestep=TIMESTEP, integrator="leapfrog",
+                 ejection_distance=50 * AU):  # Simulate one scenario and summarize how the new planet fared
+    simulation = Simulation.from_scene(scene)
+    simulation.timestep = timestep
+    engine = simulation.engine
+    engine.integrator = make_integrator(integrator)
+    angle = np.radians(scenario["angle"])
+    # Placed and launched the same way as a planet added from the menu
+    index = simulation.add_body(0, scenario["distance"], scenario["velocity"] * np.cos(angle),
+                                -scenario["velocity"] * np.sin(angle), scenario["mass"])
+    sun = np.flatnonzero(engine.sun[:engine.count])[0]
+    radius = engine.collision_radii()  # Physical sizes, which stepping does not change
+
+    def orbital_energy():  # Energy of the planet's orbit around the sun, per unit mass; negative when bound
+        offset = engine.pos[index] - engine.pos[sun]
+        speed2 = float(np.sum((engine.vel[index] - engine.vel[sun]) ** 2))
+        return speed2 / 2 - engine.G * (SUN_MASS + engine.mass[index]) / float(np.hypot(*offset))
+
+    def energy():  # Total energy of the bodies
+        return conserved_quantities(engine)[2]
+
+    start_energy = energy()
+    min_distance = max_distance = float(scenario["distance"])
+    ejection_time = np.nan
+    crashed = False
+    for step in range(1, steps + 1):
+        engine.step(timestep)
+        offset = engine.pos[index] - engine.pos[sun]
+        distance = float(np.hypot(*offset))
+        min_distance, max_distance = min(min_distance, distance), max(max_distance, distance)
+        if distance < radius[index] + radius[sun]:  # Touched the sun, which would absorb it
+            crashed = True
+            break
+        if distance > ejection_distance and orbital_energy() > 0:  # Far away and unbound counts as ejected
+            ejection_time = step * timestep
+            break
+
+    ejected = not np.isnan(ejection_time)
+    stable = not (ejected or crashed) and orbital_energy() < 0  # Still bound to the sun at the end
+    return dict(scenario, stable=stable, ejected=ejected, crashed=crashed,
+                ejection_time=ejection_time, min_sun_distance=min_distance, max_sun_distance=max_distance,
+                energy_drift=abs((energy() - start_energy) / start_energy) if start_energy else np.nan)
+
+
+def _run_one(arguments):  # Unpack the arguments of one scenario in a worker process
+    scenario, options = arguments
+    return run_scenario(scenario, **options)
+
+
+def run_sweep(scenarios, workers=None, chunksize=None, **options):  # Run every scenario across a process pool
+    workers = workers or os.cpu_count() or 1
+    if workers < 2:  # No pool needed for a single worker
+        return [run_scenario(scenario, **options) for scenario in scenarios]
+    chunksize = chunksize or max(1, len(scenarios) // (workers * 8))  # Few enough messages, still balanced
+    with ProcessPoolExecutor(workers, mp_context=worker_context()) as pool:
+        return list(pool.map(_run_one, [(scenario, options) for scenario in scenarios], chunksize=chunksize))
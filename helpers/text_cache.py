@@ -0,0 +1,52 @@
+from collections import OrderedDict  # Import OrderedDict for keeping the rendered text in order of use
+
+import pygame  # Import Pygame for fonts and text surfaces
+
+
+class TextCache:  # Fonts and rendered text kept between frames, the least recently used text dropped first
+    # Most text on screen is the same from one frame to the next, so it is rendered once and blitted from here.
+    # Text that changes every frame, like counters, only pushes out the oldest entries. The surfaces are shared,
+    # so they must be blitted but never drawn on.
+    def __init__(self, capacity=512):
+        self.capacity = capacity  # Most rendered texts kept
+        self.fonts = {}  # Fonts by name, size and style; few enough to keep them all
+        self.surfaces = OrderedDict()  # Rendered text by font, text, color, antialiasing and background
+        self.hits = 0  # Renders answered from the cache
+        self.misses = 0  # Renders that had to draw the text
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    @property
+    def hit_rate(self):  # Share of renders answered from the cache, or None before the first one
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def font(self, name, size, bold=False, italic=False):  # A system font, looked up and loaded only once
+        key = name, size, bold, italic
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+        return font
+
+    def render(self, font, text, antialias, color, background=None):  # Same arguments as Font.render
+        # Colors may be given as names, tuples or pygame Colors, which cannot be hashed
+        key = (font, text, antialias, color if isinstance(color, str) else tuple(color),
+               background if background is None or isinstance(background, str) else tuple(background))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)  # Most recently used
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = font.render(text, antialias, color, background)
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)  # Drop the least recently used
+        return surface
+
+    def clear(self):  # Forget every rendered text and reset the counters
+        self.surfaces.clear()
+        self.hits = self.misses = 0
+
+
+text_cache = TextCache()  # Shared by everything that draws text
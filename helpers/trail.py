@@ -0,0 +1,57 @@
+import math  # Import math for the scalar geometry done per point
+
+import numpy as np  # Import NumPy for vectorized array math
+
+from helpers.ring_buffer import RingBuffer  # Import the fixed-capacity buffer holding the kept points
+
+
+class Trail:  # Orbit trail simplified as it is recorded, so a fixed number of points covers whole orbits
+    # Sleeve fitting, a streaming form of Ramer-Douglas-Peucker: points are dropped while every point since the
+    # last kept one stays within tolerance of a single straight segment. Tracking the range of directions that
+    # segment may take makes each new point O(1), and straight stretches cost nothing however long they are.
+    def __init__(self, budget=200, tolerance=1.0):
+        self.points = RingBuffer(budget, (2,))  # Kept points, oldest dropped once the budget is used up
+        self.tolerance = tolerance  # Largest distance of a dropped point from the drawn line
+        self.head = None  # Latest point, drawn after the kept ones
+        self.reference = 0.0  # Direction from the last kept point to the first point after it
+        self.low = self.high = 0.0  # Directions, relative to the reference, the segment may still take
+
+    def __len__(self):
+        return len(self.points) + (self.head is not None)
+
+    def append(self, x, y):  # Record the next position
+        if not len(self.points):  # The first point is always kept
+            self.points.append((x, y))
+            self.head = None
+            return
+        anchor = self.points.view()[-1]
+        dx, dy = x - anchor[0], y - anchor[1]
+        distance = math.hypot(dx, dy)
+        if distance <= self.tolerance:  # Still too close to the last kept point to bend the line
+            if self.head is None:
+                self.reference, self.low, self.high = math.atan2(dy, dx), -math.pi, math.pi
+            self.head = x, y
+            return
+        if self.head is None:  # First point of a new segment
+            self.reference, self.low, self.high = math.atan2(dy, dx), -math.pi, math.pi
+        direction = (math.atan2(dy, dx) - self.reference + math.pi) % (2 * math.pi) - math.pi
+        if not self.low <= direction <= self.high:  # The line would miss an earlier point: keep the previous one
+            self.points.append(self.head)
+            self.head = None
+            self.append(x, y)
+            return
+        spread = math.asin(self.tolerance / distance)  # Directions that pass within tolerance of this point
+        self.low, self.high = max(self.low, direction - spread), min(self.high, direction + spread)
+        self.head = x, y
+
+    def reset(self, points=()):  # Replace the trail with a sequence of positions
+        self.points.reset()
+        self.head = None
+        for x, y in np.asarray(points, dtype=float).reshape(-1, 2).tolist():
+            self.append(x, y)
+
+    def view(self):  # Kept points and the latest one, oldest first
+        points = self.points.view()
+        if self.head is None:
+            return points
+        return np.concatenate((points, [self.head]))
@@ -0,0 +1,68 @@
+"""
+Headless batch runner: steps a saved scene as fast as possible without opening a window
+Example: python simulate.py assets/data/planets_data.orbscene --steps 100000 --output final.orbscene --telemetry run.npz
+Stress test: python simulate.py --random-system 42 --belt 50000 --steps 1000
+"""
+import argparse  # For parsing command line arguments
+import os  # For locating the default scene
+import time  # For timing the run
+
+from helpers.simulation import Simulation, SCALE  # Headless simulation core
+from helpers.generate import belt, random_system  # For generating bodies in bulk
+from helpers.integrators import INTEGRATORS  # For choosing the time integrator
+
+
+def main(argv=None):
+    dir_path = os.path.dirname(os.path.realpath(__file__))  # Directory of this script
+    parser = argparse.ArgumentParser(description="Run an Orbital Simulator scene without a display.")
+    default_scene = dir_path + "/assets/data/planets_data.orbscene"
+    if not os.path.isfile(default_scene):  # Only saved by an older version so far
+        default_scene = dir_path + "/assets/data/planets_data.pkl"
+    parser.add_argument("scene", nargs="?", default=default_scene,
+                        help="scene file saved by the simulator, or a .pkl scene from an older version")
+    parser.add_argument("--steps", type=int, default=10000, help="number of physics steps to take")
+    parser.add_argument("--timestep", type=float, help="seconds per step, overriding the scene's")
+    parser.add_argument("--integrator", choices=list(INTEGRATORS), help="integrator, overriding the scene's")
+    parser.add_argument("--force-backend", choices=["direct", "barnes_hut", "parallel", "jit"],
+                        help="force backend, overriding the scene's")
+    parser.add_argument("--belt", type=int, metavar="COUNT", help="add an asteroid belt of this many test particles")
+    parser.add_argument("--random-system", type=int, metavar="SEED",
+                        help="add the planets, and any belt, of the random system drawn from this seed")
+    parser.add_argument("--record-every", type=int, default=1, help="steps between telemetry records")
+    parser.add_argument("--output", help="write the final scene here, in the simulator's format (.pkl for the old one)")
+    parser.add_argument("--telemetry", help="write the recorded telemetry here as a .npz file")
+    args = parser.parse_args(argv)
+
+    simulation = Simulation.load(args.scene, record_every=args.record_every)
+    if args.timestep is not None:
+        simulation.timestep = args.timestep
+    if args.integrator is not None:
+        simulation.engine.integrator = INTEGRATORS[args.integrator]()
+    if args.force_backend is not None:
+        simulation.set_force_backend(args.force_backend)
+    if args.random_system is not None:
+        planets, particle_pos, particle_vel = random_system(args.random_system)
+        for planet in planets:
+            simulation.add_body(planet["x"], planet["y"], planet["x_vel"], planet["y_vel"], planet["mass"],
+                                planet["radius"] / SCALE, fields=planet)
+        simulation.engine.add_particles(particle_pos, particle_vel)
+    if args.belt:
+        simulation.engine.add_particles(*belt(args.belt))
+
+    start = time.perf_counter()
+    simulation.step(args.steps)
+    elapsed = time.perf_counter() - start
+    print(f"{args.steps} steps of {simulation.timestep:g}s ({simulation.time / 86400 / 365.25:.2f} years) "
+          f"for {simulation.engine.count} bodies and {simulation.engine.particle_count} particles "
+          f"in {elapsed:.2f}s")
+    if simulation.merges:  # Collisions set to merge in the scene
+        print(f"{len(simulation.merges)} bodies were absorbed in merges")
+
+    if args.output:
+        simulation.save(args.output)
+    if args.telemetry:
+        simulation.save_telemetry(args.telemetry)
+
+
+if __name__ == "__main__":
+    main()